@@ -0,0 +1,368 @@
+# analytics.py
+"""
+Vectorized risk and performance analytics over the stored per-fund price history.
+
+Every statistic is kept as running accumulators (counts, sums, sums of squares,
+cross products, running peaks), so building from history is a handful of NumPy
+array operations and a new day is a single O(funds²) update instead of a rebuild.
+Portfolio figures assume today's positions were held over the whole range.
+"""
+
+from collections import deque
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from config import ANALYTICS_VOLATILITY_WINDOW, ANALYTICS_RISK_FREE_RATE
+
+TRADING_DAYS_PER_YEAR = 252
+PORTFOLIO = "Portföy"
+
+
+class RollingMoments:
+    """
+    NaN-aware count / sum / sum of squares over the last `window` rows, per column,
+    updated one row at a time. Sums are rebuilt from the kept rows every `window`
+    pushes so add/subtract rounding cannot drift.
+    """
+
+    def __init__(self, window: int, width: int):
+        self.window = window
+        self._rows = deque()
+        self.count = np.zeros(width)
+        self.sum = np.zeros(width)
+        self.sumsq = np.zeros(width)
+        self._pushes = 0
+
+    def _add(self, row: np.ndarray, sign: float):
+        valid = ~np.isnan(row)
+        x = np.where(valid, row, 0.0)
+        self.count += sign * valid
+        self.sum += sign * x
+        self.sumsq += sign * x * x
+
+    def push(self, row: np.ndarray):
+        row = np.asarray(row, dtype=float)
+        self._rows.append(row)
+        self._add(row, 1.0)
+        if len(self._rows) > self.window:
+            self._add(self._rows.popleft(), -1.0)
+        self._pushes += 1
+        if self._pushes % self.window == 0:
+            self.count[:] = self.sum[:] = self.sumsq[:] = 0.0
+            for kept in self._rows:
+                self._add(kept, 1.0)
+
+    def std(self, min_periods: int = 2) -> np.ndarray:
+        """Sample standard deviation per column (NaN below min_periods observations)."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            var = (self.sumsq - self.sum ** 2 / self.count) / (self.count - 1)
+        return np.where(self.count >= max(min_periods, 2), np.sqrt(np.clip(var, 0.0, None)), np.nan)
+
+    def copy(self) -> "RollingMoments":
+        clone = RollingMoments(self.window, len(self.sum))
+        clone._rows = deque(self._rows)
+        clone.count, clone.sum, clone.sumsq = self.count.copy(), self.sum.copy(), self.sumsq.copy()
+        clone._pushes = self._pushes
+        return clone
+
+
+def _pairwise_moments(valid: np.ndarray, x: np.ndarray):
+    """
+    Pairwise-complete n, Σx, Σx², Σxy matrices (entry [i, j] uses rows where both i and j
+    exist) from the validity mask and the zero-filled returns, as two matrix products.
+    """
+    n = x.shape[1]
+    mask = valid.astype(float)
+    x_products = x.T @ np.hstack([mask, x])
+    mask_products = mask.T @ np.hstack([mask, x * x])
+    return mask_products[:, :n], x_products[:, :n], mask_products[:, n:].T, x_products[:, n:]
+
+
+def _rolling_std(valid: np.ndarray, x: np.ndarray, window: int, min_periods: int = 2) -> np.ndarray:
+    """Rolling sample std per column (NaN-aware) from cumulative sums; matches pandas rolling().std()."""
+    def windowed(values):
+        total = np.cumsum(values, axis=0)
+        total[window:] = total[window:] - total[:-window]
+        return total
+    count = windowed(valid.astype(float))
+    total, total_sq = windowed(x), windowed(x * x)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        var = (total_sq - total ** 2 / count) / (count - 1)
+    return np.where(count >= max(min_periods, 2), np.sqrt(np.clip(var, 0.0, None)), np.nan)
+
+
+def _correlation(n, sx, sxx, sxy, min_periods: int) -> np.ndarray:
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cov = sxy - sx * sx.T / n
+        var_i = sxx - sx ** 2 / n
+        corr = cov / np.sqrt(var_i * var_i.T)
+    corr[n < min_periods] = np.nan
+    return np.clip(corr, -1.0, 1.0)
+
+
+class PortfolioAnalytics:
+    """
+    Analytics for fixed positions over a dates x funds price matrix (see db_manager.get_price_matrix).
+    Build once from history, then append() new or revised days incrementally.
+    """
+
+    def __init__(
+        self,
+        prices: pd.DataFrame,
+        positions: Dict[str, float],
+        window: int = ANALYTICS_VOLATILITY_WINDOW,
+        risk_free_rate: float = ANALYTICS_RISK_FREE_RATE,
+        periods_per_year: int = TRADING_DAYS_PER_YEAR,
+    ):
+        self.codes = list(positions)
+        self.quantities = np.array([positions[c] for c in self.codes], dtype=float)
+        self.window = window
+        self.periods_per_year = periods_per_year
+        self.rf_daily = (1.0 + risk_free_rate) ** (1.0 / periods_per_year) - 1.0
+
+        n = len(self.codes)
+        self.first_date: Optional[pd.Timestamp] = None
+        self.last_date: Optional[pd.Timestamp] = None
+        self._state = {
+            "last_price": np.full(n, np.nan),
+            "first_price": np.full(n, np.nan),
+            # Return moments: funds, then the portfolio in the last column
+            "count": np.zeros(n + 1), "sum": np.zeros(n + 1), "sumsq": np.zeros(n + 1), "downside": np.zeros(n + 1),
+            "contribution": np.zeros(n),
+            "fund_peak": np.full(n, np.nan), "fund_max_drawdown": np.zeros(n),
+            "index": 1.0, "peak": 1.0, "peak_date": None,
+            "max_drawdown": 0.0, "max_drawdown_peak": None, "max_drawdown_trough": None,
+            "corr_n": np.zeros((n, n)), "corr_sx": np.zeros((n, n)),
+            "corr_sxx": np.zeros((n, n)), "corr_sxy": np.zeros((n, n)),
+        }
+        self._moments = RollingMoments(window, n + 1)
+        self._index_dates, self._index_values = [], []
+        self._rolling_dates, self._rolling_rows = [], []
+        self._checkpoint = None
+
+        prices = self._align(prices)
+        if len(prices) > 1:
+            self._build(prices.iloc[:-1])
+        if len(prices):
+            # The newest day goes through the incremental path, so it can be revised later
+            self._apply(prices.index[-1], prices.iloc[-1].to_numpy(dtype=float))
+
+    # --- building ---
+
+    def _align(self, prices: pd.DataFrame) -> pd.DataFrame:
+        prices = prices.reindex(columns=self.codes).sort_index()
+        prices.index = pd.to_datetime(prices.index)
+        return prices.astype(float)
+
+    def _build(self, prices: pd.DataFrame):
+        """Batch path: fills every accumulator from history in a few array operations."""
+        s = self._state
+        raw = prices.to_numpy()
+        filled = prices.ffill().to_numpy()
+        dates = prices.index
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            returns = filled[1:] / filled[:-1] - 1.0
+            prev_value = np.where(np.isnan(returns), 0.0, self.quantities * np.nan_to_num(filled[:-1]))
+            weighted = prev_value * np.nan_to_num(returns)
+            denominator = prev_value.sum(axis=1)
+            portfolio = np.where(denominator > 0, weighted.sum(axis=1) / denominator, np.nan)
+            s["contribution"] += np.nansum(weighted / denominator[:, None], axis=0)
+
+        all_returns = np.column_stack([returns, portfolio])
+        valid = ~np.isnan(all_returns)
+        x = np.where(valid, all_returns, 0.0)
+        s["count"] += valid.sum(axis=0)
+        s["sum"] += x.sum(axis=0)
+        s["sumsq"] += (x * x).sum(axis=0)
+        s["downside"] += (np.minimum(x - self.rf_daily, 0.0) ** 2 * valid).sum(axis=0)
+
+        n, sx, sxx, sxy = _pairwise_moments(valid[:, :-1], x[:, :-1])
+        s["corr_n"] += n
+        s["corr_sx"] += sx
+        s["corr_sxx"] += sxx
+        s["corr_sxy"] += sxy
+
+        # Per-fund drawdowns on the (forward-filled) price itself
+        peaks = np.fmax.accumulate(filled, axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            s["fund_max_drawdown"] = np.fmin(s["fund_max_drawdown"], np.nanmin(filled / peaks - 1.0, axis=0, initial=0.0))
+        s["fund_peak"] = peaks[-1]
+
+        # Portfolio value index and its drawdown
+        index = np.concatenate([[1.0], np.cumprod(1.0 + np.nan_to_num(portfolio))])
+        running_peak = np.maximum.accumulate(index)
+        drawdown = index / running_peak - 1.0
+        trough = int(np.argmin(drawdown))
+        if drawdown[trough] < s["max_drawdown"]:
+            s["max_drawdown"] = float(drawdown[trough])
+            s["max_drawdown_trough"] = dates[trough]
+            s["max_drawdown_peak"] = dates[int(np.argmax(index[:trough + 1]))]
+        s["index"], s["peak"] = float(index[-1]), float(running_peak[-1])
+        s["peak_date"] = dates[int(np.argmax(index))]
+        self._index_dates.extend(dates)
+        self._index_values.extend(index)
+
+        # Rolling volatility series, then the window that continues it incrementally
+        self._rolling_dates.extend(dates[1:])
+        self._rolling_rows.extend(_rolling_std(valid, x, self.window) * np.sqrt(self.periods_per_year))
+        for row in all_returns[-self.window:]:
+            self._moments.push(row)
+
+        first_valid = prices.notna().to_numpy().argmax(axis=0)
+        s["first_price"] = np.where(prices.notna().any().to_numpy(), raw[first_valid, np.arange(raw.shape[1])], np.nan)
+        s["last_price"] = filled[-1]
+        self.first_date, self.last_date = dates[0], dates[-1]
+
+    def _snapshot(self):
+        state = {k: v.copy() if isinstance(v, np.ndarray) else v for k, v in self._state.items()}
+        return (state, self._moments.copy(), self.last_date, self.first_date,
+                len(self._index_dates), len(self._rolling_dates))
+
+    def _restore(self, checkpoint):
+        self._state, self._moments, self.last_date, self.first_date, n_index, n_rolling = checkpoint
+        del self._index_dates[n_index:], self._index_values[n_index:]
+        del self._rolling_dates[n_rolling:], self._rolling_rows[n_rolling:]
+
+    def _apply(self, date: pd.Timestamp, raw: np.ndarray):
+        """Incremental path: folds one new day into every accumulator."""
+        self._checkpoint = self._snapshot()
+        s = self._state
+        s["first_price"] = np.where(np.isnan(s["first_price"]), raw, s["first_price"])
+        price = np.where(np.isnan(raw), s["last_price"], raw)
+
+        if self.last_date is not None:
+            with np.errstate(invalid="ignore", divide="ignore"):
+                returns = price / s["last_price"] - 1.0
+                prev_value = np.where(np.isnan(returns), 0.0, self.quantities * np.nan_to_num(s["last_price"]))
+                weighted = prev_value * np.nan_to_num(returns)
+                denominator = prev_value.sum()
+                portfolio = weighted.sum() / denominator if denominator > 0 else np.nan
+                if denominator > 0:
+                    s["contribution"] += weighted / denominator
+
+            all_returns = np.append(returns, portfolio)
+            valid = ~np.isnan(all_returns)
+            x = np.nan_to_num(all_returns)
+            s["count"] += valid
+            s["sum"] += x
+            s["sumsq"] += x * x
+            s["downside"] += np.minimum(x - self.rf_daily, 0.0) ** 2 * valid
+
+            mask = valid[:-1].astype(float)
+            xf = x[:-1]
+            s["corr_n"] += np.outer(mask, mask)
+            s["corr_sx"] += np.outer(xf, mask)
+            s["corr_sxx"] += np.outer(xf * xf, mask)
+            s["corr_sxy"] += np.outer(xf, xf)
+
+            s["index"] *= 1.0 + (0.0 if np.isnan(portfolio) else portfolio)
+            self._moments.push(all_returns)
+            self._rolling_dates.append(date)
+            self._rolling_rows.append(self._moments.std() * np.sqrt(self.periods_per_year))
+        else:
+            self.first_date = date
+
+        s["fund_peak"] = np.fmax(s["fund_peak"], price)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            s["fund_max_drawdown"] = np.fmin(s["fund_max_drawdown"], price / s["fund_peak"] - 1.0)
+        if s["peak_date"] is None or s["index"] > s["peak"]:
+            s["peak"], s["peak_date"] = s["index"], date
+        drawdown = s["index"] / s["peak"] - 1.0
+        if drawdown < s["max_drawdown"]:
+            s["max_drawdown"], s["max_drawdown_peak"], s["max_drawdown_trough"] = drawdown, s["peak_date"], date
+
+        s["last_price"] = price
+        self._index_dates.append(date)
+        self._index_values.append(s["index"])
+        self.last_date = date
+
+    def append(self, prices: pd.DataFrame) -> int:
+        """
+        Folds in new days (dates x funds). A day equal to the last one replaces it
+        (e.g. a price revised later the same day); older days are ignored.
+        Returns the number of days applied.
+        """
+        applied = 0
+        for date, row in self._align(prices).iterrows():
+            if self.last_date is not None and date < self.last_date:
+                continue
+            if self.last_date is not None and date == self.last_date:
+                self._restore(self._checkpoint)
+            self._apply(date, row.to_numpy(dtype=float))
+            applied += 1
+        return applied
+
+    # --- results ---
+
+    def _ratios(self):
+        s = self._state
+        count = s["count"]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = s["sum"] / count
+            std = np.sqrt(np.clip((s["sumsq"] - s["sum"] ** 2 / count) / (count - 1), 0.0, None))
+            downside = np.sqrt(s["downside"] / count)
+            annual = np.sqrt(self.periods_per_year)
+            sharpe = (mean - self.rf_daily) / std * annual
+            sortino = (mean - self.rf_daily) / downside * annual
+        enough = count >= 2
+        nan = np.full_like(mean, np.nan)
+        return (np.where(enough, std * annual, nan), np.where(enough, sharpe, nan), np.where(enough, sortino, nan))
+
+    def summary(self) -> Dict:
+        """Portfolio level figures (ratios and returns as fractions, volatility annualised)."""
+        s = self._state
+        volatility, sharpe, sortino = self._ratios()
+        days = int(s["count"][-1])
+        current = self._rolling_rows[-1][-1] if self._rolling_rows else np.nan
+        return {
+            "start": self.first_date,
+            "end": self.last_date,
+            "days": days,
+            "total_return": s["index"] - 1.0,
+            "annualized_return": s["index"] ** (self.periods_per_year / days) - 1.0 if days else np.nan,
+            "volatility": float(volatility[-1]),
+            "rolling_volatility": float(current),
+            "sharpe": float(sharpe[-1]),
+            "sortino": float(sortino[-1]),
+            "max_drawdown": s["max_drawdown"],
+            "max_drawdown_peak": s["max_drawdown_peak"],
+            "max_drawdown_trough": s["max_drawdown_trough"],
+        }
+
+    def fund_table(self) -> pd.DataFrame:
+        """One row per fund: return, volatility, Sharpe, max drawdown and contribution."""
+        s = self._state
+        volatility, sharpe, _ = self._ratios()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            fund_return = s["last_price"] / s["first_price"] - 1.0
+        return pd.DataFrame({
+            "Fon Kodu": self.codes,
+            "Getiri (%)": fund_return * 100,
+            "Volatilite (%)": volatility[:-1] * 100,
+            "Sharpe": sharpe[:-1],
+            "Maks. Düşüş (%)": s["fund_max_drawdown"] * 100,
+            "Katkı (puan)": s["contribution"] * 100,
+            "Kâr/Zarar (TL)": self.quantities * (s["last_price"] - s["first_price"]),
+        })
+
+    def correlation(self, min_periods: int = 3) -> pd.DataFrame:
+        """Pairwise-complete correlation of daily fund returns."""
+        s = self._state
+        corr = _correlation(s["corr_n"], s["corr_sx"], s["corr_sxx"], s["corr_sxy"], min_periods)
+        return pd.DataFrame(corr, index=self.codes, columns=self.codes)
+
+    def rolling_volatility(self) -> pd.DataFrame:
+        """Annualised rolling volatility per fund and for the portfolio (last column)."""
+        return pd.DataFrame(
+            np.array(self._rolling_rows).reshape(len(self._rolling_rows), len(self.codes) + 1),
+            index=pd.DatetimeIndex(self._rolling_dates, name="date"),
+            columns=[*self.codes, PORTFOLIO],
+        )
+
+    def drawdown(self) -> pd.Series:
+        """Portfolio drawdown from its running peak, per day."""
+        index = pd.Series(self._index_values, index=pd.DatetimeIndex(self._index_dates, name="date"), dtype=float)
+        return index / index.cummax() - 1.0
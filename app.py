@@ -1,8 +1,13 @@
 # app.py
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-from data_manager import get_portfolio_data, save_daily_total, get_history_df, load_funds, save_all_funds
+import json
+from functools import partial
+from datetime import date, timedelta
+from config import HISTORY_CHART_MAX_POINTS, TEFAS_UTC_OFFSET_HOURS
+import startup
+
+# Heavy modules and the MongoDB connection warm up in the background (once per process)
+startup.warm_up()
 
 st.set_page_config(page_title="Portföy Takip", page_icon="📈", layout="wide")
 
@@ -67,8 +72,9 @@ st.markdown(
 )
 
 # Initialize Session State for caching data
-if "portfolio_df" not in st.session_state:
-    st.session_state.portfolio_df = None
+# (a reference to the process-wide, read-only PortfolioTable; never a per-session copy)
+if "portfolio" not in st.session_state:
+    st.session_state.portfolio = None
 
 # Initialize authentication state
 if "authenticated" not in st.session_state:
@@ -99,6 +105,7 @@ def check_password():
         )
         
         st.info("💡 İpucu: Parolayı `.streamlit/secrets.toml` dosyasında ayarlayabilirsiniz.")
+        startup.mark("password_prompt")
         return False
     else:
         return True
@@ -109,150 +116,424 @@ if not check_password():
 
 # --- MAIN APPLICATION (Only shown if authenticated) ---
 
-with st.sidebar:
-    st.header("🛠️ Fon Yönetimi")
-    st.info("Aşağıdaki tablodan fonlarınızı düzenleyin, yeni ekleyin veya silin.")
-    
-    current_funds = load_funds()
+# Deferred until past the password prompt; usually already loaded by startup.warm_up()
+import pandas as pd
+import figures
+from data_manager import (
+    get_history_df, get_history_version, load_funds, save_all_funds, get_cache_stats,
+    refresh_portfolio, load_latest_portfolio, positions_signature,
+    get_metrics_snapshot, get_metrics_prometheus, get_fetch_status,
+    get_portfolio_analytics, record_trade, add_cost_basis, get_ledger_summary,
+    search_funds, find_unknown_funds, get_fund_universe_status, get_fund_picker
+)
+from ledger import BUY, SELL, LedgerError
+from portfolio_table import PortfolioTable
+from export import export_file, file_name, MIME_TYPES
+from metrics import timer
+startup.mark("app_imports")
+
+# --- FRAGMENTS ---
+# A widget inside a fragment reruns only its fragment, not the whole script.
+# Fragment arguments are the values of the last full run (the shared table is immutable).
+
+@st.fragment
+def fund_editor(current_funds, has_trades):
+    """Editing the table reruns only this fragment; saving reruns the whole app."""
     # Convert to DF for editor
     if current_funds:
         df_funds = pd.DataFrame(current_funds)
     else:
         df_funds = pd.DataFrame(columns=["kod", "adet"])
 
+    # Fund codes are picked from the local fund list (searchable by code or name);
+    # until it is downloaded they are typed and checked on save
+    fund_codes, fund_label = get_fund_picker(df_funds["kod"])
+    if fund_codes:
+        kod_column = st.column_config.SelectboxColumn(
+            "Fon Kodu", options=fund_codes, format_func=fund_label, help="Fon kodu veya adıyla arayın"
+        )
+    else:
+        kod_column = st.column_config.TextColumn("Fon Kodu", max_chars=3, help="TEFAS Kodu (Örn: TTE)")
+
     # Data Editor
     edited_df = st.data_editor(
         df_funds,
         num_rows="dynamic",
         column_config={
-            "kod": st.column_config.TextColumn("Fon Kodu", max_chars=3, help="TEFAS Kodu (Örn: TTE)"),
+            "kod": kod_column,
             "adet": st.column_config.NumberColumn("Adet", min_value=0, step=1, format="%d")
         },
         width="stretch",
         hide_index=True,
         key="fund_editor"
     )
+    if has_trades:
+        st.caption("🧾 Alım/satım girilen fonların adetleri işlem defterinden hesaplanır.")
     
     # Save Logic
     if st.button("💾 Değişiklikleri Kaydet", type="primary"):
         # Convert back to list of dicts
         new_funds_list = edited_df.to_dict(orient="records")
+        # Checked against the local fund list: no TEFAS request per save
+        unknown = find_unknown_funds(f["kod"] for f in new_funds_list if isinstance(f.get("kod"), str))
+        if unknown:
+            st.error(
+                "TEFAS'ta bulunamayan fon kodu: " + ", ".join(
+                    code + (f" ({' / '.join(suggestions)}?)" if suggestions else "")
+                    for code, suggestions in unknown.items()
+                )
+            )
+            return
         save_all_funds(new_funds_list)
         
-        # Invalidate cache / Refetch immediately to show new results
+        # Invalidate cache / Refetch immediately and publish for every viewer
         with st.spinner('Yeni verilerle güncelleniyor...'):
-            st.session_state.portfolio_df = get_portfolio_data(new_funds_list)
+            st.session_state.portfolio = refresh_portfolio(load_funds())
             
         st.success("Portföy güncellendi!")
         st.rerun()
+
+@st.fragment
+def fund_search():
+    """Searches the local fund list; typing reruns only this fragment and makes no network call."""
+    query = st.text_input("Fon kodu veya adı", placeholder="Örn: TTE, iş portföy hisse", key="fund_query")
+    status = get_fund_universe_status()
+    if not status["funds"]:
+        st.caption("Fon listesi henüz indirilmedi; arka planda indiriliyor.")
+        return
+    if query:
+        results = search_funds(query)
+        if results:
+            st.dataframe(
+                pd.DataFrame(
+                    [(f.kod, f.name, f.category, f.founder) for f in results],
+                    columns=["Fon Kodu", "Fon Adı", "Kategori", "Kurucu"],
+                ),
+                width="stretch",
+                hide_index=True,
+            )
+        else:
+            st.info("Eşleşen fon yok.")
+    st.caption(f"{status['funds']} fon · liste {status['fetched_at']:%d.%m.%Y} tarihli")
+
+@st.fragment
+def export_panel():
+    export_labels = {"history": "Portföy geçmişi", "prices": "Fon fiyatları", "funds": "Fon pozisyonları"}
+    export_dataset = st.selectbox("Veri", list(export_labels), format_func=export_labels.get)
+    export_format = st.radio("Biçim", list(MIME_TYPES), format_func=str.upper, horizontal=True)
+    export_range = st.date_input(
+        "Tarih aralığı (isteğe bağlı)", value=[], max_value=date.today(), disabled=export_dataset == "funds"
+    )
+    export_start, export_end = (list(export_range) + [None, None])[:2]
+    # Exported in batches only when clicked, outside the script run and the server's event loop
+    st.download_button(
+        "⬇️ İndir",
+        data=partial(export_file, export_dataset, export_format, export_start, export_end),
+        file_name=file_name(export_dataset, export_format, export_start, export_end),
+        mime=MIME_TYPES[export_format],
+        on_click="ignore",
+    )
+
+@st.fragment
+def history_section():
+    """The period radio reruns only the history chart; the figure is reused while the history is unchanged."""
+    with timer("render.history"):
+        st.subheader("🗓️ Tarihsel Gelişim")
+        history_periods = {"1 Ay": 30, "3 Ay": 90, "6 Ay": 182, "1 Yıl": 365, "Tümü": None}
+        selected_period = st.radio("Dönem", list(history_periods), index=len(history_periods) - 1, horizontal=True)
+        period_days = history_periods[selected_period]
+        start_date = date.today() - timedelta(days=period_days) if period_days else None
+        # Server-side range filter + downsampling keeps the chart cost flat as history grows
+        fig_line = figures.history_line(
+            get_history_version(), start_date, HISTORY_CHART_MAX_POINTS,
+            lambda: get_history_df(start_date=start_date, max_points=HISTORY_CHART_MAX_POINTS),
+        )
+        if fig_line is not None:
+            st.plotly_chart(fig_line, width="stretch")
+        else:
+            st.info("Henüz tarihsel veri yok.")
+
+@st.fragment
+def portfolio_details(portfolio_table, df_portfolio, df_trades, ledger_totals):
+    """The category filter reruns only the detail table."""
+    with timer("render.table"):
+        st.markdown("### 📋 Detaylı Portföy Tablosu")
+    
+        # 🔎 Category Filter
+        categories = ["Tümü"] + portfolio_table.unique("Kategori")
+        selected_cat = st.selectbox("📂 Kategori Filtrele", categories)
+    
+        if selected_cat == "Tümü":
+            df_filtered = df_portfolio
+        else:
+            # Memoised row positions in the shared table (same row order as df_portfolio)
+            df_filtered = df_portfolio.take(portfolio_table.rows_where("Kategori", selected_cat))
+    
+        # Reorder columns to put Category early
+        cols = [
+            "Fon Kodu", "Kategori", "Adet", "Birim Fiyat", "Toplam Değer", "Günlük Getiri (%)", "Günlük Kazanç (TL)",
+            "Ort. Maliyet", "Maliyet (TL)", "Gerçekleşmemiş K/Z (TL)", "Gerçekleşen K/Z (TL)"
+        ]
+        # Filter only existing cols just in case
+        cols = [c for c in cols if c in df_filtered.columns]
+    
+        st.dataframe(
+            df_filtered[cols],
+            width="stretch",
+            hide_index=True,
+            column_config={
+                "Fon Kodu": st.column_config.TextColumn("Fon Kodu"),
+                "Kategori": st.column_config.TextColumn("Kategori"),
+                "Adet": st.column_config.NumberColumn("Adet", format="%.0f"),
+                "Birim Fiyat": st.column_config.NumberColumn("Birim Fiyat", format="%.6f"),
+                "Toplam Değer": st.column_config.NumberColumn("Toplam Değer", format="%.2f TL"),
+                "Günlük Getiri (%)": st.column_config.NumberColumn("Günlük Getiri (%)", format="%.4f %%"),
+                "Günlük Kazanç (TL)": st.column_config.NumberColumn("Günlük Kazanç (TL)", format="%.2f TL"),
+                "Ort. Maliyet": st.column_config.NumberColumn("Ort. Maliyet", format="%.6f"),
+                "Maliyet (TL)": st.column_config.NumberColumn("Maliyet (TL)", format="%.2f TL"),
+                "Gerçekleşmemiş K/Z (TL)": st.column_config.NumberColumn("Gerçekleşmemiş K/Z (TL)", format="%.2f TL"),
+                "Gerçekleşen K/Z (TL)": st.column_config.NumberColumn("Gerçekleşen K/Z (TL)", format="%.2f TL"),
+            }
+        )
+        
+        if not df_trades.empty:
+            with st.expander(f"🧾 Son İşlemler ({ledger_totals['trades']})"):
+                sides = df_trades["İşlem"].map({BUY: "Alış", SELL: "Satış"})
+                st.dataframe(df_trades.assign(**{"İşlem": sides}), width="stretch", hide_index=True)
+
+with st.sidebar:
+    st.header("🛠️ Fon Yönetimi")
+    st.info("Aşağıdaki tablodan fonlarınızı düzenleyin, yeni ekleyin veya silin.")
+    
+    current_funds = load_funds()
+    ledger_totals, df_trades = get_ledger_summary()
+    fund_editor(current_funds, bool(ledger_totals["trades"]))
+    
+    with st.expander("🔎 Fon Ara"):
+        fund_search()
+    
+    # Transactions ledger: holdings and cost basis of traded funds come from here
+    with st.expander("🧾 Alım / Satım Ekle"):
+        with st.form("trade_form", clear_on_submit=True):
+            trade_code = st.text_input("Fon Kodu", max_chars=3)
+            trade_side = st.radio("İşlem", [BUY, SELL], format_func={BUY: "Alış", SELL: "Satış"}.get, horizontal=True)
+            trade_date = st.date_input("Tarih", value=date.today(), max_value=date.today())
+            trade_qty = st.number_input("Adet", min_value=0.0, step=1.0)
+            trade_price = st.number_input("Birim Fiyat", min_value=0.0, step=0.000001, format="%.6f")
+            submitted = st.form_submit_button("➕ İşlemi Kaydet")
+        if submitted:
+            try:
+                saved = record_trade(trade_code, trade_date.isoformat(), trade_side, trade_qty, trade_price)
+            except LedgerError as e:
+                st.error(str(e))
+            else:
+                if saved:
+                    st.session_state.portfolio = None  # Holdings changed
+                    st.rerun()
+                st.error("İşlem kaydedilemedi.")
+    
+    with st.expander("📤 Dışa Aktar"):
+        export_panel()
     
     st.markdown("---")
+    
+    # Quote cache effectiveness
+    cache_stats = get_cache_stats()
+    cache_hits = cache_stats["memory_hits"] + cache_stats["disk_hits"]
+    st.caption(
+        f"⚡ Fiyat önbelleği: {cache_hits} isabet / {cache_stats['misses']} ıskalama "
+        f"(%{cache_stats['hit_ratio'] * 100:.0f})"
+    )
+    st.toggle("🩺 Tanılama paneli", key="show_diagnostics")
 
-# 1. Fetch Data (Only if not cached)
-if st.session_state.portfolio_df is None:
-    with st.spinner('Güncel fon fiyatları çekiliyor...'):
-        funds_to_load = load_funds()
-        if not funds_to_load:
-            st.warning("Henüz fon eklenmemiş. Yandan ekleyebilirsiniz.")
-            st.session_state.portfolio_df = pd.DataFrame()
-        else:
-            st.session_state.portfolio_df = get_portfolio_data(funds_to_load)
+# 1. Load Data (Only if not cached)
+# The background worker (worker.py) publishes the valued portfolio; reading it is a
+# single DB read. Scrape here only if no recent snapshot matches the current funds.
+if st.session_state.portfolio is None:
+    funds_to_load = current_funds
+    if not funds_to_load:
+        st.warning("Henüz fon eklenmemiş. Yandan ekleyebilirsiniz.")
+        st.session_state.portfolio = PortfolioTable(pd.DataFrame(), {}, None)
+    else:
+        st.session_state.portfolio = load_latest_portfolio(funds_to_load)
+        if st.session_state.portfolio is None:
+            with st.spinner('Güncel fon fiyatları çekiliyor...'):
+                st.session_state.portfolio = refresh_portfolio(funds_to_load)
 
-df_portfolio = st.session_state.portfolio_df
+portfolio_table = st.session_state.portfolio
+# Zero-copy view over the shared columns; columns added below stay local to this run
+df_portfolio = portfolio_table.frame()
+startup.mark("portfolio_ready")
 
-if df_portfolio.empty and not load_funds():
-    # Only show error if we really tried to fetch something and failed, 
-    # but here we handle "empty list" above. 
-    # This block handles "list exists but fetch returned empty" which is error case.
-    if load_funds(): 
-         st.error("Veri çekilemedi! İnternet bağlantınızı kontrol edin veya TEFAS'a erişim sorunu olabilir.")
+if df_portfolio.empty:
+    # No funds: the warning above was shown. Funds but no rows: every fetch failed.
+    if current_funds:
+        st.error("Veri çekilemedi! İnternet bağlantınızı kontrol edin veya TEFAS'a erişim sorunu olabilir.")
 else:
     # Calculate Total
     current_total = df_portfolio["Toplam Değer"].sum()
     
-    # Save/Update History
-    df_history = save_daily_total(current_total)
+    # Funds whose price could not be fetched are not in the table nor in the total
+    missing_codes = sorted(set(positions_signature(current_funds)) - set(df_portfolio["Fon Kodu"]))
+    if missing_codes:
+        failed_funds = df_portfolio.attrs.get("failed_funds", {})
+        reasons = {"not_found": "fiyat bulunamadı", "circuit_open": "TEFAS erişilemiyor", "error": "hata"}
+        details = ", ".join(
+            f"{code} ({reasons.get(failed_funds[code]['status'], failed_funds[code]['status'])})"
+            if code in failed_funds else code
+            for code in missing_codes
+        )
+        st.warning(f"⚠️ {len(missing_codes)} fonun fiyatı alınamadı, toplama dahil edilmedi: {details}")
+    
+    # Daily totals are written by whoever refreshed the portfolio
+    df_history = get_history_df()
     
     # --- METRICS SECTION ---
-    st.markdown("### 📊 Özet Durum")
-    col1, col2, col3 = st.columns(3)
+    with timer("render.metrics"):
+        st.markdown("### 📊 Özet Durum")
+        updated_at = portfolio_table.updated_at
+        if updated_at is not None:
+            local_updated_at = updated_at + timedelta(hours=TEFAS_UTC_OFFSET_HOURS)
+            st.caption(f"🕒 Son güncelleme: {local_updated_at:%d.%m.%Y %H:%M}")
+        col1, col2, col3 = st.columns(3)
     
-    # Calculate daily change if possible
-    delta_val = 0
-    delta_percent = 0
-    if len(df_history) >= 2:
-        yesterday_val = df_history.iloc[-2]["TotalValue"]
-        delta_val = current_total - yesterday_val
-        delta_percent = (delta_val / yesterday_val) * 100
+        # Calculate daily change if possible
+        delta_val = 0
+        delta_percent = 0
+        if len(df_history) >= 2:
+            yesterday_val = df_history.iloc[-2]["TotalValue"]
+            delta_val = current_total - yesterday_val
+            delta_percent = (delta_val / yesterday_val) * 100
+        
+        col1.metric("Toplam Varlık", f"{current_total:,.2f} TL", f"{delta_val:,.2f} TL", delta_color="normal")
+        col2.metric("Günlük Değişim (%)", f"%{delta_percent:.2f}")
+        col3.metric("Fon Sayısı", len(df_portfolio))
         
-    col1.metric("Toplam Varlık", f"{current_total:,.2f} TL", f"{delta_val:,.2f} TL", delta_color="normal")
-    col2.metric("Günlük Değişim (%)", f"%{delta_percent:.2f}")
-    col3.metric("Fon Sayısı", len(df_portfolio))
+        # Cost basis and P&L of the funds entered through transactions
+        df_portfolio = add_cost_basis(df_portfolio)
+        if "Maliyet (TL)" in df_portfolio.columns:
+            traded = df_portfolio["Maliyet (TL)"].notna()
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Maliyet", f"{df_portfolio.loc[traded, 'Maliyet (TL)'].sum():,.2f} TL")
+            col2.metric("Gerçekleşmemiş K/Z", f"{df_portfolio.loc[traded, 'Gerçekleşmemiş K/Z (TL)'].sum():,.2f} TL")
+            col3.metric("Gerçekleşen K/Z", f"{ledger_totals['realized_pnl']:,.2f} TL")
     
     st.markdown("---")
     
     # --- CHARTS SECTION ---
-    # Use single column on mobile (auto-detected by Streamlit)
-    st.subheader("🍰 Fon Bazlı Dağılım")
-    df_pie = df_portfolio.groupby("Fon Kodu")["Toplam Değer"].sum().reset_index()
-    fig_pie = px.pie(df_pie, values='Toplam Değer', names='Fon Kodu', hole=0.4)
-    fig_pie.update_layout(height=350, margin=dict(l=20, r=20, t=40, b=20))
-    st.plotly_chart(fig_pie, width="stretch")
+    with timer("render.charts"):
+        # Use single column on mobile (auto-detected by Streamlit)
+        # Figures are built once per published snapshot and shared by every session
+        st.subheader("🍰 Fon Bazlı Dağılım")
+        st.plotly_chart(figures.allocation_pie(portfolio_table), width="stretch")
     
-    st.subheader("📊 Kategori Dağılımı")
-    if "Kategori" in df_portfolio.columns:
-        df_cat = df_portfolio.groupby("Kategori")["Toplam Değer"].sum().reset_index()
-        fig_cat = px.pie(df_cat, values='Toplam Değer', names='Kategori', hole=0.4)
-        fig_cat.update_layout(height=350, margin=dict(l=20, r=20, t=40, b=20))
-        st.plotly_chart(fig_cat, width="stretch")
-    else:
-        st.info("Kategori verisi bulunamadı.")
+        st.subheader("📊 Kategori Dağılımı")
+        if "Kategori" in df_portfolio.columns:
+            st.plotly_chart(figures.category_pie(portfolio_table), width="stretch")
+        else:
+            st.info("Kategori verisi bulunamadı.")
             
     st.markdown("---")
     
     # --- HISTORY CHART ---
-    st.subheader("🗓️ Tarihsel Gelişim")
-    if not df_history.empty:
-        df_history['Date'] = pd.to_datetime(df_history['Date'])
-        fig_line = px.line(df_history, x='Date', y='TotalValue', markers=True)
-        fig_line.update_layout(xaxis_title="Tarih", yaxis_title="Toplam Değer (TL)")
-        st.plotly_chart(fig_line, width="stretch")
-    else:
-        st.info("Henüz tarihsel veri yok.")
+    history_section()
+    
+    # --- RISK & PERFORMANCE ---
+    with timer("render.analytics"):
+        st.subheader("📐 Risk ve Performans")
+        analytics = get_portfolio_analytics(current_funds)
+        if analytics is None:
+            st.info("Risk analizi için en az iki günlük fiyat geçmişi gerekiyor.")
+        else:
+            summary = analytics["summary"]
+            st.caption(
+                f"{summary['start']:%d.%m.%Y} – {summary['end']:%d.%m.%Y} arası {summary['days']} işlem günü; "
+                "bugünkü adetlerin tüm dönem boyunca tutulduğu varsayılır."
+            )
+            pct = lambda value: "–" if pd.isna(value) else f"%{value * 100:.2f}"
+            ratio = lambda value: "–" if pd.isna(value) else f"{value:.2f}"
+            col1, col2, col3, col4, col5 = st.columns(5)
+            col1.metric("Yıllık Getiri", pct(summary["annualized_return"]))
+            col2.metric("Volatilite", pct(summary["volatility"]))
+            col3.metric("Sharpe", ratio(summary["sharpe"]))
+            col4.metric("Sortino", ratio(summary["sortino"]))
+            col5.metric("Maks. Düşüş", pct(summary["max_drawdown"]))
+            
+            fig_vol = figures.rolling_volatility_line(analytics)
+            if fig_vol is not None:
+                st.plotly_chart(fig_vol, width="stretch")
+            
+            st.plotly_chart(figures.drawdown_area(analytics), width="stretch")
+            
+            st.dataframe(
+                analytics["funds"],
+                width="stretch",
+                hide_index=True,
+                column_config={
+                    "Getiri (%)": st.column_config.NumberColumn(format="%.2f %%"),
+                    "Volatilite (%)": st.column_config.NumberColumn(format="%.2f %%"),
+                    "Sharpe": st.column_config.NumberColumn(format="%.2f"),
+                    "Maks. Düşüş (%)": st.column_config.NumberColumn(format="%.2f %%"),
+                    "Katkı (puan)": st.column_config.NumberColumn(format="%.2f"),
+                    "Kâr/Zarar (TL)": st.column_config.NumberColumn(format="%.2f TL"),
+                }
+            )
+            
+            fig_corr = figures.correlation_heatmap(analytics)
+            if fig_corr is not None:
+                st.plotly_chart(fig_corr, width="stretch")
     
     # --- DETAILED TABLE ---
-    st.markdown("### 📋 Detaylı Portföy Tablosu")
+    portfolio_details(portfolio_table, df_portfolio, df_trades, ledger_totals)
     
-    # 🔎 Category Filter
-    categories = ["Tümü"] + sorted(df_portfolio["Kategori"].dropna().unique().tolist())
-    selected_cat = st.selectbox("📂 Kategori Filtrele", categories)
+    # Reload Button
+    if st.button("🔄 Verileri Yenile"):
+        st.session_state.portfolio = None # Invalidate cache
+        st.rerun()
+
+# --- DIAGNOSTICS PANEL ---
+if st.session_state.get("show_diagnostics"):
+    st.markdown("---")
+    st.markdown("### 🩺 Tanılama")
     
-    if selected_cat == "Tümü":
-        df_filtered = df_portfolio
+    metrics_snapshot = get_metrics_snapshot()
+    ms = lambda seconds: seconds * 1000 if seconds is not None else None
+    stage_rows = [
+        {
+            "Aşama": stage,
+            "Çağrı": summary["count"],
+            "Ortalama (ms)": ms(summary["mean_s"]),
+            "p50 (ms)": ms(summary["p50_s"]),
+            "p95 (ms)": ms(summary["p95_s"]),
+            "Maks (ms)": ms(summary["max_s"]),
+        }
+        for stage, summary in sorted(metrics_snapshot["stages"].items())
+    ]
+    if stage_rows:
+        st.dataframe(pd.DataFrame(stage_rows), width="stretch", hide_index=True)
     else:
-        df_filtered = df_portfolio[df_portfolio["Kategori"] == selected_cat]
+        st.info("Henüz ölçüm yok.")
     
-    # Reorder columns to put Category early
-    cols = ["Fon Kodu", "Kategori", "Adet", "Birim Fiyat", "Toplam Değer", "Günlük Getiri (%)", "Günlük Kazanç (TL)"]
-    # Filter only existing cols just in case
-    cols = [c for c in cols if c in df_filtered.columns]
+    col_counters, col_cache, col_fetch = st.columns(3)
+    col_counters.markdown("**Sayaçlar**")
+    col_counters.json(metrics_snapshot["counters"])
+    col_cache.markdown("**Fiyat önbelleği**")
+    col_cache.json(get_cache_stats())
+    col_fetch.markdown("**TEFAS bağlantısı**")
+    col_fetch.json(get_fetch_status())
     
-    st.dataframe(
-        df_filtered[cols],
-        width="stretch",
-        hide_index=True,
-        column_config={
-            "Fon Kodu": st.column_config.TextColumn("Fon Kodu"),
-            "Kategori": st.column_config.TextColumn("Kategori"),
-            "Adet": st.column_config.NumberColumn("Adet", format="%.0f"),
-            "Birim Fiyat": st.column_config.NumberColumn("Birim Fiyat", format="%.6f"),
-            "Toplam Değer": st.column_config.NumberColumn("Toplam Değer", format="%.2f TL"),
-            "Günlük Getiri (%)": st.column_config.NumberColumn("Günlük Getiri (%)", format="%.4f %%"),
-            "Günlük Kazanç (TL)": st.column_config.NumberColumn("Günlük Kazanç (TL)", format="%.2f TL"),
-        }
+    st.caption(
+        f"🧮 Portföy tablosu: {len(portfolio_table)} satır, {portfolio_table.nbytes() / 1024:.1f} KB "
+        "(tüm oturumlar aynı salt okunur tabloyu paylaşır)"
     )
     
-    # Reload Button
-    if st.button("🔄 Verileri Yenile"):
-        st.session_state.portfolio_df = None # Invalidate cache
-        st.rerun()
+    with st.expander("🚀 Açılış süresi"):
+        st.json(startup.report())
+    
+    col_prom, col_json = st.columns(2)
+    col_prom.download_button(
+        "⬇️ Prometheus", get_metrics_prometheus(), file_name="portfolio_metrics.prom", mime="text/plain"
+    )
+    col_json.download_button(
+        "⬇️ JSON", json.dumps(metrics_snapshot, indent=2), file_name="portfolio_metrics.json", mime="application/json"
+    )
@@ -0,0 +1,127 @@
+# benchmarks/bench_parse.py
+"""
+Compares the legacy FonAnaliz parse (decode + full lxml tree + absolute XPaths)
+with tefas_parser.parse_fund_page on the saved fixture pages.
+
+Usage:
+    python benchmarks/bench_parse.py [--iterations 200]
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from lxml import etree, html
+
+from config import XPATH_PRICE, XPATH_DAILY_RETURN, XPATH_CATEGORY
+from tefas_parser import extract_panel, parse_fund_page
+
+FIXTURES_DIR = os.path.join(ROOT, "benchmarks", "fixtures")
+
+
+def legacy_parse_fund_page(content):
+    """The pre-tefas_parser implementation, kept here as the baseline."""
+    html_content = content.decode("utf-8")
+    tree = html.fromstring(html_content)
+    price_result = tree.xpath(XPATH_PRICE)
+    return_result = tree.xpath(XPATH_DAILY_RETURN)
+    category_result = tree.xpath(XPATH_CATEGORY)
+
+    price_val = None
+    return_val = 0.0
+    category_val = "Diğer"
+
+    if price_result:
+        text_value = price_result[0].text_content().strip()
+        price_val = float(text_value.replace(".", "").replace(",", "."))
+    if return_result:
+        text_return = return_result[0].text_content().strip()
+        clean_return = text_return.replace("%", "").replace(".", "").replace(",", ".")
+        return_val = float(clean_return)
+    if category_result:
+        category_val = category_result[0].text_content().strip()
+
+    if price_val is None:
+        return None, None, None
+    return price_val, return_val, category_val
+
+
+PARSERS = {
+    "legacy": legacy_parse_fund_page,
+    "fast": parse_fund_page,
+}
+
+
+def cpu_time_per_page(parser, content, iterations):
+    """Average CPU seconds per parse."""
+    parser(content)  # warm up
+    start = time.process_time()
+    for _ in range(iterations):
+        parser(content)
+    return (time.process_time() - start) / iterations
+
+
+def python_peak_per_page(parser, content):
+    """Peak Python heap allocation (bytes) during one parse, e.g. the decoded page str."""
+    tracemalloc.start()
+    parser(content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def tree_nodes_per_page(name, content):
+    """
+    Number of nodes libxml2 materialises for one parse. tracemalloc cannot see
+    libxml2's allocations, so the node count stands in for tree memory.
+    """
+    if name == "legacy":
+        tree = html.fromstring(content.decode("utf-8"))
+    else:
+        region = extract_panel(content)
+        tree = etree.fromstring(region if region is not None else content, etree.HTMLParser(encoding="utf-8"))
+    return sum(1 for _ in tree.iter())
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--iterations", type=int, default=200)
+    args = arg_parser.parse_args()
+
+    fixtures = sorted(glob.glob(os.path.join(FIXTURES_DIR, "*.html")))
+    if not fixtures:
+        sys.exit(f"No fixture pages in {FIXTURES_DIR}")
+
+    print(f"{'page':<10}{'size':>9}  {'parser':<8}{'cpu/page':>12}{'py peak':>12}{'nodes':>9}")
+    for path in fixtures:
+        with open(path, "rb") as f:
+            content = f.read()
+        page = os.path.splitext(os.path.basename(path))[0]
+
+        results = {}
+        for name, parser in PARSERS.items():
+            cpu = cpu_time_per_page(parser, content, args.iterations)
+            py_peak = python_peak_per_page(parser, content)
+            nodes = tree_nodes_per_page(name, content)
+            results[name] = (cpu, py_peak, nodes)
+            print(
+                f"{page:<10}{len(content) / 1024:>7.0f}KB  {name:<8}"
+                f"{cpu * 1e6:>10.0f}µs{py_peak / 1024:>10.0f}KB{nodes:>9}"
+            )
+
+        assert PARSERS["legacy"](content) == PARSERS["fast"](content), f"Parsers disagree on {page}"
+        legacy, fast = results["legacy"], results["fast"]
+        print(
+            f"{'':<10}{'':>9}  cpu {legacy[0] / fast[0]:.1f}x faster, "
+            f"py peak {legacy[1] / max(fast[1], 1):.0f}x, nodes {legacy[2] / fast[2]:.0f}x fewer\n"
+        )
+
+
+if __name__ == "__main__":
+    main()
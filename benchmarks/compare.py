@@ -0,0 +1,57 @@
+# benchmarks/compare.py
+"""
+Compares two benchmark result files written by benchmarks/run.py.
+
+Usage:
+    python benchmarks/compare.py baseline.json current.json [--threshold 0.10] [--fail-on-regression]
+"""
+
+import argparse
+import json
+import sys
+
+
+def load_results(path):
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return data.get("meta", {}), {(r["stage"], r["size"]): r for r in data["results"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="relative slowdown of the median reported as a regression (default 10%%)")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with status 1 on any regression")
+    args = parser.parse_args()
+
+    base_meta, baseline = load_results(args.baseline)
+    cur_meta, current = load_results(args.current)
+    print(f"baseline: {base_meta.get('git_revision')} ({base_meta.get('timestamp')})")
+    print(f"current:  {cur_meta.get('git_revision')} ({cur_meta.get('timestamp')})\n")
+    print(f"{'stage':<24}{'size':>7}{'baseline ms':>14}{'current ms':>14}{'ratio':>9}")
+
+    regressions = 0
+    for key in sorted(set(baseline) & set(current)):
+        before = baseline[key]["median_s"]
+        after = current[key]["median_s"]
+        ratio = after / before if before else float("inf")
+        flag = ""
+        if ratio > 1 + args.threshold:
+            flag = "  ⚠️ slower"
+            regressions += 1
+        elif ratio < 1 - args.threshold:
+            flag = "  ✅ faster"
+        print(f"{key[0]:<24}{key[1]:>7}{before * 1000:>14.2f}{after * 1000:>14.2f}{ratio:>8.2f}x{flag}")
+
+    for key in sorted(set(baseline) ^ set(current)):
+        side = "baseline" if key in baseline else "current"
+        print(f"{key[0]:<24}{key[1]:>7}  only in {side}")
+
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
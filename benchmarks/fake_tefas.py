@@ -0,0 +1,120 @@
+# benchmarks/fake_tefas.py
+"""
+Local stand-in for tefas.gov.tr that serves the recorded FonAnaliz pages in
+benchmarks/fixtures with injectable latency.
+
+Usage as a standalone server:
+    python benchmarks/fake_tefas.py --port 8765 --latency 0.05
+"""
+
+import argparse
+import glob
+import os
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def load_fixture_pages(fixtures_dir: str = FIXTURES_DIR):
+    """Returns the raw bytes of every fixture page, sorted by file name."""
+    pages = []
+    for path in sorted(glob.glob(os.path.join(fixtures_dir, "*.html"))):
+        with open(path, "rb") as f:
+            pages.append(f.read())
+    if not pages:
+        raise FileNotFoundError(f"No fixture pages in {fixtures_dir}")
+    return pages
+
+
+class FakeTefasServer:
+    """
+    Threaded HTTP/1.1 server answering /FonAnaliz.aspx?FonKod=XXX with a fixture page.
+    Every fund code maps to the same fixture on every request. Each response is delayed by
+    `latency` seconds plus up to `jitter` seconds, and a `error_rate` fraction answers 503.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, error_rate=0.0,
+                 fixtures_dir: str = FIXTURES_DIR):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.pages = load_fixture_pages(fixtures_dir)
+        self.requests_served = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real site
+
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                code = query.get("FonKod", [""])[0]
+                delay = server.latency + (random.uniform(0, server.jitter) if server.jitter else 0.0)
+                if delay:
+                    time.sleep(delay)
+                server.requests_served += 1
+
+                if server.error_rate and random.random() < server.error_rate:
+                    body, status = b"Service Unavailable", 503
+                else:
+                    page_index = zlib.crc32(code.encode()) % len(server.pages)
+                    body, status = server.pages[page_index], 200
+
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/FonAnaliz.aspx"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-tefas", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random delay, up to this many seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    args = parser.parse_args()
+
+    server = FakeTefasServer(port=args.port, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate)
+    print(f"Serving fake TEFAS at {server.url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        server._httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+# benchmarks/run.py
+"""
+Benchmark suite for the refresh pipeline, fully offline.
+
+TEFAS is replaced by benchmarks/fake_tefas.py serving the recorded fixture pages,
+MongoDB by mongomock (default) or a local mongod (--mongo-uri); --sqlite runs the
+same stages on the embedded SQLite backend instead. Results are written as JSON
+so two runs can be compared with benchmarks/compare.py.
+
+Stages:
+    scrape         fetch engine only: N pages over the pooled client
+    parse          tefas_parser.parse_fund_page on N pages
+    refresh        get_portfolio_data with a cold quote cache (fetch + parse + value + snapshots)
+    valuation      positions_frame + value_portfolio for N positions
+    history_load   get_history_range over N stored days (full and downsampled)
+    history_save   repository daily total (write-behind + flush) with N stored days:
+                   a changed total, then the same total again (must write nothing)
+    funds_save     save_all_funds_to_db: initial N funds, then one changed cell
+
+Usage:
+    pip install -r benchmarks/requirements.txt
+    python benchmarks/run.py --sizes 10,100,1000,10000 --latency 0.02
+    python benchmarks/run.py --stages parse,valuation --output /tmp/after.json
+    python benchmarks/run.py --sqlite --stages history_load,funds_save
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import data_manager
+import db_manager
+import quote_cache
+import storage
+from fake_tefas import FakeTefasServer, load_fixture_pages
+from fetch_engine import get_fetch_engine
+from metrics import registry
+from repository import PortfolioRepository
+from sqlite_backend import SQLiteBackend
+import tefas_parser
+from tefas_parser import parse_fund_page
+from valuation import positions_frame, value_portfolio
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+STAGES = ["scrape", "parse", "refresh", "valuation", "history_load", "history_save", "funds_save"]
+CATEGORIES = ["Hisse Senedi Şemsiye Fonu", "Para Piyasası Şemsiye Fonu", "Borçlanma Araçları Şemsiye Fonu"]
+
+
+# --- backends ---
+
+def use_mongo_backend(mongo_uri=None, db_name="portfolio_bench"):
+    """Points db_manager at mongomock or a local mongod and returns the database."""
+    if mongo_uri:
+        from pymongo import MongoClient
+        client = MongoClient(mongo_uri, serverSelectionTimeoutMS=5000)
+    else:
+        import mongomock
+        client = mongomock.MongoClient()
+    db = client[db_name]
+    db_manager._mongo_client = client
+    db_manager._db = db
+    storage.set_storage_backend(storage.create_storage_backend("mongo"))
+    reset_database(db)
+    return db
+
+
+def use_sqlite_backend(path=None):
+    """Points db_manager at a fresh SQLite file (default: in a temporary directory)."""
+    backend = SQLiteBackend(path or os.path.join(tempfile.mkdtemp(prefix="portfolio_bench_"), "bench.sqlite3"))
+    storage.set_storage_backend(backend)
+    reset_database(backend)
+    return backend
+
+
+def reset_database(db):
+    if isinstance(db, SQLiteBackend):
+        conn = db.connect()
+        with conn:
+            for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall():
+                conn.execute(f"DELETE FROM {name}")
+    else:
+        for name in db.list_collection_names():
+            db.drop_collection(name)
+        db_manager.ensure_indexes(db)
+    db_manager.invalidate_history_cache()
+
+
+def fund_codes(n):
+    return [f"B{i:04d}" for i in range(n)]
+
+
+# --- timing ---
+
+def measure(fn, repeat, setup=None):
+    """Runs setup() (untimed) and fn() `repeat` times; returns the list of wall times."""
+    times = []
+    for _ in range(repeat):
+        state = setup() if setup else None
+        start = time.perf_counter()
+        fn(state) if setup else fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+# --- stages: each returns {label: [seconds, ...]} for one size ---
+
+def bench_scrape(n, ctx):
+    codes = fund_codes(n)
+    engine = get_fetch_engine()
+    engine.fetch_pages(codes[:1], url=ctx["server"].url)  # open the pooled connection
+    return {"scrape": measure(lambda: engine.fetch_pages(codes, url=ctx["server"].url), ctx["repeat"])}
+
+
+def bench_parse(n, ctx):
+    pages = ctx["pages"]
+    batch = [pages[i % len(pages)] for i in range(n)]
+    return {"parse": measure(lambda: [parse_fund_page(p) for p in batch], ctx["repeat"])}
+
+
+def bench_refresh(n, ctx):
+    funds = [{"kod": code, "adet": random.randint(1, 1000)} for code in fund_codes(n)]
+
+    def setup():
+        # Cold, memory-only cache so every run really goes to the (fake) network and parses
+        quote_cache._quote_cache = quote_cache.QuoteCache(db_path=None)
+        tefas_parser._page_memo = None
+        reset_database(ctx["db"])
+
+    return {"refresh": measure(lambda _: data_manager.get_portfolio_data(funds), ctx["repeat"], setup)}
+
+
+def bench_valuation(n, ctx):
+    codes = fund_codes(min(n, 5000))
+    quotes = {c: (random.uniform(1, 100), random.uniform(-3, 3), random.choice(CATEGORIES)) for c in codes}
+    funds = [{"kod": random.choice(codes), "adet": random.randint(1, 1000)} for _ in range(n)]
+    return {"valuation": measure(lambda: value_portfolio(positions_frame(funds), quotes), ctx["repeat"])}
+
+
+def _seed_history(db, n):
+    start = date.today() - timedelta(days=n)
+    db_manager.save_history_records_to_db([
+        {"date": (start + timedelta(days=i)).strftime("%Y-%m-%d"), "total_value": 100000.0 + i * random.uniform(-50, 80)}
+        for i in range(n)
+    ])
+
+
+def bench_history_load(n, ctx):
+    reset_database(ctx["db"])
+    _seed_history(ctx["db"], n)
+    cold = lambda: db_manager.invalidate_history_cache()
+    warm = lambda: db_manager.get_history_range()
+    return {
+        "history_load": measure(lambda _: db_manager.get_history_range(), ctx["repeat"], cold),
+        "history_load_500pts": measure(lambda _: db_manager.get_history_range(max_points=500), ctx["repeat"], cold),
+        "history_load_memo": measure(lambda _: db_manager.get_history_range(), ctx["repeat"], warm),
+    }
+
+
+def _history_writes():
+    return registry.snapshot()["counters"].get("history.write_behind.records", 0)
+
+
+def bench_history_save(n, ctx):
+    reset_database(ctx["db"])
+    _seed_history(ctx["db"], n)
+    repository = PortfolioRepository()
+    total = [random.uniform(1e5, 2e5)]
+
+    def save(change):
+        total[0] += change
+        repository.save_daily_total(total[0])
+        repository.flush_writes()
+
+    results = {"history_save": measure(lambda: save(1000.0), ctx["repeat"])}
+    writes = _history_writes()
+    results["history_save_unchanged"] = measure(lambda: save(0.0), ctx["repeat"])
+    if _history_writes() != writes:
+        print(f"⚠️  history_save_unchanged wrote {_history_writes() - writes} totals, expected none")
+    return results
+
+
+def bench_funds_save(n, ctx):
+    funds = [{"kod": code, "adet": float(random.randint(1, 1000))} for code in fund_codes(n)]
+    changed = [dict(f) for f in funds]
+    changed[0]["adet"] += 1
+
+    def fresh():
+        reset_database(ctx["db"])
+
+    def seeded():
+        reset_database(ctx["db"])
+        db_manager.save_all_funds_to_db(funds)
+
+    return {
+        "funds_save_initial": measure(lambda _: db_manager.save_all_funds_to_db(funds), ctx["repeat"], fresh),
+        "funds_save_one_change": measure(lambda _: db_manager.save_all_funds_to_db(changed), ctx["repeat"], seeded),
+    }
+
+
+BENCHMARKS = {
+    "scrape": bench_scrape,
+    "parse": bench_parse,
+    "refresh": bench_refresh,
+    "valuation": bench_valuation,
+    "history_load": bench_history_load,
+    "history_save": bench_history_save,
+    "funds_save": bench_funds_save,
+}
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stages", default=",".join(STAGES), help="comma-separated subset of: " + ", ".join(STAGES))
+    parser.add_argument("--sizes", default="10,100,1000", help="comma-separated portfolio sizes, e.g. 10,100,1000,10000")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.02, help="fake TEFAS response latency (seconds)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random fake TEFAS latency (seconds)")
+    parser.add_argument("--mongo-uri", default=None, help="use a local mongod instead of mongomock")
+    parser.add_argument("--sqlite", action="store_true", help="use the embedded SQLite backend instead of MongoDB")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="JSON result file (default: benchmarks/results/<timestamp>.json)")
+    args = parser.parse_args()
+
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = [s for s in stages if s not in BENCHMARKS]
+    if unknown:
+        sys.exit(f"Unknown stages: {', '.join(unknown)}")
+    sizes = [int(s) for s in args.sizes.split(",")]
+    random.seed(args.seed)
+
+    server = FakeTefasServer(latency=args.latency, jitter=args.jitter).start()
+    data_manager.TEFAS_URL = server.url
+    ctx = {
+        "server": server,
+        "pages": load_fixture_pages(),
+        "db": use_sqlite_backend() if args.sqlite else use_mongo_backend(args.mongo_uri),
+        "repeat": args.repeat,
+    }
+
+    results = []
+    try:
+        for stage in stages:
+            for n in sizes:
+                for label, times in BENCHMARKS[stage](n, ctx).items():
+                    row = {
+                        "stage": label,
+                        "size": n,
+                        "repeat": len(times),
+                        "min_s": min(times),
+                        "median_s": statistics.median(times),
+                        "per_item_us": statistics.median(times) / n * 1e6,
+                    }
+                    results.append(row)
+                    print(f"{label:<24}{n:>7}  median {row['median_s'] * 1000:>10.2f} ms  "
+                          f"({row['per_item_us']:>9.1f} µs/item)")
+    finally:
+        server.stop()
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({
+            "meta": {
+                "timestamp": datetime.now().isoformat(timespec="seconds"),
+                "git_revision": git_revision(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "backend": "sqlite" if args.sqlite else "mongod" if args.mongo_uri else "mongomock",
+                "latency_s": args.latency,
+                "jitter_s": args.jitter,
+                "seed": args.seed,
+            },
+            "results": results,
+        }, f, indent=2)
+    print(f"\n📄 Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,3 +7,84 @@ XPATH_DAILY_RETURN = '//*[@id="MainContent_PanelInfo"]/div[1]/ul[1]/li[2]/span'
 XPATH_CATEGORY = '//*[@id="MainContent_PanelInfo"]/div[1]/ul[1]/li[5]/span'
 HISTORY_FILE = "portfolio_history.csv"
 
+
+# Quote cache (in-memory LRU + on-disk SQLite tier)
+TEFAS_UTC_OFFSET_HOURS = 3  # Europe/Istanbul, no DST since 2016
+QUOTE_CACHE_FILE = "quote_cache.sqlite3"
+QUOTE_CACHE_MEMORY_ENTRIES = 2048
+QUOTE_CACHE_DISK_ENTRIES = 50000
+QUOTE_CACHE_TTL_SECONDS = 15 * 60  # Refetch interval while TEFAS is publishing today's prices
+QUOTE_CACHE_HISTORICAL_TTL_SECONDS = 30 * 24 * 3600  # Quotes for past price dates never change
+
+# Refresh planner (market_calendar.py): prices change once per business day
+TEFAS_PUBLICATION_START = "09:00"  # Istanbul time; first prices of the day appear
+TEFAS_PUBLICATION_END = "12:00"  # All funds published; later fetches are final for the day
+MARKET_EXTRA_HOLIDAYS = ()  # YYYY-MM-DD market closures not in market_calendar.py (e.g. bridge days)
+
+# Fund universe index (fund_universe.py): every TEFAS fund, for autocomplete and code validation
+FUND_UNIVERSE_URL = "https://www.tefas.gov.tr/api/DB/BindComparisonFundReturns"
+FUND_UNIVERSE_FUND_TYPES = ("YAT", "EMK", "BYF")  # Mutual, pension and exchange traded funds
+FUND_UNIVERSE_FILE = "fund_universe.json"
+FUND_UNIVERSE_MAX_AGE_SECONDS = 7 * 24 * 3600  # Refreshed in the background when older
+FUND_UNIVERSE_RETRY_SECONDS = 3600  # After a failed refresh
+FUND_UNIVERSE_TIMEOUT_SECONDS = 60
+FUND_UNIVERSE_SEARCH_LIMIT = 10
+
+# Async fetch engine (one pooled keep-alive HTTP client per process)
+FETCH_MAX_CONNECTIONS = 20
+FETCH_MAX_CONNECTIONS_PER_HOST = 10
+FETCH_MAX_IN_FLIGHT = 20  # Upper bound for the adaptive limit
+FETCH_TIMEOUT_SECONDS = 10
+FETCH_KEEPALIVE_SECONDS = 30
+
+# History queries
+HISTORY_CHART_MAX_POINTS = 500
+HISTORY_CACHE_TTL_SECONDS = 300  # Picks up writes made by other processes
+HISTORY_WRITE_DELAY_SECONDS = 2.0  # Daily totals are written behind; updates within this window become one write
+HISTORY_WRITE_TOLERANCE = 0.005  # TL; a daily total closer than this to the stored one is not written again
+FIGURE_CACHE_ENTRIES = 64  # Memoised dashboard figures (figures.py), per (figure, data version)
+
+# Per-fund price snapshots
+SNAPSHOT_WRITE_BATCH_SIZE = 1000
+
+# Background refresh worker
+WORKER_REFRESH_INTERVAL_SECONDS = 15 * 60
+PORTFOLIO_SNAPSHOT_MAX_AGE_SECONDS = 2 * 3600  # Older snapshots mean the worker is not running
+
+# Fetch scheduling: adaptive (AIMD) concurrency, retries and circuit breaker
+FETCH_MIN_CONCURRENCY = 2
+FETCH_INITIAL_CONCURRENCY = 8
+FETCH_TARGET_LATENCY_SECONDS = 2.0  # Slower responses count as congestion
+FETCH_MAX_ATTEMPTS = 3
+FETCH_BACKOFF_BASE_SECONDS = 0.5
+FETCH_BACKOFF_MAX_SECONDS = 8.0
+CIRCUIT_FAILURE_THRESHOLD = 8  # Consecutive failed attempts before TEFAS is considered down
+CIRCUIT_RESET_SECONDS = 60
+
+# Startup: heavy modules are imported in the background (see startup.py), in this order
+HEAVY_MODULES = ("numpy", "pandas", "lxml.etree", "pymongo", "aiohttp", "plotly.express", "data_manager")
+STORAGE_WARMUP_ON_START = True  # Open the storage backend (MongoDB: connect + ping) in the background at start
+
+# Repository read-through cache (see repository.py)
+REPOSITORY_SYNC_INTERVAL_SECONDS = 1.0  # At most one change-counter read per interval (~ one per rerun)
+REPOSITORY_CHANGE_STREAMS = False  # Watch collections instead of polling; needs a replica set (e.g. Atlas)
+
+# Storage backend (see storage.py): "mongo" (MongoDB / Atlas) or "sqlite" (embedded, WAL mode)
+STORAGE_BACKEND = "mongo"
+STORAGE_SQLITE_FILE = "portfolio.sqlite3"
+
+# Analytics over the stored price history
+ANALYTICS_VOLATILITY_WINDOW = 21  # Trading days (~1 month) for rolling volatility
+ANALYTICS_RISK_FREE_RATE = 0.0  # Annual, used by Sharpe/Sortino (e.g. 0.45 for TL deposits)
+
+# Transactions ledger (see ledger.py)
+# Catch-up re-reads this many sequence numbers below the last one seen: with MongoDB, a
+# writer reserves its seq before inserting, so a lower seq can appear after a higher one
+LEDGER_SYNC_OVERLAP = 100
+
+# Bulk importer (migrate_to_mongodb.py)
+IMPORT_CHUNK_SIZE = 50_000  # Rows read, normalised and upserted at a time
+IMPORT_CHECKPOINT_FILE = ".import_checkpoint.json"  # Rows committed per imported file, for resuming
+
+# Streaming export (export.py)
+EXPORT_BATCH_SIZE = 50_000  # Rows per storage round trip, and per Parquet row group
@@ -1,163 +1,375 @@
-import requests
-from lxml import html
 import pandas as pd
 import os
 import json
+import threading
 from datetime import datetime
-from config import TEFAS_URL, XPATH_PRICE, XPATH_DAILY_RETURN, XPATH_CATEGORY, HISTORY_FILE
-from db_manager import (
-    load_funds_from_db,
-    save_fund_to_db,
-    save_all_funds_to_db,
-    delete_fund_from_db,
-    save_daily_total_to_db,
-    get_history_from_db
+from config import (
+    TEFAS_URL, HISTORY_FILE, PORTFOLIO_SNAPSHOT_MAX_AGE_SECONDS, FUND_UNIVERSE_SEARCH_LIMIT, LEDGER_SYNC_OVERLAP
 )
+from quote_cache import get_quote_cache, current_price_date
+from fetch_engine import get_fetch_engine
+from fetch_scheduler import OK, ERROR, NOT_FOUND, SingleFlight
+from tefas_parser import get_page_memo
+from valuation import positions_frame, value_portfolio, with_cost_basis
+from portfolio_table import PortfolioTable
+from metrics import timed, timer, registry
+from analytics import PortfolioAnalytics
+from ledger import FifoLedger, Trade, LedgerError
+from fund_universe import get_fund_universe
+from repository import get_repository, HISTORY, FUND_PRICES, TRANSACTIONS
+from db_manager import get_price_matrix
 
 FUNDS_FILE = "funds.json"  # Kept for backward compatibility, not used
 
+# Concurrent sessions asking for the same (fund code, price date) share one fetch
+_quote_flight = SingleFlight("tefas.fetch.coalesced")
+
+# Analytics of the current positions: {positions: (PortfolioAnalytics, prices version, results)}
+_analytics_cache = {}
+_analytics_lock = threading.Lock()
+
+# Transactions ledger, kept in memory and caught up with the new transactions only
+_ledger = FifoLedger()
+_ledger_state = {"version": None}
+_ledger_lock = threading.RLock()
+
+def _synced_ledger():
+    """The process-wide ledger, caught up with stored transactions. Call with _ledger_lock held."""
+    version = get_repository().version(TRANSACTIONS)
+    if version != _ledger_state["version"]:
+        # Overlapping re-read: a seq reserved earlier by another writer may be inserted late
+        records = get_repository().load_transactions(after_seq=max(0, _ledger.last_seq - LEDGER_SYNC_OVERLAP))
+        if records is not None:
+            with timer("ledger.sync"):
+                _ledger.extend(Trade.from_record(record) for record in records)
+            _ledger_state["version"] = version
+    return _ledger
+
 def load_funds():
-    """Loads funds from MongoDB."""
-    return load_funds_from_db()
+    """
+    Loads funds from MongoDB (served from memory until they change). Quantities of
+    funds with transactions are derived from the ledger.
+    """
+    funds = get_repository().load_funds()
+    with _ledger_lock:
+        ledger = _synced_ledger()
+        return ledger.holdings(funds) if ledger.books else funds
 
 def save_fund(code, qty):
     """Adds or updates a fund in MongoDB."""
-    return save_fund_to_db(code, qty)
+    return get_repository().save_fund(code, qty)
 
 def save_all_funds(funds_list):
     """Overwrites funds in MongoDB with the provided list."""
-    return save_all_funds_to_db(funds_list)
+    return get_repository().save_all_funds(funds_list)
+
+def search_funds(query, limit=FUND_UNIVERSE_SEARCH_LIMIT):
+    """TEFAS funds matching a code or name prefix, from the local fund universe index."""
+    return get_fund_universe().search(query, limit)
+
+def get_fund_universe_status():
+    """Size and download time of the local fund universe index."""
+    universe = get_fund_universe()
+    return {"funds": len(universe), "fetched_at": universe.fetched_at}
+
+def get_fund_picker(current_codes=()):
+    """
+    (codes, label function) for a fund code picker: every TEFAS code plus current_codes
+    (kept selectable even if they are not listed). No codes until the fund list is loaded.
+    """
+    universe = get_fund_universe()
+    if universe.empty:
+        return [], str
+    codes = universe.codes
+    extra = {str(code) for code in current_codes if code} - set(codes)
+    return (sorted([*codes, *extra]) if extra else codes), universe.label
+
+def find_unknown_funds(codes):
+    """{code: suggested codes} of codes that are not TEFAS funds ({} until the fund list is loaded)."""
+    return get_fund_universe().unknown_codes(codes)
 
 def delete_fund(code):
     """Deletes a fund from MongoDB."""
-    return delete_fund_from_db(code)
+    return get_repository().delete_fund(code)
+
+
+def fetch_fund_outcomes(fund_codes, price_date=None):
+    """
+    Fetches several funds concurrently through the shared fetch engine and parses them.
+    Returns {code: FetchOutcome}; failed funds are reported instead of silently dropped.
+    Each success is also stored as a per-fund snapshot for price_date (default: today).
+    Codes already being fetched by another session for the same price_date are not
+    fetched again; their (shared, read-only) outcome is awaited instead.
+    """
+    price_date = price_date or current_price_date()
 
+    def fetch_owned(keys):
+        outcomes = _fetch_and_parse([code for code, _ in keys], price_date)
+        return {(code, price_date): outcome for code, outcome in outcomes.items()}
+
+    shared = _quote_flight.do_many([(code, price_date) for code in fund_codes], fetch_owned)
+    return {code: shared[(code, price_date)] for code in dict.fromkeys(fund_codes)}
+
+def _fetch_and_parse(fund_codes, price_date):
+    engine = get_fetch_engine()
+    outcomes = engine.fetch_outcomes(fund_codes, url=TEFAS_URL)
+    page_memo = get_page_memo()
+    
+    quotes = {}
+    for code, outcome in outcomes.items():
+        if outcome.status != OK:
+            continue
+        try:
+            if outcome.not_modified:
+                # 304: the page we parsed last time is still current
+                parsed = page_memo.last(code)
+                if parsed is None:
+                    engine.forget_validators(code)
+                    raise ValueError("not modified, but the previous page was not kept")
+            else:
+                # Unchanged info panels are not parsed again
+                parsed, _ = page_memo.parse(code, outcome.content)
+            price, rate, cat = parsed
+        except Exception as e:
+            print(f"Error parsing {code}: {e}")
+            outcome.status, outcome.error = ERROR, f"parse error: {e}"
+            continue
+        finally:
+            outcome.content = None  # Pages are not needed once parsed
+        if price is None:
+            print(f"Warn: Price not found for {code}")
+            outcome.status, outcome.error = NOT_FOUND, "price not found on page"
+            continue
+        outcome.price, outcome.daily_return, outcome.category = price, rate, cat
+        quotes[code] = (price, rate, cat)
+    
+    record_price_snapshots(price_date, quotes)
+    return outcomes
+
+def fetch_fund_prices(fund_codes, price_date=None):
+    """
+    Fetches several funds concurrently.
+    Returns {code: (price, daily_return, category)} for the funds that succeeded.
+    """
+    return {
+        code: (o.price, o.daily_return, o.category)
+        for code, o in fetch_fund_outcomes(fund_codes, price_date).items()
+        if o.ok
+    }
+
+def record_price_snapshots(price_date, quotes):
+    """Stores {code: (price, daily_return, category)} as per-fund snapshots in one batch."""
+    return get_repository().save_price_snapshots([
+        {"kod": code, "date": price_date, "price": price, "daily_return": rate, "category": cat}
+        for code, (price, rate, cat) in quotes.items()
+    ])
 
 def fetch_fund_price(fund_code):
     """Fetches the latest price, daily return and category for a single fund code from TEFAS."""
-    try:
-        response = requests.get(TEFAS_URL, params={"FonKod": fund_code}, timeout=10)
-        response.encoding = "utf-8"
-        response.raise_for_status()
-        
-        # TEFAS typically sends UTF-8 but sometimes metadata is missing. 
-        # Explicitly decoding confirms we treat bytes as UTF-8.
-        html_content = response.content.decode("utf-8")
-        tree = html.fromstring(html_content)
-        price_result = tree.xpath(XPATH_PRICE)
-        return_result = tree.xpath(XPATH_DAILY_RETURN)
-        category_result = tree.xpath(XPATH_CATEGORY)
-        
-        price_val = None
-        return_val = 0.0
-        category_val = "Diğer"
-        
-        if price_result:
-            text_value = price_result[0].text_content().strip()
-            # Turkish locale formatting: 1.234,56 -> float
-            price_val = float(text_value.replace(".", "").replace(",", "."))
-            
-        if return_result:
-            text_return = return_result[0].text_content().strip()
-            # Format: %0,3999 or %-1,23 -> remove %, replace comma
-            clean_return = text_return.replace("%", "").replace(".", "").replace(",", ".")
-            return_val = float(clean_return)
-            
-        if category_result:
-            category_val = category_result[0].text_content().strip()
-
-        if price_val is None:
-            print(f"Warn: Price not found for {fund_code}")
-            return None, None, None
-            
-        return price_val, return_val, category_val
-
-    except Exception as e:
-        print(f"Error fetching {fund_code}: {e}")
-        return None, None, None
-
-from concurrent.futures import ThreadPoolExecutor, as_completed
+    return fetch_fund_prices([fund_code]).get(fund_code, (None, None, None))
 
+@timed("refresh")
 def get_portfolio_data(funds_config):
     """
-    Iterates over funds, fetches prices in parallel, and calculates values.
-    Returns a DataFrame with details and the total portfolio value.
+    Normalises positions, fetches prices concurrently, and values the portfolio
+    in one vectorized join. Returns a DataFrame with one row per fund code.
     """
-    data = []
-    
-    # 1. Identify unique codes to avoid redundant fetching
-    # Normalize codes: handle cases where data_editor returns lists
-    normalized_codes = []
-    for f in funds_config:
-        kod = f.get("kod")
-        # If kod is a list, take first element; otherwise use as-is
-        if isinstance(kod, list):
-            kod = kod[0] if kod else None
-        if kod:
-            normalized_codes.append(str(kod).strip().upper())
-    
-    unique_codes = list(set(normalized_codes))
+    # 1. Normalize positions (list values from data_editor, duplicate codes)
+    positions = positions_frame(funds_config)
+    unique_codes = positions["kod"].unique().tolist()
     # Cache stores tuple: (price, daily_return_percent, category)
     price_cache = {}
 
-    # 2. Fetch data in parallel
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        # Map future to fund code
-        future_to_code = {executor.submit(fetch_fund_price, code): code for code in unique_codes}
-        
-        for future in as_completed(future_to_code):
-            code = future_to_code[future]
-            try:
-                price, rate, cat = future.result()
-                if price is not None:
-                    price_cache[code] = (price, rate, cat)
-            except Exception as e:
-                print(f"Parallel fetch error for {code}: {e}")
-
-    # 3. Build DataFrame
-    for fund in funds_config:
-        kod = fund.get("kod")
-        adet = fund.get("adet")
+    # 2. Serve what we can from the process-wide quote cache
+    quote_cache = get_quote_cache()
+    price_date = current_price_date()
+    codes_to_fetch = []
+    for code in unique_codes:
+        quote = quote_cache.get(code, price_date)
+        if quote is not None:
+            price_cache[code] = quote
+        else:
+            codes_to_fetch.append(code)
+
+    # 3. Fetch the rest concurrently over the pooled async client
+    failed_funds = {}
+    if codes_to_fetch:
+        fetched = {}
+        for code, outcome in fetch_fund_outcomes(codes_to_fetch, price_date).items():
+            if outcome.ok:
+                fetched[code] = (outcome.price, outcome.daily_return, outcome.category)
+            else:
+                failed_funds[code] = {"status": outcome.status, "error": outcome.error, "attempts": outcome.attempts}
+        quote_cache.put_many(price_date, fetched)
+        price_cache.update(fetched)
+
+    # 4. Value all positions at once
+    with timer("valuation"):
+        df = value_portfolio(positions, price_cache)
+    # Funds missing from df (and from the total), with the reason
+    df.attrs["failed_funds"] = failed_funds
+    return df
+
+def positions_signature(funds_config):
+    """{kod: adet} of the normalised positions; tells whether a snapshot matches the current funds."""
+    positions = positions_frame(funds_config)
+    return {kod: float(adet) for kod, adet in zip(positions["kod"], positions["adet"])}
+
+def refresh_portfolio(funds_config):
+    """
+    Values the portfolio and publishes it as the latest snapshot, together with today's total.
+    Used by the background worker and as the app's fallback when no fresh snapshot exists.
+    Returns the shared, read-only PortfolioTable.
+    """
+    df = get_portfolio_data(funds_config)
+    table = PortfolioTable.from_frame(df, positions_signature(funds_config), datetime.utcnow())
+    if table.empty:
+        # Nothing could be valued (e.g. TEFAS is down): keep the previous snapshot published
+        return table
+    repository = get_repository()
+    repository.save_portfolio_snapshot(table)
+    repository.save_daily_total(table.total_value)
+    return table
+
+def load_latest_portfolio(funds_config, max_age_seconds=PORTFOLIO_SNAPSHOT_MAX_AGE_SECONDS):
+    """
+    Returns the latest snapshot as the process-wide PortfolioTable, or None if there is none,
+    it is older than max_age_seconds, or it was computed from different positions.
+    """
+    table = get_repository().load_portfolio_snapshot()
+    if table is None or table.updated_at is None:
+        return None
+    age = (datetime.utcnow() - table.updated_at).total_seconds()
+    if age > max_age_seconds:
+        return None
+    if table.positions != positions_signature(funds_config):
+        return None
+    return table
+
+def record_trade(kod, trade_date, side, quantity, price):
+    """
+    Appends a buy or sell to the transactions ledger. Raises ledger.LedgerError if it is
+    invalid or sells more than held (at its date or after); returns False if the write failed.
+    The sell check holds within this process only: two processes (e.g. two app servers)
+    recording sells of the same fund at once can still oversell it together. Such a trade
+    is then kept out of the books (see FifoLedger.rejected) when the ledger loads it.
+    """
+    kod = str(kod or "").strip().upper()
+    trade_date = str(trade_date)
+    unknown = find_unknown_funds([kod])
+    if unknown:
+        suggestions = unknown[kod]
+        raise LedgerError(
+            f"{kod}: TEFAS'ta böyle bir fon yok." + (f" Şunlardan biri mi: {', '.join(suggestions)}?" if suggestions else "")
+        )
+    with _ledger_lock:
+        # Checked and written under the lock: concurrent sessions cannot oversell together
+        _synced_ledger().check(kod, trade_date, side, quantity, price)
+        seqs = get_repository().save_transactions([
+            {"kod": kod, "date": trade_date, "side": side, "adet": quantity, "fiyat": price}
+        ])
+        if seqs:
+            _synced_ledger()
+        return bool(seqs)
+
+def add_cost_basis(portfolio_df):
+    """Adds cost basis and realised/unrealised P&L columns for funds with transactions."""
+    with _ledger_lock:
+        ledger = _synced_ledger()
+        if not ledger.books or portfolio_df.empty:
+            return portfolio_df
+        cost_basis = ledger.cost_basis()
+    return with_cost_basis(portfolio_df, cost_basis)
+
+def get_ledger_summary(recent=50):
+    """Ledger totals ({trades, cost, realized_pnl}) and the most recent transactions as a DataFrame."""
+    with _ledger_lock:
+        ledger = _synced_ledger()
+        totals = ledger.totals()
+        trades = ledger.recent_trades(recent)
+    recent_df = pd.DataFrame(
+        [(t.date, t.kod, t.side, t.quantity, t.price, t.quantity * t.price) for t in trades],
+        columns=["Tarih", "Fon Kodu", "İşlem", "Adet", "Fiyat", "Tutar (TL)"]
+    )
+    return totals, recent_df
+
+def get_portfolio_analytics(funds_config):
+    """
+    Risk and performance analytics of the current positions over the stored price history:
+    {summary, funds, correlation, rolling_volatility, drawdown}, or None without enough history.
+    Built once per set of positions; when new prices are stored only the days since the last
+    build are read and folded in incrementally. Results are shared by all sessions.
+    """
+    positions = positions_signature(funds_config)
+    if not positions:
+        return None
+    key = tuple(sorted(positions.items()))
+    version = get_repository().version(FUND_PRICES)
+    
+    with _analytics_lock:
+        cached = _analytics_cache.get(key)
+        if cached is not None and cached[1] == version:
+            return cached[2]
         
-        # Normalize kod (handle list values from data_editor)
-        if isinstance(kod, list):
-            kod = kod[0] if kod else None
-        if kod:
-            kod = str(kod).strip().upper()
+        analytics = cached[0] if cached is not None else None
+        if analytics is not None and analytics.last_date is not None:
+            with timer("analytics.update"):
+                # From the last day on: it may have been revised since
+                analytics.append(get_price_history(list(positions), start_date=analytics.last_date))
         else:
-            continue
-            
-        # Normalize adet
-        if isinstance(adet, list):
-            adet = adet[0] if adet else 0
+            with timer("analytics.build"):
+                analytics = PortfolioAnalytics(get_price_history(list(positions)), positions)
         
-        if kod in price_cache:
-            fiyat, gunluk_getiri_yuzde, kategori = price_cache[kod]
-            
-            tutar = fiyat * adet
-            
-            # Calculate daily gain/loss value
-            rate = gunluk_getiri_yuzde
-            yesterday_price = fiyat / (1 + rate/100)
-            daily_gain = (fiyat - yesterday_price) * adet
-            
-            data.append({
-                "Fon Kodu": kod,
-                "Adet": adet,
-                "Birim Fiyat": fiyat,
-                "Toplam Değer": tutar,
-                "Günlük Getiri (%)": rate,
-                "Günlük Kazanç (TL)": daily_gain,
-                "Kategori": kategori
-            })
-
-    return pd.DataFrame(data)
+        results = None
+        if analytics.summary()["days"] >= 2:
+            results = {
+                "summary": analytics.summary(),
+                "funds": analytics.fund_table(),
+                "correlation": analytics.correlation(),
+                "rolling_volatility": analytics.rolling_volatility(),
+                "drawdown": analytics.drawdown(),
+                # Identifies these results, e.g. for memoised figures
+                "version": (key, version),
+            }
+        # Only the latest positions are kept; every session shares the same fund list
+        _analytics_cache.clear()
+        _analytics_cache[key] = (analytics, version, results)
+        return results
+
+def get_fetch_status():
+    """Adaptive concurrency limit, TEFAS circuit breaker state and coalesced fetches in flight."""
+    return {**get_fetch_engine().status(), "coalesced_in_flight": _quote_flight.in_flight()}
+
+def get_cache_stats():
+    """Returns hit/miss counters of the process-wide quote cache."""
+    return get_quote_cache().stats()
+
+def get_metrics_snapshot():
+    """Per-stage latency summaries and counters collected in this process."""
+    return registry.snapshot()
+
+def get_metrics_prometheus():
+    """All collected metrics in Prometheus text format."""
+    return registry.to_prometheus()
+
+def get_price_history(codes=None, start_date=None, end_date=None, field="price"):
+    """Get stored per-fund prices as a dates x funds matrix, without any network fetch."""
+    return get_price_matrix(codes, start_date, end_date, field)
 
 def save_daily_total(total_value):
-    """Saves today's total value to MongoDB for historical tracking."""
-    return save_daily_total_to_db(total_value)
+    """
+    Queues the total of the current price date for historical tracking (written behind, only if it changed)
+    and returns the full history, served from memory.
+    """
+    repository = get_repository()
+    repository.save_daily_total(total_value)
+    return repository.get_history()
+
+def get_history_version():
+    """Changes whenever the history served by get_history_df changes."""
+    return get_repository().version(HISTORY)
 
-def get_history_df():
-    """Get portfolio history from MongoDB."""
-    return get_history_from_db()
+def get_history_df(start_date=None, end_date=None, max_points=None):
+    """Get portfolio history from MongoDB, optionally limited to a date range and downsampled."""
+    return get_repository().get_history(start_date, end_date, max_points)
 
@@ -1,22 +1,67 @@
 # db_manager.py
-"""MongoDB database manager for portfolio tracking."""
+"""
+Database manager for portfolio tracking.
+
+The public functions below are the storage API the rest of the app uses. They
+delegate to the backend selected in config (see storage.py): MongoDB, implemented
+here as MongoBackend, or embedded SQLite (sqlite_backend.py).
+"""
 
 import streamlit as st
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure, OperationFailure
+from pymongo import MongoClient, ASCENDING, ReturnDocument, UpdateOne, DeleteMany
+from pymongo.errors import ConnectionFailure, OperationFailure, DuplicateKeyError
 import pandas as pd
-from datetime import datetime
-from typing import List, Dict, Optional
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import Iterable, Iterator, List, Dict, Optional, Union
+from config import HISTORY_CACHE_TTL_SECONDS, SNAPSHOT_WRITE_BATCH_SIZE, EXPORT_BATCH_SIZE
+from downsample import lttb_indices
+from metrics import timed, timer, inc
+from storage import StorageBackend, get_storage_backend
+from valuation import PORTFOLIO_COLUMNS
 
 # Global connection cache
 _mongo_client = None
 _db = None
+_connect_lock = threading.Lock()  # The startup warmup and the first session may connect at once
+
+# Memoised history queries: (start, end, max_points) -> (DataFrame, cached_at)
+_history_cache = {}
+_history_cache_lock = threading.Lock()
+
+# Index creation is reported once per process (tests and benchmarks re-bootstrap often)
+_indexes_reported = False
+
+# Indexes the app relies on: collection -> [(keys, options)]
+REQUIRED_INDEXES = {
+    "funds": [
+        ([("kod", ASCENDING)], {"name": "kod_unique", "unique": True}),
+    ],
+    "portfolio_history": [
+        ([("date", ASCENDING)], {"name": "date_unique", "unique": True}),
+    ],
+    "fund_prices": [
+        ([("kod", ASCENDING), ("date", ASCENDING)], {"name": "kod_date_unique", "unique": True}),
+        ([("date", ASCENDING)], {"name": "date"}),
+    ],
+    "transactions": [
+        ([("seq", ASCENDING)], {"name": "seq_unique", "unique": True}),
+        ([("kod", ASCENDING), ("date", ASCENDING)], {"name": "kod_date"}),
+    ],
+}
 
 def get_mongo_connection():
     """Get or create MongoDB connection using Streamlit secrets."""
     global _mongo_client, _db
     
-    if _mongo_client is None:
+    if _db is not None:
+        return _db
+    
+    with _connect_lock:
+        if _db is not None:
+            return _db
         try:
             # Get credentials from Streamlit secrets
             username = st.secrets.get("mongo_username", "")
@@ -28,7 +73,7 @@ def get_mongo_connection():
             mongo_uri = f"mongodb+srv://{username}:{password}@{cluster}/{db_name}?retryWrites=true&w=majority"
             
             # Create client with connection pooling
-            _mongo_client = MongoClient(
+            client = MongoClient(
                 mongo_uri,
                 serverSelectionTimeoutMS=5000,
                 connectTimeoutMS=10000,
@@ -36,13 +81,20 @@ def get_mongo_connection():
             )
             
             # Test connection
-            _mongo_client.admin.command('ping')
+            with timer("db.connect"):
+                client.admin.command('ping')
             
             # Get database
-            _db = _mongo_client[db_name]
+            db = client[db_name]
             
             print(f"✅ MongoDB connected: {db_name}")
             
+            # Schema bootstrap runs once per process, with the first connection
+            ensure_indexes(db)
+            
+            # Published last, so other threads never see a half-initialised connection
+            _mongo_client, _db = client, db
+            
         except ConnectionFailure as e:
             print(f"❌ MongoDB connection failed: {e}")
             raise
@@ -60,165 +112,693 @@ def close_mongo_connection():
         _mongo_client = None
         _db = None
 
-# --- FUNDS CRUD OPERATIONS ---
+# --- SCHEMA BOOTSTRAP ---
 
-def load_funds_from_db() -> List[Dict]:
-    """Load all funds from MongoDB."""
-    try:
-        db = get_mongo_connection()
-        funds_collection = db.funds
-        
-        # Get all funds, exclude MongoDB _id field
-        funds = list(funds_collection.find({}, {"_id": 0, "kod": 1, "adet": 1}))
-        
-        return funds
-    except Exception as e:
-        print(f"Error loading funds: {e}")
-        return []
+def _find_index(existing: Dict, keys: List) -> Optional[tuple]:
+    """Returns (name, info) of the existing index on exactly these keys, if any."""
+    for name, info in existing.items():
+        if [tuple(k) for k in info.get("key", [])] == [tuple(k) for k in keys]:
+            return name, info
+    return None
 
-def save_fund_to_db(code: str, quantity: float) -> bool:
-    """Save or update a single fund in MongoDB."""
-    try:
-        db = get_mongo_connection()
-        funds_collection = db.funds
-        
-        code = code.upper().strip()
-        
+def verify_indexes(db) -> List[str]:
+    """Checks REQUIRED_INDEXES against the database. Returns a list of problems (empty if all good)."""
+    problems = []
+    for collection_name, indexes in REQUIRED_INDEXES.items():
+        existing = db[collection_name].index_information()
+        for keys, options in indexes:
+            found = _find_index(existing, keys)
+            if found is None:
+                problems.append(f"{collection_name}: missing index {options['name']} on {keys}")
+                continue
+            name, info = found
+            if bool(info.get("unique", False)) != bool(options.get("unique", False)):
+                problems.append(
+                    f"{collection_name}: index {name} on {keys} has unique={bool(info.get('unique', False))}, "
+                    f"expected unique={bool(options.get('unique', False))}"
+                )
+    return problems
+
+def ensure_indexes(db) -> List[str]:
+    """
+    Creates any missing index from REQUIRED_INDEXES and reports what could not be fixed.
+    Existing indexes with conflicting options are reported, never dropped.
+    """
+    global _indexes_reported
+    created = []
+    for collection_name, indexes in REQUIRED_INDEXES.items():
+        collection = db[collection_name]
+        try:
+            existing = collection.index_information()
+        except OperationFailure as e:
+            print(f"⚠️ Cannot read indexes of {collection_name}: {e}")
+            continue
+        for keys, options in indexes:
+            if _find_index(existing, keys) is not None:
+                continue
+            try:
+                collection.create_index(keys, **options)
+                created.append(f"{collection_name}.{options['name']}")
+            except DuplicateKeyError as e:
+                print(f"⚠️ Cannot create unique index {collection_name}.{options['name']}: duplicate values exist ({e})")
+            except OperationFailure as e:
+                print(f"⚠️ Cannot create index {collection_name}.{options['name']}: {e}")
+    
+    if created:
+        inc("db.indexes_created", len(created))
+        if not _indexes_reported:
+            _indexes_reported = True
+            print(f"🔧 Created indexes: {', '.join(created)}")
+    
+    problems = verify_indexes(db)
+    for problem in problems:
+        print(f"⚠️ Index check: {problem}")
+    return problems
+
+# --- MONGODB BACKEND ---
+
+def _batched(cursor, batch_size: int):
+    """Lists of at most batch_size documents from a cursor (which fetches as many per round trip)."""
+    batch = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+VERSIONS_ID = "versions"
+TRANSACTIONS_SEQ_ID = "transactions_seq"
+
+class MongoBackend(StorageBackend):
+    """MongoDB / Atlas storage; the connection comes from get_mongo_connection()."""
+    
+    name = "mongo"
+    
+    def connect(self):
+        return get_mongo_connection()
+    
+    def close(self):
+        close_mongo_connection()
+    
+    def describe(self) -> str:
+        return f"MongoDB ({get_mongo_connection().name})"
+    
+    # Funds
+    
+    def load_funds(self) -> List[Dict]:
+        # Get all funds, exclude MongoDB _id field
+        return list(get_mongo_connection().funds.find({}, {"_id": 0, "kod": 1, "adet": 1}))
+    
+    def upsert_fund(self, code: str, quantity: float, now: datetime):
         # Upsert: update if exists, insert if not
-        result = funds_collection.update_one(
+        get_mongo_connection().funds.update_one(
             {"kod": code},
             {
                 "$set": {
                     "kod": code,
-                    "adet": float(quantity),
-                    "updated_at": datetime.utcnow()
+                    "adet": quantity,
+                    "updated_at": now
                 },
                 "$setOnInsert": {
-                    "created_at": datetime.utcnow()
+                    "created_at": now
                 }
             },
             upsert=True
         )
+    
+    def upsert_funds(self, funds: Dict[str, float], now: datetime):
+        operations = [
+            UpdateOne(
+                {"kod": kod},
+                {
+                    "$set": {"adet": adet, "updated_at": now},
+                    "$setOnInsert": {"created_at": now}
+                },
+                upsert=True
+            )
+            for kod, adet in funds.items()
+        ]
+        if operations:
+            get_mongo_connection().funds.bulk_write(operations, ordered=False)
+    
+    def sync_funds(self, desired: Dict[str, float], now: datetime, use_transaction: bool = False):
+        funds_collection = get_mongo_connection().funds
         
+        def sync(session=None):
+            existing = {
+                doc["kod"]: doc.get("adet")
+                for doc in funds_collection.find({}, {"_id": 0, "kod": 1, "adet": 1}, session=session)
+            }
+            
+            operations = [
+                UpdateOne(
+                    {"kod": kod},
+                    {
+                        "$set": {"adet": adet, "updated_at": now},
+                        "$setOnInsert": {"created_at": now}
+                    },
+                    upsert=True
+                )
+                for kod, adet in desired.items()
+                if existing.get(kod) != adet
+            ]
+            removed = [kod for kod in existing if kod not in desired]
+            if removed:
+                operations.append(DeleteMany({"kod": {"$in": removed}}))
+            
+            if operations:
+                funds_collection.bulk_write(operations, ordered=True, session=session)
+        
+        if use_transaction:
+            with _mongo_client.start_session() as session:
+                session.with_transaction(sync)
+        else:
+            sync()
+    
+    def delete_fund(self, code: str) -> bool:
+        result = get_mongo_connection().funds.delete_one({"kod": code})
+        return result.deleted_count > 0
+    
+    # Portfolio history
+    
+    def upsert_daily_totals(self, records: List[Dict], now: datetime):
+        operations = [
+            UpdateOne(
+                {"date": record["date"]},
+                {
+                    "$set": {
+                        "date": record["date"],
+                        "total_value": record["total_value"],
+                        "updated_at": now
+                    },
+                    "$setOnInsert": {
+                        "created_at": now
+                    }
+                },
+                upsert=True
+            )
+            for record in records
+        ]
+        if operations:
+            get_mongo_connection().portfolio_history.bulk_write(operations, ordered=False)
+    
+    def query_history(self, start_date: Optional[str], end_date: Optional[str]) -> List[Dict]:
+        query = {}
+        if start_date:
+            query.setdefault("date", {})["$gte"] = start_date
+        if end_date:
+            query.setdefault("date", {})["$lte"] = end_date
+        return list(get_mongo_connection().portfolio_history.find(
+            query,
+            {"_id": 0, "date": 1, "total_value": 1}
+        ).sort("date", 1))
+    
+    def iter_history(self, start_date: Optional[str], end_date: Optional[str], batch_size: int):
+        query = {}
+        if start_date:
+            query.setdefault("date", {})["$gte"] = start_date
+        if end_date:
+            query.setdefault("date", {})["$lte"] = end_date
+        cursor = get_mongo_connection().portfolio_history.find(
+            query, {"_id": 0, "date": 1, "total_value": 1}
+        ).sort("date", 1).batch_size(batch_size)
+        yield from _batched(cursor, batch_size)
+    
+    # Change counters: one document in `meta`, a field per collection
+    
+    def get_versions(self) -> Dict[str, int]:
+        doc = get_mongo_connection().meta.find_one({"_id": VERSIONS_ID}) or {}
+        doc.pop("_id", None)
+        return doc
+    
+    def bump_version(self, name: str) -> int:
+        doc = get_mongo_connection().meta.find_one_and_update(
+            {"_id": VERSIONS_ID},
+            {"$inc": {name: 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return doc[name]
+    
+    @contextmanager
+    def watch(self, collections: Iterable[str]):
+        # Change streams need a replica set (Atlas always is one)
+        pipeline = [{"$match": {"ns.coll": {"$in": list(collections)}}}]
+        with get_mongo_connection().watch(pipeline) as stream:
+            yield (change["ns"]["coll"] for change in stream)
+    
+    # Per-fund price snapshots
+    
+    def upsert_price_snapshots(self, snapshots: List[Dict], now: datetime):
+        prices_collection = get_mongo_connection().fund_prices
+        operations = [
+            UpdateOne(
+                {"kod": snap["kod"], "date": snap["date"]},
+                {
+                    "$set": {
+                        "price": snap["price"],
+                        "daily_return": snap["daily_return"],
+                        "category": snap["category"],
+                        "updated_at": now
+                    }
+                },
+                upsert=True
+            )
+            for snap in snapshots
+        ]
+        for i in range(0, len(operations), SNAPSHOT_WRITE_BATCH_SIZE):
+            prices_collection.bulk_write(operations[i:i + SNAPSHOT_WRITE_BATCH_SIZE], ordered=False)
+    
+    def query_price_snapshots(
+        self, codes: Optional[List[str]], start_date: Optional[str], end_date: Optional[str]
+    ) -> List[Dict]:
+        query = {}
+        if codes:
+            query["kod"] = {"$in": codes}
+        if start_date:
+            query.setdefault("date", {})["$gte"] = start_date
+        if end_date:
+            query.setdefault("date", {})["$lte"] = end_date
+        projection = {"_id": 0, "kod": 1, "date": 1, "price": 1, "daily_return": 1, "category": 1}
+        return list(get_mongo_connection().fund_prices.find(query, projection).sort("date", 1))
+    
+    def iter_price_snapshots(
+        self, codes: Optional[List[str]], start_date: Optional[str], end_date: Optional[str], batch_size: int
+    ):
+        query = {}
+        if codes:
+            query["kod"] = {"$in": codes}
+        if start_date:
+            query.setdefault("date", {})["$gte"] = start_date
+        if end_date:
+            query.setdefault("date", {})["$lte"] = end_date
+        projection = {"_id": 0, "kod": 1, "date": 1, "price": 1, "daily_return": 1, "category": 1}
+        # (kod, date) order walks the unique index instead of sorting in memory
+        cursor = get_mongo_connection().fund_prices.find(query, projection).sort(
+            [("kod", 1), ("date", 1)]
+        ).batch_size(batch_size)
+        yield from _batched(cursor, batch_size)
+    
+    # Transactions: sequence numbers are reserved as a block from a counter in `meta`.
+    # Reserving and inserting are two steps, so with several writers a lower seq can be
+    # inserted after a higher one; readers re-read LEDGER_SYNC_OVERLAP seqs back to catch it.
+    
+    def insert_transactions(self, records: List[Dict], now: datetime) -> List[int]:
+        if not records:
+            return []
+        db = get_mongo_connection()
+        counter = db.meta.find_one_and_update(
+            {"_id": TRANSACTIONS_SEQ_ID},
+            {"$inc": {"value": len(records)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        first_seq = counter["value"] - len(records) + 1
+        documents = [
+            {"seq": first_seq + i, **record, "created_at": now}
+            for i, record in enumerate(records)
+        ]
+        db.transactions.insert_many(documents, ordered=True)
+        return [doc["seq"] for doc in documents]
+    
+    def query_transactions(self, after_seq: int) -> List[Dict]:
+        projection = {"_id": 0, "seq": 1, "kod": 1, "date": 1, "side": 1, "adet": 1, "fiyat": 1}
+        return list(get_mongo_connection().transactions.find({"seq": {"$gt": after_seq}}, projection).sort("seq", 1))
+    
+    # Latest valued portfolio
+    
+    def save_portfolio_snapshot(self, snapshot: Dict):
+        get_mongo_connection().portfolio_snapshot.replace_one(
+            {"_id": "latest"},
+            {"_id": "latest", **snapshot},
+            upsert=True
+        )
+    
+    def load_portfolio_snapshot(self) -> Optional[Dict]:
+        doc = get_mongo_connection().portfolio_snapshot.find_one({"_id": "latest"})
+        if doc is not None:
+            doc.pop("_id", None)
+        return doc
+
+# --- FUNDS CRUD OPERATIONS ---
+
+@timed("db.load_funds")
+def load_funds_from_db() -> Optional[List[Dict]]:
+    """Load all funds from the database; None if the read failed."""
+    try:
+        return get_storage_backend().load_funds()
+    except Exception as e:
+        print(f"Error loading funds: {e}")
+        return None
+
+@timed("db.save_fund")
+def save_fund_to_db(code: str, quantity: float) -> bool:
+    """Save or update a single fund in the database."""
+    try:
+        code = code.upper().strip()
+        get_storage_backend().upsert_fund(code, float(quantity), datetime.utcnow())
         return True
     except Exception as e:
         print(f"Error saving fund {code}: {e}")
         return False
 
-def save_all_funds_to_db(funds_list: List[Dict]) -> bool:
-    """Bulk save/update funds to MongoDB."""
-    try:
-        db = get_mongo_connection()
-        funds_collection = db.funds
+def _normalize_funds_list(funds_list: List[Dict]) -> Dict[str, float]:
+    """Turns editor rows into {kod: adet}, skipping empty codes and non-positive quantities."""
+    desired = {}
+    for f in funds_list:
+        kod = f.get("kod")
+        adet = f.get("adet")
         
-        # Clear existing funds
-        funds_collection.delete_many({})
-        
-        # Prepare documents
-        documents = []
-        for f in funds_list:
-            kod = f.get("kod")
-            adet = f.get("adet")
-            
-            # Normalize kod
-            if isinstance(kod, list):
-                kod = kod[0] if kod else None
-            if not kod or pd.isna(kod):
-                continue
-                
-            # Normalize adet
-            if isinstance(adet, list):
-                adet = adet[0] if adet else 0
+        # Normalize kod
+        if isinstance(kod, list):
+            kod = kod[0] if kod else None
+        if not kod or pd.isna(kod):
+            continue
             
-            try:
-                adet_float = float(adet) if not pd.isna(adet) else 0
-                if adet_float > 0:
-                    documents.append({
-                        "kod": str(kod).upper().strip(),
-                        "adet": adet_float,
-                        "created_at": datetime.utcnow(),
-                        "updated_at": datetime.utcnow()
-                    })
-            except (ValueError, TypeError):
-                continue
-        
-        # Bulk insert
-        if documents:
-            funds_collection.insert_many(documents)
+        # Normalize adet
+        if isinstance(adet, list):
+            adet = adet[0] if adet else 0
         
+        try:
+            adet_float = float(adet) if not pd.isna(adet) else 0
+        except (ValueError, TypeError):
+            continue
+        if adet_float > 0:
+            kod = str(kod).upper().strip()
+            # Same code on several rows (e.g. sub-accounts) is stored as one position
+            desired[kod] = desired.get(kod, 0) + adet_float
+    return desired
+
+@timed("db.save_all_funds")
+def save_all_funds_to_db(funds_list: List[Dict], use_transaction: bool = False) -> bool:
+    """
+    Syncs the stored funds to the provided list.
+    Only changed, new and removed codes are written, in one ordered batch,
+    so unchanged funds keep their created_at and readers never see an empty portfolio.
+    """
+    try:
+        desired = _normalize_funds_list(funds_list)
+        get_storage_backend().sync_funds(desired, datetime.utcnow(), use_transaction=use_transaction)
         return True
     except Exception as e:
         print(f"Error bulk saving funds: {e}")
         return False
 
+@timed("db.upsert_funds")
+def upsert_funds_to_db(funds_list: List[Dict]) -> bool:
+    """Inserts or updates the given funds (e.g. imported ones), keyed on kod; other funds are kept."""
+    try:
+        get_storage_backend().upsert_funds(_normalize_funds_list(funds_list), datetime.utcnow())
+        return True
+    except Exception as e:
+        print(f"Error upserting funds: {e}")
+        return False
+
+@timed("db.delete_fund")
 def delete_fund_from_db(code: str) -> bool:
-    """Delete a fund from MongoDB."""
+    """Delete a fund from the database."""
     try:
-        db = get_mongo_connection()
-        funds_collection = db.funds
-        
         code = code.upper().strip()
-        result = funds_collection.delete_one({"kod": code})
-        
-        return result.deleted_count > 0
+        return get_storage_backend().delete_fund(code)
     except Exception as e:
         print(f"Error deleting fund {code}: {e}")
         return False
 
 # --- PORTFOLIO HISTORY OPERATIONS ---
 
-def save_daily_total_to_db(total_value: float) -> pd.DataFrame:
-    """Save today's total value to MongoDB."""
+@timed("db.save_daily_totals")
+def save_daily_totals_to_db(totals: Dict[str, float]) -> bool:
+    """
+    Upserts {date: total_value} in one batch. Memoised ranges are kept: the repository
+    overlays the values it wrote instead of reading the history back.
+    """
     try:
-        db = get_mongo_connection()
-        history_collection = db.portfolio_history
-        
-        today = datetime.now().strftime("%Y-%m-%d")
-        
-        # Upsert today's value
-        history_collection.update_one(
-            {"date": today},
-            {
-                "$set": {
-                    "date": today,
-                    "total_value": float(total_value),
-                    "updated_at": datetime.utcnow()
-                },
-                "$setOnInsert": {
-                    "created_at": datetime.utcnow()
-                }
-            },
-            upsert=True
+        get_storage_backend().upsert_daily_totals(
+            [{"date": _date_key(day), "total_value": float(value)} for day, value in totals.items()],
+            datetime.utcnow()
         )
-        
-        # Return all history as DataFrame
-        return get_history_from_db()
-        
+        return True
     except Exception as e:
-        print(f"Error saving daily total: {e}")
-        return pd.DataFrame(columns=["Date", "TotalValue"])
+        print(f"Error saving daily totals: {e}")
+        return False
 
-def get_history_from_db() -> pd.DataFrame:
-    """Get portfolio history from MongoDB."""
+@timed("db.save_history")
+def save_history_records_to_db(records: List[Dict]) -> bool:
+    """Upserts {date, total_value} rows (e.g. imported history), keyed on date."""
     try:
-        db = get_mongo_connection()
-        history_collection = db.portfolio_history
-        
-        # Get all history, sorted by date
-        history = list(history_collection.find(
-            {},
-            {"_id": 0, "date": 1, "total_value": 1}
-        ).sort("date", 1))
+        get_storage_backend().upsert_daily_totals(
+            [{"date": _date_key(r["date"]), "total_value": float(r["total_value"])} for r in records],
+            datetime.utcnow()
+        )
+        invalidate_history_cache()
+        return True
+    except Exception as e:
+        print(f"Error saving history records: {e}")
+        return False
+
+def invalidate_history_cache():
+    """Drops all memoised history queries (called after every history write)."""
+    with _history_cache_lock:
+        _history_cache.clear()
+
+def _date_key(value: Optional[Union[str, date]]) -> Optional[str]:
+    """History dates are stored as YYYY-MM-DD strings, which sort chronologically."""
+    if value is None or isinstance(value, str):
+        return value
+    return value.strftime("%Y-%m-%d")
+
+def get_history_range(
+    start_date: Optional[Union[str, date]] = None,
+    end_date: Optional[Union[str, date]] = None,
+    max_points: Optional[int] = None
+) -> pd.DataFrame:
+    """
+    Get portfolio history between two dates (inclusive), filtered by the database.
+    If more than max_points rows match, the series is downsampled with LTTB.
+    Results are memoised until the next history write or HISTORY_CACHE_TTL_SECONDS.
+    """
+    start_date, end_date = _date_key(start_date), _date_key(end_date)
+    key = (start_date, end_date, max_points)
+    with _history_cache_lock:
+        cached = _history_cache.get(key)
+    if cached is not None and time.time() - cached[1] <= HISTORY_CACHE_TTL_SECONDS:
+        inc("db.history.memo_hits")
+        return cached[0].copy()
+    
+    try:
+        with timer("db.get_history"):
+            history = get_storage_backend().query_history(start_date, end_date)
         
         if not history:
-            return pd.DataFrame(columns=["Date", "TotalValue"])
-        
-        # Convert to DataFrame
-        df = pd.DataFrame(history)
-        df.columns = ["Date", "TotalValue"]
+            df = pd.DataFrame(columns=["Date", "TotalValue"])
+        else:
+            # Convert to DataFrame
+            df = pd.DataFrame(history, columns=["date", "total_value"])
+            df.columns = ["Date", "TotalValue"]
+            
+            if max_points and len(df) > max_points:
+                x = pd.to_datetime(df["Date"]).to_numpy(dtype="datetime64[s]").astype("int64")
+                keep = lttb_indices(x, df["TotalValue"].to_numpy(dtype=float), max_points)
+                df = df.iloc[keep].reset_index(drop=True)
         
-        return df
+        with _history_cache_lock:
+            _history_cache[key] = (df, time.time())
+        return df.copy()
         
     except Exception as e:
         print(f"Error getting history: {e}")
         return pd.DataFrame(columns=["Date", "TotalValue"])
+
+def get_history_from_db() -> pd.DataFrame:
+    """Get the full portfolio history from the database."""
+    return get_history_range()
+
+# --- CHANGE COUNTERS ---
+# A counter per collection, bumped after every write made through
+# repository.PortfolioRepository, so readers can tell whether their cache is stale.
+
+@timed("db.get_versions")
+def get_collection_versions() -> Dict[str, int]:
+    """Current change counter of every versioned collection (missing ones are 0)."""
+    return get_storage_backend().get_versions()
+
+@timed("db.bump_version")
+def bump_collection_version(name: str) -> int:
+    """Increments and returns the change counter of one collection."""
+    return get_storage_backend().bump_version(name)
+
+# --- PER-FUND PRICE SNAPSHOTS ---
+
+@timed("db.save_price_snapshots")
+def save_price_snapshots_to_db(snapshots: List[Dict]) -> bool:
+    """
+    Upserts per-fund daily snapshots ({kod, date, price, daily_return, category})
+    keyed on (kod, date), in batches of SNAPSHOT_WRITE_BATCH_SIZE.
+    """
+    if not snapshots:
+        return True
+    try:
+        get_storage_backend().upsert_price_snapshots(
+            [
+                {
+                    "kod": snap["kod"],
+                    "date": _date_key(snap["date"]),
+                    "price": float(snap["price"]),
+                    "daily_return": float(snap["daily_return"]),
+                    "category": snap["category"]
+                }
+                for snap in snapshots
+            ],
+            datetime.utcnow()
+        )
+        return True
+    except Exception as e:
+        print(f"Error saving price snapshots: {e}")
+        return False
+
+@timed("db.get_price_snapshots")
+def get_price_snapshots(
+    codes: Optional[List[str]] = None,
+    start_date: Optional[Union[str, date]] = None,
+    end_date: Optional[Union[str, date]] = None
+) -> pd.DataFrame:
+    """Get stored snapshots in long format (kod, date, price, daily_return, category), sorted by date."""
+    columns = ["kod", "date", "price", "daily_return", "category"]
+    try:
+        snapshots = get_storage_backend().query_price_snapshots(
+            [c.upper().strip() for c in codes] if codes else None,
+            _date_key(start_date),
+            _date_key(end_date)
+        )
+        return pd.DataFrame(snapshots, columns=columns)
+    except Exception as e:
+        print(f"Error getting price snapshots: {e}")
+        return pd.DataFrame(columns=columns)
+
+def get_price_matrix(
+    codes: Optional[List[str]] = None,
+    start_date: Optional[Union[str, date]] = None,
+    end_date: Optional[Union[str, date]] = None,
+    field: str = "price"
+) -> pd.DataFrame:
+    """
+    Get stored snapshots as an aligned matrix: one row per date (DatetimeIndex),
+    one column per fund code. Days a fund was not captured are NaN.
+    """
+    snapshots = get_price_snapshots(codes, start_date, end_date)
+    if snapshots.empty:
+        return pd.DataFrame(index=pd.DatetimeIndex([], name="date"))
+    
+    matrix = snapshots.pivot(index="date", columns="kod", values=field)
+    matrix.index = pd.to_datetime(matrix.index)
+    matrix.columns.name = None
+    return matrix.sort_index()
+
+# --- TRANSACTIONS ---
+
+@timed("db.save_transactions")
+def save_transactions_to_db(transactions: List[Dict]) -> List[int]:
+    """
+    Appends buy/sell transactions ({kod, date, side, adet, fiyat}); returns their
+    sequence numbers, or an empty list if the write failed.
+    """
+    try:
+        return get_storage_backend().insert_transactions(
+            [
+                {
+                    "kod": t["kod"].upper().strip(),
+                    "date": _date_key(t["date"]),
+                    "side": t["side"],
+                    "adet": float(t["adet"]),
+                    "fiyat": float(t["fiyat"])
+                }
+                for t in transactions
+            ],
+            datetime.utcnow()
+        )
+    except Exception as e:
+        print(f"Error saving transactions: {e}")
+        return []
+
+@timed("db.load_transactions")
+def load_transactions_from_db(after_seq: int = 0) -> Optional[List[Dict]]:
+    """Transactions appended after after_seq, in sequence order; None if the read failed."""
+    try:
+        return get_storage_backend().query_transactions(after_seq)
+    except Exception as e:
+        print(f"Error loading transactions: {e}")
+        return None
+
+# --- STREAMING READS (exports) ---
+# Generators: unlike the functions above they raise on failure, so a half-written export is never
+# mistaken for a complete one.
+
+def iter_history_batches(
+    start_date: Optional[Union[str, date]] = None,
+    end_date: Optional[Union[str, date]] = None,
+    batch_size: int = EXPORT_BATCH_SIZE
+) -> Iterator[pd.DataFrame]:
+    """Portfolio history (date, total_value) in date order, batch_size rows at a time."""
+    for rows in get_storage_backend().iter_history(_date_key(start_date), _date_key(end_date), batch_size):
+        inc("db.export_rows", len(rows))
+        yield pd.DataFrame(rows, columns=["date", "total_value"])
+
+def iter_price_snapshot_batches(
+    codes: Optional[List[str]] = None,
+    start_date: Optional[Union[str, date]] = None,
+    end_date: Optional[Union[str, date]] = None,
+    batch_size: int = EXPORT_BATCH_SIZE
+) -> Iterator[pd.DataFrame]:
+    """Per-fund price snapshots in (kod, date) order, batch_size rows at a time."""
+    batches = get_storage_backend().iter_price_snapshots(
+        [c.upper().strip() for c in codes] if codes else None,
+        _date_key(start_date),
+        _date_key(end_date),
+        batch_size
+    )
+    for rows in batches:
+        inc("db.export_rows", len(rows))
+        yield pd.DataFrame(rows, columns=["kod", "date", "price", "daily_return", "category"])
+
+# --- LATEST PORTFOLIO SNAPSHOT ---
+
+@timed("db.save_portfolio_snapshot")
+def save_portfolio_snapshot_to_db(
+    portfolio_df: pd.DataFrame,
+    positions: Dict[str, float],
+    updated_at: Optional[datetime] = None
+) -> bool:
+    """Replaces the latest valued portfolio (rows + the positions it was computed from)."""
+    try:
+        get_storage_backend().save_portfolio_snapshot({
+            "rows": portfolio_df.to_dict(orient="records"),
+            "positions": positions,
+            "total_value": float(portfolio_df["Toplam Değer"].sum()) if not portfolio_df.empty else 0.0,
+            "updated_at": updated_at or datetime.utcnow()
+        })
+        return True
+    except Exception as e:
+        print(f"Error saving portfolio snapshot: {e}")
+        return False
+
+@timed("db.load_portfolio_snapshot")
+def load_portfolio_snapshot_from_db() -> Optional[Dict]:
+    """
+    Get the latest valued portfolio as {df, positions, total_value, updated_at};
+    an empty dict if none was published yet, None if the read failed.
+    """
+    try:
+        doc = get_storage_backend().load_portfolio_snapshot()
+        if doc is None:
+            return {}
+        return {
+            "df": pd.DataFrame(doc.get("rows", []), columns=PORTFOLIO_COLUMNS),
+            "positions": doc.get("positions", {}),
+            "total_value": doc.get("total_value", 0.0),
+            "updated_at": doc.get("updated_at")
+        }
+    except Exception as e:
+        print(f"Error loading portfolio snapshot: {e}")
+        return None
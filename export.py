@@ -0,0 +1,151 @@
+# export.py
+"""
+Streaming export of the portfolio history, fund positions and per-fund prices.
+
+Rows are read from the storage backend in batches of EXPORT_BATCH_SIZE (MongoDB
+cursors, keyset pages on SQLite) and written as they arrive: one Parquet row
+group, or one block of CSV lines, per batch. Memory stays bounded by the batch
+size however many years are exported. Column names are the stored ones, so an
+export can be imported again with migrate_to_mongodb.py.
+
+Usage:
+    python export.py history                                   # history.parquet
+    python export.py prices --format csv --start 2024-01-01 -o prices_2024.csv
+    python export.py prices --codes TTE,AFT --end 2023-12-31
+    python export.py funds --format csv -o -                   # CSV to stdout
+"""
+
+import argparse
+import sys
+import tempfile
+from datetime import date
+from typing import BinaryIO, Iterator, List, Optional, Union
+
+import pandas as pd
+
+from config import EXPORT_BATCH_SIZE
+from db_manager import iter_history_batches, iter_price_snapshot_batches
+
+DATASETS = ("history", "funds", "prices")
+FORMATS = ("parquet", "csv")
+MIME_TYPES = {"parquet": "application/vnd.apache.parquet", "csv": "text/csv"}
+
+# Column types, also the Parquet schema (an empty export still has its columns)
+COLUMNS = {
+    "history": {"date": "string", "total_value": "float64"},
+    "funds": {"kod": "string", "adet": "float64"},
+    "prices": {"kod": "string", "date": "string", "price": "float64", "daily_return": "float64", "category": "string"},
+}
+
+# Exports larger than this are spooled to a temporary file instead of memory
+_SPOOL_MAX_BYTES = 16 * 1024 * 1024
+
+DateLike = Optional[Union[str, date]]
+
+
+def iter_dataset(
+    dataset: str,
+    start_date: DateLike = None,
+    end_date: DateLike = None,
+    codes: Optional[List[str]] = None,
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> Iterator[pd.DataFrame]:
+    """Batches of one dataset; dates filter history and prices, codes filters prices."""
+    if dataset == "history":
+        yield from iter_history_batches(start_date, end_date, batch_size)
+    elif dataset == "prices":
+        yield from iter_price_snapshot_batches(codes, start_date, end_date, batch_size)
+    elif dataset == "funds":
+        # Holdings as the app values them (quantities of traded funds come from the ledger)
+        from data_manager import load_funds
+        yield pd.DataFrame(load_funds(), columns=list(COLUMNS["funds"]))
+    else:
+        raise ValueError(f"Unknown dataset: {dataset!r} (expected one of {', '.join(DATASETS)})")
+
+
+def _typed(frame: pd.DataFrame, dataset: str) -> pd.DataFrame:
+    return frame.reindex(columns=list(COLUMNS[dataset])).astype(COLUMNS[dataset])
+
+
+def write_export(
+    dataset: str,
+    out: BinaryIO,
+    fmt: str = "parquet",
+    start_date: DateLike = None,
+    end_date: DateLike = None,
+    codes: Optional[List[str]] = None,
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> int:
+    """Streams one dataset into a binary file object; returns the number of rows written."""
+    batches = (_typed(frame, dataset) for frame in iter_dataset(dataset, start_date, end_date, codes, batch_size))
+    rows = 0
+    if fmt == "parquet":
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Parquet export needs pyarrow: pip install pyarrow (or use --format csv)") from e
+        schema = pa.Schema.from_pandas(_typed(pd.DataFrame(), dataset), preserve_index=False)
+        with pq.ParquetWriter(out, schema, compression="zstd") as writer:
+            for frame in batches:
+                # One row group per batch
+                writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+                rows += len(frame)
+    elif fmt == "csv":
+        out.write(",".join(COLUMNS[dataset]).encode("utf-8") + b"\n")
+        for frame in batches:
+            out.write(frame.to_csv(index=False, header=False, lineterminator="\n").encode("utf-8"))
+            rows += len(frame)
+    else:
+        raise ValueError(f"Unknown format: {fmt!r} (expected one of {', '.join(FORMATS)})")
+    return rows
+
+
+def export_file(
+    dataset: str,
+    fmt: str = "parquet",
+    start_date: DateLike = None,
+    end_date: DateLike = None,
+    codes: Optional[List[str]] = None,
+) -> BinaryIO:
+    """
+    The export as a rewound file object, kept in memory up to a few MB and spooled to
+    a temporary file beyond that. Used by the app's download button.
+    """
+    out = tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX_BYTES)
+    write_export(dataset, out, fmt, start_date, end_date, codes)
+    out.seek(0)
+    return out
+
+
+def file_name(dataset: str, fmt: str, start_date: DateLike = None, end_date: DateLike = None) -> str:
+    """e.g. prices_2024-01-01_2024-06-30.parquet"""
+    parts = [dataset] + [str(d) for d in (start_date, end_date) if d]
+    return f"{'_'.join(parts)}.{fmt}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export history, funds or per-fund prices to Parquet or CSV.")
+    parser.add_argument("dataset", choices=DATASETS)
+    parser.add_argument("--format", choices=FORMATS, default="parquet")
+    parser.add_argument("--start", help="First date (YYYY-MM-DD), inclusive")
+    parser.add_argument("--end", help="Last date (YYYY-MM-DD), inclusive")
+    parser.add_argument("--codes", help="Comma separated fund codes (prices only)")
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE, help="Rows per batch / row group")
+    parser.add_argument("-o", "--output", help="Output file, '-' for stdout (default: <dataset>[_<dates>].<format>)")
+    args = parser.parse_args()
+
+    codes = [c for c in (args.codes or "").split(",") if c.strip()] or None
+    output = args.output or file_name(args.dataset, args.format, args.start, args.end)
+
+    if output == "-":
+        rows = write_export(args.dataset, sys.stdout.buffer, args.format, args.start, args.end, codes, args.batch_size)
+        print(f"✅ {rows:,} rows exported", file=sys.stderr)
+        return
+    with open(output, "wb") as out:
+        rows = write_export(args.dataset, out, args.format, args.start, args.end, codes, args.batch_size)
+    print(f"✅ {rows:,} rows exported to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+# fetch_engine.py
+"""Asyncio fetch engine: one pooled keep-alive HTTP client shared by every TEFAS fetch."""
+
+import asyncio
+import atexit
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+import aiohttp
+
+from config import (
+    TEFAS_URL,
+    FETCH_MAX_CONNECTIONS,
+    FETCH_MAX_CONNECTIONS_PER_HOST,
+    FETCH_MAX_IN_FLIGHT,
+    FETCH_TIMEOUT_SECONDS,
+    FETCH_KEEPALIVE_SECONDS,
+    FETCH_MAX_ATTEMPTS,
+)
+from fetch_scheduler import (
+    OK, ERROR, CIRCUIT_OPEN,
+    FetchOutcome, TransientHTTPError, AIMDLimiter, CircuitBreaker,
+    backoff_delay, is_transient_status, parse_retry_after,
+)
+from metrics import timer, inc
+
+# Failures worth retrying: connection problems, timeouts, 429/5xx
+TRANSIENT_ERRORS = (
+    aiohttp.ClientConnectionError,
+    aiohttp.ClientPayloadError,
+    asyncio.TimeoutError,
+    TransientHTTPError,
+)
+
+
+class FetchEngine:
+    """
+    Runs a private event loop in a single daemon thread and fetches pages through one
+    aiohttp session. Connections are kept alive between refreshes and limited per host.
+    Requests in flight are bounded by an AIMD limiter (at most max_in_flight), transient
+    failures are retried with jittered backoff, and a circuit breaker stops all fetches
+    while TEFAS is down. Pages are requested conditionally with the ETag/Last-Modified
+    of the previous response for the same fund; a 304 is reported as not_modified.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = FETCH_MAX_CONNECTIONS,
+        max_connections_per_host: int = FETCH_MAX_CONNECTIONS_PER_HOST,
+        max_in_flight: int = FETCH_MAX_IN_FLIGHT,
+        timeout_seconds: float = FETCH_TIMEOUT_SECONDS,
+        keepalive_seconds: float = FETCH_KEEPALIVE_SECONDS,
+        max_attempts: int = FETCH_MAX_ATTEMPTS,
+    ):
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.max_in_flight = max_in_flight
+        self.timeout_seconds = timeout_seconds
+        self.keepalive_seconds = keepalive_seconds
+        self.max_attempts = max_attempts
+        self.limiter = AIMDLimiter(maximum=max_in_flight)
+        self.breaker = CircuitBreaker()
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._start_lock = threading.Lock()
+        # {fund code: conditional request headers}; only touched on the engine loop
+        self._validators: Dict[str, Dict[str, str]] = {}
+
+    # --- loop management ---
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            with self._start_lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    thread = threading.Thread(
+                        target=loop.run_forever, name="tefas-fetch-engine", daemon=True
+                    )
+                    thread.start()
+                    self._thread = thread
+                    self._loop = loop
+        return self._loop
+
+    def _run(self, coro):
+        """Runs a coroutine on the engine loop and blocks until it completes."""
+        loop = self._ensure_started()
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        # Created lazily on the engine loop; aiohttp sessions are bound to their loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=self.max_connections_per_host,
+                keepalive_timeout=self.keepalive_seconds,
+                ttl_dns_cache=300,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout_seconds),
+            )
+        return self._session
+
+    # --- fetching ---
+
+    async def _attempt(self, session: aiohttp.ClientSession, url: str, fund_code: str) -> Optional[bytes]:
+        """One HTTP request under the adaptive limit. Returns None if the page is not modified; raises on failure."""
+        await self.limiter.acquire()
+        started = time.monotonic()
+        try:
+            with timer("tefas.fetch"):
+                headers = self._validators.get(fund_code)
+                async with session.get(url, params={"FonKod": fund_code}, headers=headers) as response:
+                    if is_transient_status(response.status):
+                        raise TransientHTTPError(
+                            response.status, parse_retry_after(response.headers.get("Retry-After"))
+                        )
+                    if response.status == 304:
+                        content = None
+                    else:
+                        response.raise_for_status()
+                        content = await response.read()
+                        self._remember_validators(fund_code, response.headers)
+        except TRANSIENT_ERRORS:
+            self.limiter.on_congestion()
+            raise
+        else:
+            self.limiter.on_success(time.monotonic() - started)
+            return content
+        finally:
+            await self.limiter.release()
+
+    def _remember_validators(self, fund_code: str, response_headers):
+        validators = {}
+        if response_headers.get("ETag"):
+            validators["If-None-Match"] = response_headers["ETag"]
+        if response_headers.get("Last-Modified"):
+            validators["If-Modified-Since"] = response_headers["Last-Modified"]
+        if validators:
+            self._validators[fund_code] = validators
+        else:
+            self._validators.pop(fund_code, None)
+
+    def forget_validators(self, fund_code: str):
+        """Makes the next request for fund_code unconditional (e.g. its last page was not kept)."""
+        self._validators.pop(fund_code, None)
+
+    async def _fetch_one(self, url: str, fund_code: str) -> FetchOutcome:
+        session = await self._get_session()
+        started = time.monotonic()
+        attempts = 0
+        last_error = None
+
+        while attempts < self.max_attempts:
+            if not self.breaker.allow():
+                inc("tefas.circuit_rejected")
+                return FetchOutcome(fund_code, CIRCUIT_OPEN, attempts=attempts,
+                                    error="TEFAS circuit open", elapsed_s=time.monotonic() - started)
+            attempts += 1
+            try:
+                content = await self._attempt(session, url, fund_code)
+            except TRANSIENT_ERRORS as e:
+                last_error = e
+                if self.breaker.record_failure():
+                    inc("tefas.circuit_opened")
+                    print(f"❌ TEFAS circuit opened after {self.breaker.failures} consecutive failures")
+                if attempts < self.max_attempts:
+                    inc("tefas.fetch.retries")
+                    delay = backoff_delay(attempts - 1)
+                    if isinstance(e, TransientHTTPError) and e.retry_after is not None:
+                        delay = max(delay, e.retry_after)
+                    await asyncio.sleep(delay)
+                continue
+            except Exception as e:
+                # Non-retryable (e.g. 4xx): TEFAS itself is up
+                self.breaker.record_success()
+                print(f"Error fetching {fund_code}: {e}")
+                return FetchOutcome(fund_code, ERROR, attempts=attempts, error=str(e),
+                                    elapsed_s=time.monotonic() - started)
+            self.breaker.record_success()
+            if content is None:
+                inc("tefas.not_modified")
+            return FetchOutcome(fund_code, OK, attempts=attempts, content=content,
+                                not_modified=content is None, elapsed_s=time.monotonic() - started)
+
+        print(f"Error fetching {fund_code} after {attempts} attempts: {last_error!r}")
+        return FetchOutcome(fund_code, ERROR, attempts=attempts, error=repr(last_error),
+                            elapsed_s=time.monotonic() - started)
+
+    async def _fetch_all(self, url: str, codes: Iterable[str]) -> Dict[str, FetchOutcome]:
+        codes = list(codes)
+        outcomes = await asyncio.gather(*(self._fetch_one(url, code) for code in codes))
+        return dict(zip(codes, outcomes))
+
+    def fetch_outcomes(self, codes: Iterable[str], url: str = TEFAS_URL) -> Dict[str, FetchOutcome]:
+        """Fetches the FonAnaliz page for each code and reports a structured outcome per code."""
+        codes = list(codes)
+        if not codes:
+            return {}
+        return self._run(self._fetch_all(url, codes))
+
+    def fetch_pages(self, codes: Iterable[str], url: str = TEFAS_URL) -> Dict[str, Optional[bytes]]:
+        """Fetches the FonAnaliz page for each code. Failed (and not modified) fetches map to None."""
+        return {code: outcome.content for code, outcome in self.fetch_outcomes(codes, url).items()}
+
+    async def _post(self, url: str, data: Dict, headers: Optional[Dict], timeout_seconds: Optional[float]) -> bytes:
+        session = await self._get_session()
+        timeout = aiohttp.ClientTimeout(total=timeout_seconds) if timeout_seconds else None
+        with timer("tefas.post"):
+            async with session.post(url, data=data, headers=headers, timeout=timeout) as response:
+                response.raise_for_status()
+                return await response.read()
+
+    def post_form(
+        self, url: str, data: Dict, headers: Optional[Dict] = None, timeout_seconds: Optional[float] = None
+    ) -> bytes:
+        """One form POST over the pooled session (e.g. TEFAS bulk lists). Raises on failure."""
+        return self._run(self._post(url, data, headers, timeout_seconds))
+
+    def status(self) -> Dict:
+        """Current adaptive limit and circuit breaker state."""
+        return {
+            "concurrency_limit": int(self.limiter.limit),
+            "in_flight": self.limiter.in_flight,
+            "circuit_state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+        }
+
+    def close(self):
+        """Closes the pooled session and stops the engine loop."""
+        if self._loop is None:
+            return
+        if self._session is not None and not self._session.closed:
+            self._run(self._session.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._loop = None
+        self._thread = None
+        self._session = None
+
+
+# Global engine instance, shared by all Streamlit sessions in this process
+_fetch_engine = None
+_fetch_engine_lock = threading.Lock()
+
+def get_fetch_engine() -> FetchEngine:
+    """Get or create the process-wide fetch engine."""
+    global _fetch_engine
+    if _fetch_engine is None:
+        with _fetch_engine_lock:
+            if _fetch_engine is None:
+                _fetch_engine = FetchEngine()
+                atexit.register(_fetch_engine.close)
+    return _fetch_engine
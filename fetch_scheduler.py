@@ -0,0 +1,264 @@
+# fetch_scheduler.py
+"""
+Fetch policies for TEFAS: AIMD concurrency limit, jittered retry backoff, a circuit
+breaker and cross-session single-flight coalescing.
+"""
+
+import asyncio
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Hashable, Iterable, List, Optional
+
+from config import (
+    FETCH_MIN_CONCURRENCY,
+    FETCH_INITIAL_CONCURRENCY,
+    FETCH_MAX_IN_FLIGHT,
+    FETCH_TARGET_LATENCY_SECONDS,
+    FETCH_BACKOFF_BASE_SECONDS,
+    FETCH_BACKOFF_MAX_SECONDS,
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_RESET_SECONDS,
+)
+from metrics import inc
+
+# Outcome statuses
+OK = "ok"
+NOT_FOUND = "not_found"          # TEFAS answered, but the page has no price (unknown code)
+ERROR = "error"                  # Gave up after retries, or a non-retryable failure
+CIRCUIT_OPEN = "circuit_open"    # Not attempted because TEFAS is considered down
+
+
+@dataclass
+class FetchOutcome:
+    """What happened to one fund during a refresh."""
+    code: str
+    status: str
+    price: Optional[float] = None
+    daily_return: Optional[float] = None
+    category: Optional[str] = None
+    attempts: int = 0
+    error: Optional[str] = None
+    elapsed_s: float = 0.0
+    content: Optional[bytes] = field(default=None, repr=False)
+    not_modified: bool = False  # HTTP 304: the page is the one fetched last time
+
+    @property
+    def ok(self) -> bool:
+        return self.status == OK
+
+
+class TransientHTTPError(Exception):
+    """HTTP status worth retrying (429 or 5xx)."""
+
+    def __init__(self, status: int, retry_after: Optional[float] = None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+def is_transient_status(status: int) -> bool:
+    return status == 429 or status >= 500
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After in seconds; HTTP-date values are ignored."""
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+def backoff_delay(
+    attempt: int,
+    base: float = FETCH_BACKOFF_BASE_SECONDS,
+    cap: float = FETCH_BACKOFF_MAX_SECONDS,
+    rng: Callable[[], float] = random.random,
+) -> float:
+    """Full-jitter exponential backoff for the given (0-based) retry attempt."""
+    return rng() * min(cap, base * (2 ** attempt))
+
+
+class AIMDLimiter:
+    """
+    Concurrency limit tuned from observed latency and errors: additive increase
+    (about +1 per limit's worth of fast successes), multiplicative decrease on
+    errors or slow responses, at most once per target-latency window.
+    Must only be used from a single event loop.
+    """
+
+    def __init__(
+        self,
+        initial: int = FETCH_INITIAL_CONCURRENCY,
+        minimum: int = FETCH_MIN_CONCURRENCY,
+        maximum: int = FETCH_MAX_IN_FLIGHT,
+        target_latency: float = FETCH_TARGET_LATENCY_SECONDS,
+        decrease_factor: float = 0.5,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.target_latency = target_latency
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self._clock = clock
+        self._last_decrease = float("-inf")
+        self._condition: Optional[asyncio.Condition] = None
+
+    def _get_condition(self) -> asyncio.Condition:
+        # Created on first use so it binds to the loop that actually runs the fetches
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    def on_success(self, latency: float):
+        if latency > self.target_latency:
+            self.on_congestion()
+        else:
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+
+    def on_congestion(self):
+        now = self._clock()
+        if now - self._last_decrease < self.target_latency:
+            return
+        self.limit = max(float(self.minimum), self.limit * self.decrease_factor)
+        self._last_decrease = now
+
+    async def acquire(self):
+        condition = self._get_condition()
+        async with condition:
+            await condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self):
+        condition = self._get_condition()
+        async with condition:
+            self.in_flight -= 1
+            condition.notify_all()
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls for
+    `reset_seconds`; then lets a single trial through (half-open) and closes on success.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        reset_seconds: float = CIRCUIT_RESET_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self._clock = clock
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_seconds:
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = False
+        return self._state
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self._state = self.CLOSED
+        self._trial_in_flight = False
+
+    def record_failure(self) -> bool:
+        """Counts a failure; returns True if this call tripped the breaker open."""
+        self.failures += 1
+        if self._state == self.HALF_OPEN or (self._state == self.CLOSED and self.failures >= self.failure_threshold):
+            self._state = self.OPEN
+            self._opened_at = self._clock()
+            self._trial_in_flight = False
+            return True
+        return False
+
+
+class _Call:
+    """One in-flight computation that other callers can wait on."""
+
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Duplicate call suppression across threads (Streamlit sessions): while a key is
+    being computed, other callers asking for it wait and receive the same value
+    instead of starting their own computation. Values are shared, so callers must
+    treat them as read-only.
+    """
+
+    def __init__(self, name: str = "singleflight"):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def do_many(self, keys: Iterable[Hashable], fn: Callable[[List[Hashable]], Dict]) -> Dict:
+        """
+        Returns {key: value} for every key. fn(owned_keys) -> {key: value} is called once
+        for the keys nobody else is computing; the rest are awaited. Keys missing from
+        fn's result map to None, and an exception raised by fn reaches every waiter.
+        """
+        owned, waiting = [], {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                call = self._calls.get(key)
+                if call is None:
+                    self._calls[key] = _Call()
+                    owned.append(key)
+                else:
+                    waiting[key] = call
+
+        if waiting:
+            inc(f"{self.name}.shared", len(waiting))
+
+        results = {}
+        if owned:
+            error = None
+            try:
+                results = dict(fn(owned))
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                # Runs before waiting on others, so two overlapping batches cannot deadlock
+                with self._lock:
+                    calls = [self._calls.pop(key) for key in owned]
+                for key, call in zip(owned, calls):
+                    call.value, call.error = results.get(key), error
+                    call.event.set()
+
+        for key, call in waiting.items():
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            results[key] = call.value
+        return results
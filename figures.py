@@ -0,0 +1,111 @@
+# figures.py
+"""
+Plotly figures of the dashboard, memoised per data version.
+
+A figure is built once per (figure, version) and the same object is reused by
+every rerun and session until its data changes. The version is whatever
+identifies the data: the PortfolioTable it was drawn from (a new object per
+snapshot), the history change generation, or the analytics version. Figures
+are never modified after they are built.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional
+
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+from config import FIGURE_CACHE_ENTRIES
+from metrics import timer, inc
+from portfolio_table import PortfolioTable
+from valuation import category_totals
+
+# (figure, version) -> figure, or None when there was nothing to draw
+_figures: "OrderedDict[Hashable, Optional[go.Figure]]" = OrderedDict()
+_figures_lock = threading.Lock()
+_MISSING = object()
+
+
+def _memoised(key: Hashable, build: Callable[[], Optional[go.Figure]]) -> Optional[go.Figure]:
+    with _figures_lock:
+        figure = _figures.get(key, _MISSING)
+        if figure is not _MISSING:
+            _figures.move_to_end(key)
+    if figure is not _MISSING:
+        inc("figures.hits")
+        return figure
+    with timer("figures.build"):
+        figure = build()
+    with _figures_lock:
+        _figures[key] = figure
+        while len(_figures) > FIGURE_CACHE_ENTRIES:
+            _figures.popitem(last=False)
+    return figure
+
+
+# --- portfolio (keyed on the shared, immutable table) ---
+
+def allocation_pie(table: PortfolioTable) -> go.Figure:
+    def build():
+        df_pie = table.frame().groupby("Fon Kodu")["Toplam Değer"].sum().reset_index()
+        fig = px.pie(df_pie, values="Toplam Değer", names="Fon Kodu", hole=0.4)
+        fig.update_layout(height=350, margin=dict(l=20, r=20, t=40, b=20))
+        return fig
+    return _memoised(("allocation", table), build)
+
+
+def category_pie(table: PortfolioTable) -> go.Figure:
+    def build():
+        fig = px.pie(category_totals(table.frame()), values="Toplam Değer", names="Kategori", hole=0.4)
+        fig.update_layout(height=350, margin=dict(l=20, r=20, t=40, b=20))
+        return fig
+    return _memoised(("category", table), build)
+
+
+# --- history (keyed on its change generation; the data is only loaded on a miss) ---
+
+def history_line(version: int, start_date, max_points: int, load: Callable[[], pd.DataFrame]) -> Optional[go.Figure]:
+    """The history chart, or None without history; load() returns the (Date, TotalValue) range."""
+    def build():
+        df_chart = load()
+        if df_chart.empty:
+            return None
+        df_chart["Date"] = pd.to_datetime(df_chart["Date"])
+        fig = px.line(df_chart, x="Date", y="TotalValue", markers=len(df_chart) <= 100)
+        fig.update_layout(xaxis_title="Tarih", yaxis_title="Toplam Değer (TL)")
+        return fig
+    return _memoised(("history", version, str(start_date), max_points), build)
+
+
+# --- risk and performance (keyed on the analytics version) ---
+
+def rolling_volatility_line(analytics) -> Optional[go.Figure]:
+    def build():
+        df_vol = analytics["rolling_volatility"].dropna(how="all") * 100
+        if df_vol.empty:
+            return None
+        fig = px.line(df_vol, labels={"date": "Tarih", "value": "Volatilite (%)", "variable": "Fon"})
+        fig.update_layout(height=350, title="Hareketli Volatilite (yıllık)")
+        return fig
+    return _memoised(("rolling_volatility", analytics["version"]), build)
+
+
+def drawdown_area(analytics) -> go.Figure:
+    def build():
+        fig = px.area(analytics["drawdown"] * 100, labels={"date": "Tarih", "value": "Düşüş (%)"})
+        fig.update_layout(height=300, title="Zirveden Düşüş", showlegend=False)
+        return fig
+    return _memoised(("drawdown", analytics["version"]), build)
+
+
+def correlation_heatmap(analytics) -> Optional[go.Figure]:
+    def build():
+        df_corr = analytics["correlation"]
+        if len(df_corr) < 2:
+            return None
+        fig = px.imshow(df_corr, zmin=-1, zmax=1, color_continuous_scale="RdBu_r", text_auto=".2f")
+        fig.update_layout(height=400, title="Getiri Korelasyonu")
+        return fig
+    return _memoised(("correlation", analytics["version"]), build)
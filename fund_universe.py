@@ -0,0 +1,362 @@
+# fund_universe.py
+"""
+Local index of the whole TEFAS fund universe: code, name, category and founder.
+
+The list is downloaded in bulk (one request per fund type), stored in
+FUND_UNIVERSE_FILE and kept in memory as one immutable FundUniverse per process.
+When the file is missing or older than FUND_UNIVERSE_MAX_AGE_SECONDS it is
+refreshed in a background thread; the previous index is served meanwhile.
+Searching and validating never touch the network.
+
+Names are searched by word prefix. Every word of every fund is stored once in
+a sorted (word, code) list, so the funds with a word starting with a term are
+one contiguous slice found by bisection (a trie flattened into an array).
+Queries and names are folded the Turkish way (I -> ı, İ -> i) and without
+diacritics, so "is portfoy", "İŞ PORTFÖY" and "iş portföy" find the same funds.
+
+Usage:
+    python fund_universe.py refresh                       # download from TEFAS
+    python fund_universe.py refresh --from-file funds.csv # or load a CSV/JSON export
+    python fund_universe.py search "iş portföy hisse"
+    python fund_universe.py validate TTE AFT XYZ
+"""
+
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from config import (
+    FUND_UNIVERSE_URL,
+    FUND_UNIVERSE_FUND_TYPES,
+    FUND_UNIVERSE_FILE,
+    FUND_UNIVERSE_MAX_AGE_SECONDS,
+    FUND_UNIVERSE_RETRY_SECONDS,
+    FUND_UNIVERSE_TIMEOUT_SECONDS,
+    FUND_UNIVERSE_SEARCH_LIMIT,
+)
+from metrics import timer, inc
+
+_TR_CASE = str.maketrans({"I": "ı", "İ": "i"})
+_ASCII = str.maketrans("ıöüşğçâîû", "iousgcaiu")
+_WORD = re.compile(r"[0-9a-z]+")
+_CODE_CHARS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+
+# Accepted names of each field: TEFAS JSON first, then file exports
+FIELDS = {
+    "kod": ("FONKODU", "kod", "Fon Kodu", "code"),
+    "name": ("FONUNVAN", "name", "Fon Adı", "unvan"),
+    "category": ("FONTURACIKLAMA", "category", "Kategori", "Fon Türü"),
+    "founder": ("KURUCUUNVAN", "KURUCU", "founder", "Kurucu"),
+}
+
+
+def fold(text: str) -> str:
+    """
+    Turkish lower case without diacritics, for matching.
+
+    >>> fold("İŞ PORTFÖY")
+    'is portfoy'
+    >>> fold("IŞIK")
+    'isik'
+    """
+    return text.translate(_TR_CASE).lower().translate(_ASCII)
+
+
+def normalize_code(code) -> str:
+    """'tte ' -> 'TTE'; dotted/dotless i typed on a Turkish keyboard become I."""
+    return fold(str(code or "").strip()).upper()
+
+
+def _founder_from_name(name: str) -> str:
+    """Fund titles start with their founder, e.g. 'AK PORTFÖY ...' -> 'AK PORTFÖY'."""
+    words = name.split()
+    for i, word in enumerate(words):
+        if fold(word) == "portfoy":
+            return " ".join(words[:i + 1])
+    return words[0] if words else ""
+
+
+@dataclass(frozen=True)
+class FundInfo:
+    kod: str
+    name: str
+    category: str
+    founder: str
+
+    @classmethod
+    def from_record(cls, record: Dict) -> Optional["FundInfo"]:
+        """From a TEFAS row or a file row (see FIELDS); None without a code."""
+        values = {
+            field: next((str(record[alias]).strip() for alias in aliases if record.get(alias) not in (None, "")), "")
+            for field, aliases in FIELDS.items()
+        }
+        kod = normalize_code(values["kod"])
+        if not kod:
+            return None
+        return cls(kod, values["name"], values["category"], values["founder"] or _founder_from_name(values["name"]))
+
+
+class FundUniverse:
+    """Immutable after construction; shared by every session."""
+
+    def __init__(self, funds: Iterable[FundInfo], fetched_at: Optional[datetime] = None):
+        self._funds: Dict[str, FundInfo] = {fund.kod: fund for fund in funds}
+        self.fetched_at = fetched_at
+        self._codes = sorted(self._funds)
+        # Folded words of each fund, for matching and ranking
+        self._fund_words = {
+            fund.kod: _WORD.findall(fold(f"{fund.name} {fund.founder} {fund.category}"))
+            for fund in self._funds.values()
+        }
+        self._words = sorted({(word, kod) for kod, words in self._fund_words.items() for word in words})
+        self._word_keys = [word for word, _ in self._words]
+
+    def __len__(self) -> int:
+        return len(self._funds)
+
+    def __iter__(self):
+        return iter(self._funds.values())
+
+    def __contains__(self, code) -> bool:
+        return normalize_code(code) in self._funds
+
+    @property
+    def empty(self) -> bool:
+        return not self._funds
+
+    @property
+    def codes(self) -> List[str]:
+        """Every fund code, sorted."""
+        return list(self._codes)
+
+    def get(self, code) -> Optional[FundInfo]:
+        return self._funds.get(normalize_code(code))
+
+    def label(self, code) -> str:
+        """'TTE · İŞ PORTFÖY ...' for pickers; the code alone if it is not a known fund."""
+        fund = self.get(code)
+        return f"{fund.kod} · {fund.name}" if fund is not None and fund.name else str(code)
+
+    def _prefixed(self, keys: List[str], prefix: str) -> slice:
+        return slice(bisect_left(keys, prefix), bisect_left(keys, prefix + "\uffff"))
+
+    def _rank(self, kod: str, terms: List[str]):
+        """Whole-word matches first, then names starting with the first term, then by name."""
+        words = self._fund_words[kod]
+        return (-sum(term in words for term in terms), words[:1] != terms[:1], self._funds[kod].name)
+
+    def search(self, query: str, limit: int = FUND_UNIVERSE_SEARCH_LIMIT) -> List[FundInfo]:
+        """
+        Funds whose code starts with the query, then funds with a word starting with
+        every query term (best matches first).
+        """
+        terms = _WORD.findall(fold(query))
+        if not terms:
+            return []
+        found = []
+        if len(terms) == 1:
+            code = terms[0].upper()
+            found.extend(self._codes[self._prefixed(self._codes, code)])
+        matches = None
+        for term in terms:
+            codes = {kod for _, kod in self._words[self._prefixed(self._word_keys, term)]}
+            matches = codes if matches is None else matches & codes
+            if not matches:
+                break
+        seen = set(found)
+        found.extend(sorted((kod for kod in matches if kod not in seen), key=lambda kod: self._rank(kod, terms)))
+        return [self._funds[kod] for kod in found[:limit]]
+
+    def suggest(self, code, limit: int = 5) -> List[str]:
+        """Known codes one typo away (a changed, swapped, missing or extra character)."""
+        code = normalize_code(code)
+        candidates = set()
+        for i in range(len(code) + 1):
+            for char in _CODE_CHARS:
+                candidates.add(code[:i] + char + code[i + 1:])  # Changed
+                candidates.add(code[:i] + char + code[i:])      # Missing
+            candidates.add(code[:i] + code[i + 1:])             # Extra
+            if i + 1 < len(code):
+                candidates.add(code[:i] + code[i + 1] + code[i] + code[i + 2:])  # Swapped
+        candidates.discard(code)
+        return sorted(candidates & self._funds.keys())[:limit]
+
+    def unknown_codes(self, codes: Iterable) -> Dict[str, List[str]]:
+        """{code: suggestions} of the codes that are not TEFAS funds; empty if the index is not loaded yet."""
+        if self.empty:
+            return {}
+        return {
+            code: self.suggest(code)
+            for code in dict.fromkeys(normalize_code(c) for c in codes)
+            if code and code not in self._funds
+        }
+
+
+# --- download and storage ---
+
+def download_funds(fund_types: Iterable[str] = FUND_UNIVERSE_FUND_TYPES) -> List[FundInfo]:
+    """The current fund list from TEFAS, one bulk request per fund type."""
+    from fetch_engine import get_fetch_engine
+
+    today = datetime.now().strftime("%d.%m.%Y")
+    week_ago = (datetime.now() - timedelta(days=7)).strftime("%d.%m.%Y")
+    funds = []
+    for fund_type in fund_types:
+        body = get_fetch_engine().post_form(
+            FUND_UNIVERSE_URL,
+            {
+                "calismatipi": "2", "fontip": fund_type, "sfontur": "", "kurucukod": "", "fongrup": "",
+                "bastarih": week_ago, "bittarih": today, "fonturkod": "", "fonunvantip": "",
+                "strperiod": "1,1,1,1,1,1,1", "islemdurum": "1",
+            },
+            headers={"X-Requested-With": "XMLHttpRequest", "Referer": "https://www.tefas.gov.tr/FonKarsilastirma.aspx"},
+            timeout_seconds=FUND_UNIVERSE_TIMEOUT_SECONDS,
+        )
+        rows = json.loads(body).get("data") or []
+        funds.extend(fund for fund in map(FundInfo.from_record, rows) if fund is not None)
+    return funds
+
+
+def read_funds_file(path: str) -> List[FundInfo]:
+    """Funds from a CSV or JSON (array or {"data": [...]}) file with the columns in FIELDS."""
+    import pandas as pd
+
+    if path.lower().endswith(".csv"):
+        rows = pd.read_csv(path, dtype=str, keep_default_na=False).to_dict(orient="records")
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            rows = json.load(f)
+        if isinstance(rows, dict):
+            rows = rows.get("data") or rows.get("funds") or []
+    return [fund for fund in map(FundInfo.from_record, rows) if fund is not None]
+
+
+def load_universe(path: str = FUND_UNIVERSE_FILE) -> FundUniverse:
+    """The stored index, or an empty one if there is none yet."""
+    if not os.path.exists(path):
+        return FundUniverse([])
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            stored = json.load(f)
+        return FundUniverse(
+            [FundInfo(*row) for row in stored["funds"]],
+            datetime.fromisoformat(stored["fetched_at"]),
+        )
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"Warn: fund universe file unreadable, will refresh: {e}")
+        return FundUniverse([])
+
+
+def save_universe(universe: FundUniverse, path: str = FUND_UNIVERSE_FILE):
+    """Atomically replaces the stored index."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "fetched_at": universe.fetched_at.isoformat(),
+                "funds": [[fund.kod, fund.name, fund.category, fund.founder] for fund in universe],
+            },
+            f,
+            ensure_ascii=False,
+        )
+    os.replace(tmp_path, path)
+
+
+# --- process-wide index ---
+
+_universe: Optional[FundUniverse] = None
+_universe_lock = threading.Lock()
+_refresh = {"thread": None, "last_attempt": float("-inf")}
+
+
+def _is_stale(universe: FundUniverse) -> bool:
+    if universe.empty or universe.fetched_at is None:
+        return True
+    return (datetime.now() - universe.fetched_at).total_seconds() > FUND_UNIVERSE_MAX_AGE_SECONDS
+
+
+def refresh_fund_universe(funds: Optional[List[FundInfo]] = None) -> FundUniverse:
+    """Downloads the fund list (unless given), stores it and swaps it in. Raises on failure."""
+    global _universe
+    with timer("fund_universe.refresh"):
+        funds = download_funds() if funds is None else funds
+    if not funds:
+        raise ValueError("TEFAS returned an empty fund list")
+    universe = FundUniverse(funds, datetime.now())
+    save_universe(universe)
+    with _universe_lock:
+        _universe = universe
+    inc("fund_universe.refreshes")
+    return universe
+
+
+def _refresh_in_background():
+    try:
+        universe = refresh_fund_universe()
+        print(f"✅ Fund universe refreshed: {len(universe)} funds")
+    except Exception as e:
+        print(f"⚠️  Fund universe refresh failed, keeping the stored list: {e}")
+
+
+def get_fund_universe() -> FundUniverse:
+    """
+    The process-wide index, loaded from FUND_UNIVERSE_FILE on first use. Starts a
+    background refresh when it is missing or stale (at most every FUND_UNIVERSE_RETRY_SECONDS).
+    """
+    global _universe
+    if _universe is None:
+        with _universe_lock:
+            if _universe is None:
+                _universe = load_universe()
+    universe = _universe
+    if _is_stale(universe):
+        with _universe_lock:
+            thread = _refresh["thread"]
+            if (thread is None or not thread.is_alive()) and time.monotonic() - _refresh["last_attempt"] > FUND_UNIVERSE_RETRY_SECONDS:
+                _refresh["last_attempt"] = time.monotonic()
+                _refresh["thread"] = threading.Thread(target=_refresh_in_background, name="fund-universe-refresh", daemon=True)
+                _refresh["thread"].start()
+    return universe
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TEFAS fund universe index: refresh, search, validate.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    refresh = commands.add_parser("refresh", help="Download the fund list (or load it from a file)")
+    refresh.add_argument("--from-file", help="CSV or JSON file with kod/name/category/founder columns")
+    search = commands.add_parser("search", help="Search by code or name")
+    search.add_argument("query")
+    search.add_argument("--limit", type=int, default=FUND_UNIVERSE_SEARCH_LIMIT)
+    validate = commands.add_parser("validate", help="Report codes that are not TEFAS funds")
+    validate.add_argument("codes", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "refresh":
+        universe = refresh_fund_universe(read_funds_file(args.from_file) if args.from_file else None)
+        print(f"✅ {len(universe)} funds stored in {FUND_UNIVERSE_FILE}")
+        return
+
+    universe = load_universe()
+    if universe.empty:
+        print("⚠️  No fund list yet; run: python fund_universe.py refresh")
+        return
+    if args.command == "search":
+        for fund in universe.search(args.query, args.limit):
+            print(f"{fund.kod:<5} {fund.name}  [{fund.category} · {fund.founder}]")
+    else:
+        unknown = universe.unknown_codes(args.codes)
+        for code, suggestions in unknown.items():
+            print(f"❌ {code}" + (f" (did you mean {', '.join(suggestions)}?)" if suggestions else ""))
+        if not unknown:
+            print("✅ All codes are TEFAS funds")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+# ledger.py
+"""
+Transaction ledger: FIFO lots and running cost basis per fund.
+
+Trades are applied one at a time. Each fund keeps its open lots in a deque and
+running aggregates (quantity, remaining cost, realised P&L): a buy appends a lot
+and a sell consumes lots from the front. Every lot is pushed and popped once, so
+a trade is O(1) amortised however long the ledger already is. A back-dated trade
+replays only its own fund. The ledger is append-only; mistakes are corrected
+with an opposite trade.
+"""
+
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+
+BUY = "buy"
+SELL = "sell"
+SIDES = (BUY, SELL)
+
+# Remaining quantities below this are float rounding of partial sells, i.e. zero
+EPSILON = 1e-9
+
+
+class LedgerError(ValueError):
+    """A trade that cannot be applied; the message is shown to the user as is."""
+
+
+@dataclass(frozen=True)
+class Trade:
+    """One buy or sell; seq is the storage insertion order and breaks same-day ties."""
+    seq: int
+    kod: str
+    date: str  # YYYY-MM-DD
+    side: str
+    quantity: float
+    price: float
+
+    @property
+    def key(self):
+        return (self.date, self.seq)
+
+    @classmethod
+    def from_record(cls, record: Dict) -> "Trade":
+        return cls(
+            int(record["seq"]), record["kod"], record["date"], record["side"],
+            float(record["adet"]), float(record["fiyat"])
+        )
+
+
+def validate_trade(kod: str, date: str, side: str, quantity: float, price: float):
+    """Checks a trade on its own, before it is compared with the holdings."""
+    if not kod:
+        raise LedgerError("Fon kodu boş olamaz.")
+    if side not in SIDES:
+        raise LedgerError(f"Geçersiz işlem türü: {side}")
+    if not quantity > 0:
+        raise LedgerError("Adet sıfırdan büyük olmalı.")
+    if not price > 0:
+        raise LedgerError("Fiyat sıfırdan büyük olmalı.")
+    if len(date) != 10:
+        raise LedgerError(f"Geçersiz tarih: {date}")
+
+
+class FundBook:
+    """Open lots and running aggregates of one fund."""
+
+    __slots__ = ("kod", "lots", "trades", "quantity", "cost", "realized_pnl")
+
+    def __init__(self, kod: str):
+        self.kod = kod
+        self.lots = deque()  # [quantity, price] per open lot, oldest first
+        self.trades: List[Trade] = []  # In (date, seq) order, for back-dated replays
+        self.quantity = 0.0
+        self.cost = 0.0
+        self.realized_pnl = 0.0
+
+    def _apply(self, trade: Trade):
+        quantity, price = trade.quantity, trade.price
+        if trade.side == BUY:
+            self.lots.append([quantity, price])
+            self.quantity += quantity
+            self.cost += quantity * price
+        else:
+            if quantity > self.quantity + EPSILON:
+                raise LedgerError(
+                    f"{self.kod}: {trade.date} tarihinde {self.quantity:,.6g} adet varken "
+                    f"{quantity:,.6g} adet satılamaz."
+                )
+            remaining = quantity
+            while remaining > EPSILON and self.lots:
+                lot = self.lots[0]
+                taken = min(lot[0], remaining)
+                self.realized_pnl += taken * (price - lot[1])
+                self.cost -= taken * lot[1]
+                lot[0] -= taken
+                remaining -= taken
+                if lot[0] <= EPSILON:
+                    self.lots.popleft()
+            self.quantity -= quantity
+            if self.quantity <= EPSILON:
+                # Closed out: drop rounding leftovers
+                self.quantity = self.cost = 0.0
+                self.lots.clear()
+        self.trades.append(trade)
+
+    def _replayed_with(self, trade: Trade) -> "FundBook":
+        """A new book with trade inserted at its (date, seq) position; raises if any sell breaks."""
+        trades = self.trades[:]
+        position = len(trades)
+        while position and trades[position - 1].key > trade.key:
+            position -= 1
+        trades.insert(position, trade)
+        book = FundBook(self.kod)
+        for replayed in trades:
+            book._apply(replayed)
+        return book
+
+    def check(self, trade: Trade):
+        """Raises LedgerError if trade could not be added; never changes the book."""
+        if not self.trades or trade.key >= self.trades[-1].key:
+            if trade.side == SELL and trade.quantity > self.quantity + EPSILON:
+                raise LedgerError(f"{self.kod}: {self.quantity:,.6g} adet varken {trade.quantity:,.6g} adet satılamaz.")
+        else:
+            self._replayed_with(trade)
+
+    def add(self, trade: Trade):
+        if not self.trades or trade.key >= self.trades[-1].key:
+            self._apply(trade)
+            return
+        # Back-dated: replay this fund only
+        book = self._replayed_with(trade)
+        self.lots, self.trades = book.lots, book.trades
+        self.quantity, self.cost, self.realized_pnl = book.quantity, book.cost, book.realized_pnl
+
+
+class FifoLedger:
+    """All funds' books. Not synchronised: callers share one instance behind a lock."""
+
+    def __init__(self):
+        self.books: Dict[str, FundBook] = {}
+        self.last_seq = 0
+        self.trade_count = 0
+        self._seqs = set()  # Every stored trade seen (applied or rejected), so re-reads are skipped
+        self.rejected: List[Trade] = []  # Stored trades that broke a sell (e.g. imported out of order)
+        self._log: List[Trade] = []  # Applied trades in insertion order
+
+    def _book(self, kod: str) -> FundBook:
+        book = self.books.get(kod)
+        if book is None:
+            book = self.books[kod] = FundBook(kod)
+        return book
+
+    def check(self, kod: str, date: str, side: str, quantity: float, price: float):
+        """Raises LedgerError if the trade is invalid or would sell more than held at any point."""
+        validate_trade(kod, date, side, quantity, price)
+        book = self.books.get(kod)
+        if book is None:
+            if side == SELL:
+                raise LedgerError(f"{kod}: elde olmayan fon satılamaz.")
+            return
+        book.check(Trade(self.last_seq + 1, kod, date, side, quantity, price))
+
+    def add(self, trade: Trade):
+        """Applies one stored trade; raises LedgerError (and changes nothing) if it cannot be applied."""
+        self._book(trade.kod).add(trade)
+        self._seqs.add(trade.seq)
+        self.last_seq = max(self.last_seq, trade.seq)
+        self.trade_count += 1
+        self._log.append(trade)
+
+    def extend(self, trades: Iterable[Trade]) -> int:
+        """
+        Applies stored trades in (date, seq) order, so a bulk load never takes the replay path.
+        Trades seen before are skipped, so callers can re-read an overlapping range. Trades
+        that cannot be applied are kept in `rejected`. Returns the number applied.
+        """
+        applied = 0
+        for trade in sorted((t for t in trades if t.seq not in self._seqs), key=lambda t: t.key):
+            try:
+                self.add(trade)
+                applied += 1
+            except LedgerError as e:
+                print(f"⚠️  Skipping trade #{trade.seq}: {e}")
+                self._seqs.add(trade.seq)
+                self.last_seq = max(self.last_seq, trade.seq)
+                self.rejected.append(trade)
+        return applied
+
+    # --- derived views ---
+
+    def positions(self) -> Dict[str, float]:
+        """{kod: quantity} of funds still held."""
+        return {kod: book.quantity for kod, book in self.books.items() if book.quantity > EPSILON}
+
+    def holdings(self, funds: Iterable[Dict]) -> List[Dict]:
+        """
+        Fund rows ({kod, adet}) with the quantity of every traded fund taken from the
+        ledger: sold-out funds are dropped and funds only bought through trades are added.
+        Funds without trades keep their manually entered quantity.
+        """
+        rows, seen = [], set()
+        for fund in funds:
+            kod = str(fund.get("kod") or "").strip().upper()
+            book = self.books.get(kod)
+            if book is None:
+                rows.append(fund)
+                continue
+            if kod in seen:
+                continue
+            seen.add(kod)
+            if book.quantity > EPSILON:
+                rows.append({**fund, "kod": kod, "adet": book.quantity})
+        for kod, book in self.books.items():
+            if kod not in seen and book.quantity > EPSILON:
+                rows.append({"kod": kod, "adet": book.quantity})
+        return rows
+
+    def cost_basis(self) -> pd.DataFrame:
+        """quantity, cost (of the open lots) and realized_pnl per traded fund, indexed by kod."""
+        frame = pd.DataFrame(
+            [(kod, book.quantity, book.cost, book.realized_pnl) for kod, book in self.books.items()],
+            columns=["kod", "quantity", "cost", "realized_pnl"],
+        )
+        return frame.set_index("kod")
+
+    def totals(self) -> Dict:
+        """Cost of the open lots and realised P&L over all funds."""
+        return {
+            "trades": self.trade_count,
+            "cost": sum(book.cost for book in self.books.values()),
+            "realized_pnl": sum(book.realized_pnl for book in self.books.values()),
+        }
+
+    def recent_trades(self, limit: Optional[int] = None) -> List[Trade]:
+        """Applied trades, newest first."""
+        log = self._log if limit is None else self._log[-limit:]
+        return log[::-1]
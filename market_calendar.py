@@ -0,0 +1,191 @@
+# market_calendar.py
+"""
+Turkish market calendar and the refresh planner built on it.
+
+TEFAS publishes one price per fund per business day, inside a morning
+publication window. The planner maps a point in time to the price date that
+is current then (the latest business day whose window has opened) and decides
+for each cached quote, from the time it was fetched, whether a new fetch could
+return a newer price:
+
+- fetched after the latest window closed: final until the next window opens
+  (evenings, weekends, holidays and the night before the next publication)
+- the window is open now: refetched at most every retry_seconds
+- fetched before the latest window closed, window now closed: fetched once more
+
+Every decision takes an explicit `now` (or the planner's clock), so it can be
+checked against a frozen clock.
+"""
+
+import threading
+from dataclasses import dataclass
+from datetime import date, datetime, time as dtime, timedelta, timezone
+from typing import Callable, Iterable, Optional
+
+from config import (
+    TEFAS_UTC_OFFSET_HOURS,
+    TEFAS_PUBLICATION_START,
+    TEFAS_PUBLICATION_END,
+    QUOTE_CACHE_TTL_SECONDS,
+    MARKET_EXTRA_HOLIDAYS,
+)
+
+TEFAS_TZ = timezone(timedelta(hours=TEFAS_UTC_OFFSET_HOURS))
+
+# (month, day) of the official holidays with a fixed date
+FIXED_HOLIDAYS = (
+    (1, 1),    # Yılbaşı
+    (4, 23),   # Ulusal Egemenlik ve Çocuk Bayramı
+    (5, 1),    # Emek ve Dayanışma Günü
+    (5, 19),   # Atatürk'ü Anma, Gençlik ve Spor Bayramı
+    (7, 15),   # Demokrasi ve Milli Birlik Günü
+    (8, 30),   # Zafer Bayramı
+    (10, 29),  # Cumhuriyet Bayramı
+)
+
+# Ramazan and Kurban Bayramı follow the lunar calendar. Eves (arife) are half
+# sessions and still priced, so they are not listed. Years missing here are
+# treated as having no religious holidays: the planner then fetches on those
+# days, which costs requests but never serves a stale price.
+RELIGIOUS_HOLIDAYS = {
+    2024: ("2024-04-10", "2024-04-11", "2024-04-12",
+           "2024-06-16", "2024-06-17", "2024-06-18", "2024-06-19"),
+    2025: ("2025-03-30", "2025-03-31", "2025-04-01",
+           "2025-06-06", "2025-06-07", "2025-06-08", "2025-06-09"),
+    2026: ("2026-03-20", "2026-03-21", "2026-03-22",
+           "2026-05-27", "2026-05-28", "2026-05-29", "2026-05-30"),
+    2027: ("2027-03-09", "2027-03-10", "2027-03-11",
+           "2027-05-16", "2027-05-17", "2027-05-18", "2027-05-19"),
+}
+
+
+def _parse_time(text: str) -> dtime:
+    hours, minutes = text.split(":")
+    return dtime(int(hours), int(minutes))
+
+
+class MarketCalendar:
+    """Business days of the Turkish fund market: weekdays that are not official holidays."""
+
+    def __init__(self, extra_holidays: Iterable[str] = MARKET_EXTRA_HOLIDAYS):
+        self._holidays = {
+            date.fromisoformat(day)
+            for days in RELIGIOUS_HOLIDAYS.values()
+            for day in days
+        }
+        self._holidays.update(date.fromisoformat(day) for day in extra_holidays)
+
+    def covers(self, year: int) -> bool:
+        """Whether the religious holidays of year are known (see RELIGIOUS_HOLIDAYS)."""
+        return year in RELIGIOUS_HOLIDAYS
+
+    def is_holiday(self, day: date) -> bool:
+        return (day.month, day.day) in FIXED_HOLIDAYS or day in self._holidays
+
+    def is_business_day(self, day: date) -> bool:
+        return day.weekday() < 5 and not self.is_holiday(day)
+
+    def previous_business_day(self, day: date) -> date:
+        """The last business day strictly before day."""
+        day -= timedelta(days=1)
+        while not self.is_business_day(day):
+            day -= timedelta(days=1)
+        return day
+
+    def next_business_day(self, day: date) -> date:
+        """The first business day strictly after day."""
+        day += timedelta(days=1)
+        while not self.is_business_day(day):
+            day += timedelta(days=1)
+        return day
+
+
+@dataclass(frozen=True)
+class RefreshDecision:
+    """Whether to fetch a fund now; if not, when it is worth asking again."""
+    fetch: bool
+    reason: str
+    recheck_at: Optional[datetime] = None
+
+
+class RefreshPlanner:
+    """Decides per cached quote whether TEFAS could have a newer price."""
+
+    def __init__(
+        self,
+        calendar: Optional[MarketCalendar] = None,
+        publication_start: str = TEFAS_PUBLICATION_START,
+        publication_end: str = TEFAS_PUBLICATION_END,
+        retry_seconds: float = QUOTE_CACHE_TTL_SECONDS,
+        clock: Optional[Callable[[], datetime]] = None,
+    ):
+        self.calendar = calendar or MarketCalendar()
+        self.publication_start = _parse_time(publication_start)
+        self.publication_end = _parse_time(publication_end)
+        self.retry_seconds = retry_seconds
+        self.clock = clock or (lambda: datetime.now(TEFAS_TZ))
+
+    def _now(self, now: Optional[datetime]) -> datetime:
+        return (now or self.clock()).astimezone(TEFAS_TZ)
+
+    def _window(self, day: date):
+        return (
+            datetime.combine(day, self.publication_start, TEFAS_TZ),
+            datetime.combine(day, self.publication_end, TEFAS_TZ),
+        )
+
+    def price_day(self, now: Optional[datetime] = None) -> date:
+        """The latest business day whose publication window has opened by now."""
+        now = self._now(now)
+        today = now.date()
+        if self.calendar.is_business_day(today) and now.time() >= self.publication_start:
+            return today
+        return self.calendar.previous_business_day(today)
+
+    def price_date(self, now: Optional[datetime] = None) -> str:
+        """price_day as YYYY-MM-DD: the price date a fresh fetch would belong to."""
+        return self.price_day(now).isoformat()
+
+    def next_publication(self, now: Optional[datetime] = None) -> datetime:
+        """When the next publication window opens."""
+        now = self._now(now)
+        today = now.date()
+        if self.calendar.is_business_day(today) and now.time() < self.publication_start:
+            return self._window(today)[0]
+        return self._window(self.calendar.next_business_day(today))[0]
+
+    def decide(self, fetched_at: Optional[float], now: Optional[datetime] = None) -> RefreshDecision:
+        """Whether a quote fetched at fetched_at (epoch seconds, None if never) should be fetched again."""
+        now = self._now(now)
+        if fetched_at is None:
+            return RefreshDecision(True, "not cached")
+        fetched = datetime.fromtimestamp(fetched_at, TEFAS_TZ)
+        window_start, window_end = self._window(self.price_day(now))
+
+        if fetched >= window_end:
+            return RefreshDecision(False, "final until next publication", self.next_publication(now))
+        if now < window_end:
+            # Publication in progress: funds appear one by one
+            retry_at = fetched + timedelta(seconds=self.retry_seconds)
+            if now < retry_at and fetched >= window_start:
+                return RefreshDecision(False, "publication window, fetched recently", retry_at)
+            return RefreshDecision(True, "publication window")
+        return RefreshDecision(True, "fetched before publication")
+
+
+# Global planner instance, shared by the quote cache and every session
+_refresh_planner = None
+_refresh_planner_lock = threading.Lock()
+
+def get_refresh_planner() -> RefreshPlanner:
+    """Get or create the process-wide refresh planner."""
+    global _refresh_planner
+    if _refresh_planner is None:
+        with _refresh_planner_lock:
+            if _refresh_planner is None:
+                _refresh_planner = RefreshPlanner()
+                year = _refresh_planner.price_day().year
+                if not _refresh_planner.calendar.covers(year):
+                    print(f"⚠️  No religious holidays listed for {year} in market_calendar.RELIGIOUS_HOLIDAYS: "
+                          f"those days will be fetched as business days")
+    return _refresh_planner
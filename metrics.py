@@ -0,0 +1,162 @@
+# metrics.py
+"""Lightweight in-process instrumentation: per-stage latency histograms and counters."""
+
+import functools
+import json
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence
+
+# Upper bounds (seconds) shared by every stage histogram, Prometheus style
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+METRIC_PREFIX = "portfolio"
+
+
+class Histogram:
+    """Fixed-bucket latency histogram. Not thread-safe on its own; the registry locks around it."""
+
+    __slots__ = ("buckets", "counts", "sum", "count", "max")
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimates a quantile by linear interpolation inside the matching bucket."""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.max
+
+    def summary(self) -> Dict:
+        return {
+            "count": self.count,
+            "sum_s": self.sum,
+            "mean_s": self.sum / self.count if self.count else None,
+            "p50_s": self.quantile(0.50),
+            "p95_s": self.quantile(0.95),
+            "max_s": self.max,
+        }
+
+
+class MetricsRegistry:
+    """Process-wide collection of stage histograms and event counters."""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Histogram] = {}
+        self._counters: Dict[str, float] = {}
+        self.started_at = time.time()
+
+    # --- recording ---
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def inc(self, name: str, value: float = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    @contextmanager
+    def timer(self, stage: str):
+        """Times the block into the `stage` histogram; exceptions also count `<stage>.errors`."""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc(f"{stage}.errors")
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def timed(self, stage: str):
+        """Decorator form of timer()."""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.timer(stage):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self.started_at = time.time()
+
+    # --- export ---
+
+    def snapshot(self) -> Dict:
+        """Stage summaries, raw buckets and counters as plain data."""
+        with self._lock:
+            stages = {
+                name: {**h.summary(), "buckets": dict(zip([*map(str, h.buckets), "+Inf"], h.counts))}
+                for name, h in self._histograms.items()
+            }
+            counters = dict(self._counters)
+        return {"started_at": self.started_at, "stages": stages, "counters": counters}
+
+    def to_json(self, indent: Optional[int] = 2) -> str:
+        return json.dumps(self.snapshot(), indent=indent, sort_keys=True)
+
+    def to_prometheus(self) -> str:
+        """Renders everything in the Prometheus text exposition format."""
+        lines: List[str] = []
+        with self._lock:
+            histograms = {name: (h.buckets, list(h.counts), h.sum, h.count) for name, h in self._histograms.items()}
+            counters = dict(self._counters)
+
+        name = f"{METRIC_PREFIX}_stage_duration_seconds"
+        lines.append(f"# HELP {name} Latency of instrumented stages.")
+        lines.append(f"# TYPE {name} histogram")
+        for stage in sorted(histograms):
+            buckets, counts, total, count = histograms[stage]
+            cumulative = 0
+            for upper, bucket_count in zip([*buckets, "+Inf"], counts):
+                cumulative += bucket_count
+                le = upper if upper == "+Inf" else repr(float(upper))
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {total}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {count}')
+
+        name = f"{METRIC_PREFIX}_events_total"
+        lines.append(f"# HELP {name} Counted events (errors, cache hits, retries, ...).")
+        lines.append(f"# TYPE {name} counter")
+        for event in sorted(counters):
+            lines.append(f'{name}{{event="{event}"}} {counters[event]}')
+
+        return "\n".join(lines) + "\n"
+
+
+# Global registry, shared by all Streamlit sessions in this process
+registry = MetricsRegistry()
+
+timer = registry.timer
+timed = registry.timed
+inc = registry.inc
@@ -1,97 +1,321 @@
 """
-Migration script to transfer existing JSON/CSV data to MongoDB.
-Run this once after setting up MongoDB connection in secrets.toml
+Bulk importer: funds, portfolio history and per-fund price snapshots into the
+configured storage backend (MongoDB by default, see STORAGE_BACKEND in config.py).
+
+Files are read in chunks of IMPORT_CHUNK_SIZE rows (CSV, JSON Lines and Parquet
+are streamed; a plain JSON array is read whole) and every chunk is upserted on
+its natural key: funds on kod, history on date, prices on (kod, date). Memory
+stays constant and re-running an import never duplicates anything. A fund code
+on several rows is stored as the sum of their quantities, wherever the rows are. After each
+committed chunk the number of rows done is stored in IMPORT_CHECKPOINT_FILE, so
+an interrupted import resumes where it stopped. Change counters are bumped, so
+running apps pick up the imported data without a restart.
+
+Usage:
+    python migrate_to_mongodb.py                            # funds.json + portfolio_history.csv
+    python migrate_to_mongodb.py prices.parquet             # kind guessed from the file name
+    python migrate_to_mongodb.py backfill.jsonl --kind prices --chunk-size 100000
+    python migrate_to_mongodb.py history.csv --restart      # ignore the checkpoint
 """
 
+import argparse
+import csv
 import json
 import os
+import sys
+import time
+from typing import Dict, Iterator, List, Optional
+
 import pandas as pd
+
+from config import IMPORT_CHUNK_SIZE, IMPORT_CHECKPOINT_FILE
+from storage import get_storage_backend
 from db_manager import (
-    get_mongo_connection,
-    save_all_funds_to_db,
-    save_daily_total_to_db
+    upsert_funds_to_db,
+    save_history_records_to_db,
+    save_price_snapshots_to_db,
+    bump_collection_version
 )
+from repository import FUNDS, HISTORY, FUND_PRICES
+
+# Per kind: accepted column names for each field (stored name first), defaults of the
+# optional fields, the writer (upserts on the natural key) and the versioned collection
+KINDS = {
+    "funds": {
+        "fields": {"kod": ("kod", "Fon Kodu", "code"), "adet": ("adet", "Adet", "quantity")},
+        "defaults": {},
+        "write": upsert_funds_to_db,
+        "collection": FUNDS,
+    },
+    "history": {
+        "fields": {"date": ("date", "Date"), "total_value": ("total_value", "TotalValue")},
+        "defaults": {},
+        "write": save_history_records_to_db,
+        "collection": HISTORY,
+    },
+    "prices": {
+        "fields": {
+            "kod": ("kod", "Fon Kodu", "code"),
+            "date": ("date", "Date", "Tarih"),
+            "price": ("price", "Birim Fiyat", "fiyat"),
+            "daily_return": ("daily_return", "Günlük Getiri (%)"),
+            "category": ("category", "Kategori"),
+        },
+        "defaults": {"daily_return": 0.0, "category": ""},
+        "write": save_price_snapshots_to_db,
+        "collection": FUND_PRICES,
+    },
+}
+
+FORMATS = {".csv": "csv", ".json": "json", ".jsonl": "jsonl", ".ndjson": "jsonl", ".parquet": "parquet", ".pq": "parquet"}
+
+
+class ImportFailed(Exception):
+    """A chunk could not be written; the checkpoint still points before it."""
+
+
+def detect_format(path: str) -> str:
+    fmt = FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt is None:
+        raise ValueError(f"Unsupported file type: {path} (expected {', '.join(FORMATS)})")
+    if fmt == "json":
+        # A .json file holding one object per line is JSON Lines and can be streamed
+        with open(path, "r", encoding="utf-8") as f:
+            head = f.read(4096).lstrip()
+        if not head.startswith("["):
+            fmt = "jsonl"
+    return fmt
+
+
+def detect_kind(path: str) -> str:
+    name = os.path.basename(path).lower()
+    for kind, hints in (("prices", ("price", "fiyat", "snapshot")), ("history", ("history", "gecmis")), ("funds", ("fund", "fon"))):
+        if any(hint in name for hint in hints):
+            return kind
+    raise ValueError(f"Cannot tell what {path} contains; pass --kind ({', '.join(KINDS)})")
+
+
+def count_rows(path: str, fmt: str) -> Optional[int]:
+    """Total data rows, for progress; counted by a streaming scan, without converting values."""
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).metadata.num_rows
+    if fmt == "json":
+        return None
+    if fmt == "csv":
+        # Records, not lines: quoted fields may span lines. Blank lines are skipped like read_csv does
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            return max(sum(1 for row in csv.reader(f) if row) - 1, 0)
+    lines, last = 0, b"\n"
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            lines += block.count(b"\n")
+            last = block[-1:]
+    lines += last != b"\n"  # No trailing newline
+    return lines
 
-def migrate_funds():
-    """Migrate funds from funds.json to MongoDB."""
-    funds_file = "funds.json"
-    
-    if not os.path.exists(funds_file):
-        print("⚠️  funds.json not found, skipping funds migration")
+
+def read_chunks(path: str, fmt: str, chunk_size: int, skip_rows: int = 0) -> Iterator[pd.DataFrame]:
+    """Yields the file as DataFrames of at most chunk_size rows, starting after skip_rows rows."""
+    if fmt == "csv":
+        # Skipped lines are not parsed; the header (line 0) is kept
+        yield from pd.read_csv(path, chunksize=chunk_size, skiprows=range(1, skip_rows + 1) if skip_rows else None)
         return
-    
-    try:
-        with open(funds_file, "r", encoding="utf-8") as f:
-            funds = json.load(f)
-        
-        if funds:
-            print(f"📦 Migrating {len(funds)} funds to MongoDB...")
-            save_all_funds_to_db(funds)
-            print("✅ Funds migrated successfully!")
+    if fmt == "jsonl":
+        chunks = (chunk for chunk in pd.read_json(path, lines=True, chunksize=chunk_size, dtype=False))
+    elif fmt == "parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Parquet import needs pyarrow: pip install pyarrow") from e
+        batches = pq.ParquetFile(path).iter_batches(batch_size=chunk_size)
+        chunks = (batch.to_pandas() for batch in batches)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            frame = pd.DataFrame(json.load(f))
+        chunks = (frame.iloc[start:start + chunk_size] for start in range(0, len(frame), chunk_size))
+    for chunk in chunks:
+        if skip_rows >= len(chunk):
+            skip_rows -= len(chunk)
+            continue
+        yield chunk.iloc[skip_rows:] if skip_rows else chunk
+        skip_rows = 0
+
+
+def normalize_chunk(chunk: pd.DataFrame, kind: str) -> List[Dict]:
+    """Maps accepted column names to stored ones and drops rows without a valid key or value."""
+    spec = KINDS[kind]
+    columns = {}
+    for field, aliases in spec["fields"].items():
+        name = next((alias for alias in aliases if alias in chunk.columns), None)
+        if name is not None:
+            columns[field] = chunk[name].to_numpy()
+        elif field in spec["defaults"]:
+            columns[field] = spec["defaults"][field]
         else:
-            print("ℹ️  No funds to migrate")
-            
-    except Exception as e:
-        print(f"❌ Error migrating funds: {e}")
-
-def migrate_history():
-    """Migrate portfolio history from CSV to MongoDB."""
-    history_file = "portfolio_history.csv"
-    
-    if not os.path.exists(history_file):
-        print("⚠️  portfolio_history.csv not found, skipping history migration")
-        return
-    
-    try:
-        df = pd.read_csv(history_file)
-        
-        if df.empty:
-            print("ℹ️  No history to migrate")
-            return
-        
-        print(f"📊 Migrating {len(df)} history records to MongoDB...")
-        
-        db = get_mongo_connection()
-        history_collection = db.portfolio_history
-        
-        # Convert DataFrame to list of documents
-        records = []
-        for _, row in df.iterrows():
-            records.append({
-                "date": row["Date"],
-                "total_value": float(row["TotalValue"])
-            })
-        
-        # Bulk insert
-        if records:
-            history_collection.insert_many(records)
-            print(f"✅ {len(records)} history records migrated successfully!")
-            
-    except Exception as e:
-        print(f"❌ Error migrating history: {e}")
+            raise ValueError(f"{kind}: column '{field}' is missing (accepted names: {', '.join(aliases)})")
+    frame = pd.DataFrame(columns, index=range(len(chunk)))
+
+    if "kod" in frame:
+        frame["kod"] = frame["kod"].astype("string").str.strip().str.upper()
+    if "date" in frame:
+        frame["date"] = pd.to_datetime(frame["date"], errors="coerce").dt.strftime("%Y-%m-%d")
+    for field in ("adet", "total_value", "price", "daily_return"):
+        if field in frame:
+            frame[field] = pd.to_numeric(frame[field], errors="coerce")
+    for field, default in spec["defaults"].items():
+        frame[field] = frame[field].fillna(default)
+
+    frame = frame.dropna(subset=[field for field in spec["fields"] if field not in spec["defaults"]])
+    if "kod" in frame:
+        frame = frame[frame["kod"] != ""]
+    return frame.to_dict(orient="records")
+
+
+def add_fund_totals(records: List[Dict], totals: Dict[str, float]) -> List[Dict]:
+    """
+    Adds a chunk's quantities to the running per-code totals of the file and returns the
+    chunk's funds with their totals so far. The upsert overwrites, so a code repeated in a
+    later chunk still ends up as the sum of all its rows, like repeats within one chunk.
+    """
+    codes = []
+    for record in records:
+        if record["adet"] > 0:
+            totals[record["kod"]] = totals.get(record["kod"], 0.0) + float(record["adet"])
+            codes.append(record["kod"])
+    return [{"kod": kod, "adet": totals[kod]} for kod in dict.fromkeys(codes)]
+
+
+# --- checkpoint ---
+
+def load_checkpoints(checkpoint_file: str) -> Dict:
+    if not os.path.exists(checkpoint_file):
+        return {}
+    with open(checkpoint_file, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_checkpoints(checkpoint_file: str, checkpoints: Dict):
+    """Atomically replaces the checkpoint file, so a crash never leaves it half-written."""
+    tmp_path = f"{checkpoint_file}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoints, f, indent=2)
+    os.replace(tmp_path, checkpoint_file)
+
+
+def _file_signature(path: str) -> Dict:
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+
+# --- import ---
+
+def import_file(
+    path: str,
+    kind: Optional[str] = None,
+    chunk_size: int = IMPORT_CHUNK_SIZE,
+    checkpoint_file: str = IMPORT_CHECKPOINT_FILE,
+    restart: bool = False,
+) -> int:
+    """
+    Imports one file chunk by chunk, resuming from its checkpoint unless restart is set
+    or the file changed since. Returns the number of rows written in this run.
+    Raises ImportFailed if a chunk could not be written.
+    """
+    kind = kind or detect_kind(path)
+    fmt = detect_format(path)
+    key = f"{kind}:{os.path.abspath(path)}"
+    signature = _file_signature(path)
+
+    checkpoints = load_checkpoints(checkpoint_file)
+    checkpoint = checkpoints.get(key)
+    if checkpoint and not restart and all(checkpoint.get(k) == v for k, v in signature.items()):
+        if checkpoint.get("done"):
+            print(f"✅ {path}: already imported ({checkpoint['rows']:,} rows); use --restart to import again")
+            return 0
+        print(f"↪️  {path}: resuming after {checkpoint['rows']:,} rows")
+    else:
+        if checkpoint and not restart:
+            print(f"ℹ️  {path} changed since the last run, starting over")
+        checkpoint = {**signature, "rows": 0, "written": 0, "done": False}
+    # Funds: running totals per code, checkpointed so a resumed import keeps adding up
+    fund_totals = checkpoint.setdefault("fund_totals", {}) if kind == "funds" else None
+
+    total = count_rows(path, fmt)
+    rows_done, written = checkpoint["rows"], 0
+    started = time.perf_counter()
+    print(f"📦 Importing {kind} from {path} ({fmt}{f', {total:,} rows' if total is not None else ''})")
+
+    for chunk in read_chunks(path, fmt, chunk_size, skip_rows=rows_done):
+        records = normalize_chunk(chunk, kind)
+        batch = add_fund_totals(records, fund_totals) if fund_totals is not None else records
+        if batch and not KINDS[kind]["write"](batch):
+            raise ImportFailed(f"{path}: writing rows {rows_done + 1:,}-{rows_done + len(chunk):,} failed")
+        rows_done += len(chunk)
+        written += len(records)
+
+        checkpoint.update(rows=rows_done, written=checkpoint["written"] + len(records))
+        checkpoints[key] = checkpoint
+        save_checkpoints(checkpoint_file, checkpoints)
+
+        elapsed = time.perf_counter() - started
+        progress = f"{rows_done:,}/{total:,} ({rows_done / total:.0%})" if total else f"{rows_done:,}"
+        print(f"  ⏳ {kind}: {progress} rows · {written / elapsed if elapsed else 0:,.0f} rows/s")
+
+    # Running apps re-read the collection on their next rerun
+    bump_collection_version(KINDS[kind]["collection"])
+    checkpoint["done"] = True
+    checkpoints[key] = checkpoint
+    save_checkpoints(checkpoint_file, checkpoints)
+
+    skipped = rows_done - checkpoint["written"]
+    print(
+        f"✅ {kind}: {written:,} rows written in {time.perf_counter() - started:.1f}s"
+        + (f" ({skipped:,} invalid rows skipped)" if skipped else "")
+    )
+    return written
+
 
 def main():
-    print("🚀 Starting MongoDB migration...\n")
-    
+    parser = argparse.ArgumentParser(description="Import funds, history or price snapshots (CSV, JSON, Parquet).")
+    parser.add_argument("files", nargs="*", help="Files to import (default: funds.json and portfolio_history.csv)")
+    parser.add_argument("--kind", choices=sorted(KINDS), help="What the files contain (default: guessed from the name)")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE, help="Rows per chunk")
+    parser.add_argument("--checkpoint", default=IMPORT_CHECKPOINT_FILE, help="Checkpoint file")
+    parser.add_argument("--restart", action="store_true", help="Ignore checkpoints and import from the first row")
+    args = parser.parse_args()
+
+    files = args.files or [path for path in ("funds.json", "portfolio_history.csv") if os.path.exists(path)]
+    if not files:
+        print("⚠️  Nothing to import (funds.json and portfolio_history.csv not found)")
+        return
+
+    print("🚀 Starting import...\n")
+
     try:
         # Test connection
-        db = get_mongo_connection()
-        print(f"✅ Connected to MongoDB: {db.name}\n")
-        
-        # Migrate data
-        migrate_funds()
-        print()
-        migrate_history()
-        
-        print("\n✨ Migration completed!")
-        print("\n💡 Tip: You can now safely delete funds.json and portfolio_history.csv")
-        
+        backend = get_storage_backend()
+        backend.connect()
+        print(f"✅ Connected to {backend.describe()}\n")
     except Exception as e:
-        print(f"\n❌ Migration failed: {e}")
+        print(f"\n❌ Import failed: {e}")
         print("\n🔧 Make sure:")
         print("  1. MongoDB connection is configured in .streamlit/secrets.toml")
         print("  2. MongoDB cluster is accessible")
         print("  3. Database user has write permissions")
+        sys.exit(1)
+
+    for path in files:
+        try:
+            import_file(path, args.kind, args.chunk_size, args.checkpoint, args.restart)
+        except (ImportFailed, ValueError, ImportError, OSError) as e:
+            print(f"❌ {e}")
+            print("💡 Fix the problem and run the same command again; it resumes from the last committed chunk.")
+            sys.exit(1)
+        print()
+
+    print("✨ Import completed!")
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,84 @@
+# portfolio_table.py
+"""
+The latest valued portfolio as one immutable, column-oriented table per process.
+
+The repository builds a PortfolioTable once per published snapshot and hands
+the same object to every Streamlit session, which keeps a reference instead of
+its own DataFrame. Columns are read-only arrays: frame() wraps them without
+copying, and per-session views (e.g. the category filter) are row index arrays
+taken at render time. Memory therefore stays flat as sessions are added.
+"""
+
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class PortfolioTable:
+    """Read-only after construction; safe to share between threads and sessions."""
+
+    def __init__(
+        self,
+        frame: pd.DataFrame,
+        positions: Dict[str, float],
+        updated_at: Optional[datetime],
+        failed_funds: Optional[Dict] = None,
+    ):
+        columns = {}
+        for name in frame.columns:
+            values = np.array(frame[name].to_numpy(), copy=True)
+            values.flags.writeable = False
+            columns[name] = values
+        # One frame over the read-only arrays; built once, then only shallow-copied
+        self._frame = pd.DataFrame(columns, index=pd.RangeIndex(len(frame)), copy=False)
+        self.positions = dict(positions)
+        self.updated_at = updated_at
+        self.failed_funds = dict(failed_funds or {})
+        self.total_value = float(self._frame["Toplam Değer"].sum()) if len(frame) else 0.0
+        self._lock = threading.Lock()
+        self._rows: Dict[tuple, np.ndarray] = {}
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, positions: Dict[str, float], updated_at: Optional[datetime]) -> "PortfolioTable":
+        """From get_portfolio_data's result; keeps the failed funds it reported in df.attrs."""
+        return cls(df, positions, updated_at, df.attrs.get("failed_funds"))
+
+    def __len__(self) -> int:
+        return len(self._frame)
+
+    @property
+    def empty(self) -> bool:
+        return self._frame.empty
+
+    def frame(self, rows: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """
+        The table as a DataFrame sharing the column arrays (new columns stay local to it),
+        or only the given row positions.
+        """
+        frame = self._frame.copy(deep=False) if rows is None else self._frame.take(rows)
+        frame.attrs["failed_funds"] = dict(self.failed_funds)
+        return frame
+
+    def rows_where(self, column: str, value) -> np.ndarray:
+        """Row positions where column == value, memoised (the table never changes)."""
+        key = (column, value)
+        with self._lock:
+            rows = self._rows.get(key)
+        if rows is None:
+            rows = np.flatnonzero(self._frame[column].to_numpy() == value)
+            rows.flags.writeable = False
+            with self._lock:
+                self._rows[key] = rows
+        return rows
+
+    def unique(self, column: str) -> List:
+        """Sorted distinct non-null values of a column."""
+        if column not in self._frame.columns:
+            return []
+        return sorted(self._frame[column].dropna().unique().tolist())
+
+    def nbytes(self) -> int:
+        return int(self._frame.memory_usage(deep=True).sum())
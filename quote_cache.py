@@ -0,0 +1,235 @@
+# quote_cache.py
+"""Process-wide two-tier cache for TEFAS fund quotes (memory LRU + SQLite)."""
+
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from config import (
+    QUOTE_CACHE_FILE,
+    QUOTE_CACHE_MEMORY_ENTRIES,
+    QUOTE_CACHE_DISK_ENTRIES,
+    QUOTE_CACHE_TTL_SECONDS,
+    QUOTE_CACHE_HISTORICAL_TTL_SECONDS,
+)
+from market_calendar import TEFAS_TZ, RefreshPlanner, get_refresh_planner
+
+# Cached value: (price, daily_return_percent, category)
+Quote = Tuple[float, float, str]
+
+
+def current_price_date() -> str:
+    """
+    Returns the price date (YYYY-MM-DD) a fresh fetch would belong to: the latest
+    business day whose TEFAS publication has started, so weekends and holidays keep
+    the last published date.
+    """
+    return get_refresh_planner().price_date()
+
+
+class QuoteCache:
+    """
+    Quote cache keyed by (fund code, price date).
+
+    Lookups go memory -> disk -> miss. Quotes for the current price date stay fresh
+    for as long as the refresh planner says TEFAS cannot have a newer price (until the
+    next publication window; `ttl_seconds` apart while one is open). Quotes for past
+    dates cannot change and use `historical_ttl_seconds`.
+    Both tiers are bounded: the memory tier by LRU order, the disk tier by age and size.
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[str] = QUOTE_CACHE_FILE,
+        max_memory_entries: int = QUOTE_CACHE_MEMORY_ENTRIES,
+        max_disk_entries: int = QUOTE_CACHE_DISK_ENTRIES,
+        ttl_seconds: float = QUOTE_CACHE_TTL_SECONDS,
+        historical_ttl_seconds: float = QUOTE_CACHE_HISTORICAL_TTL_SECONDS,
+        planner: Optional[RefreshPlanner] = None,
+    ):
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl_seconds = ttl_seconds
+        self.historical_ttl_seconds = historical_ttl_seconds
+        self.planner = planner or RefreshPlanner(retry_seconds=ttl_seconds)
+
+        self._lock = threading.Lock()
+        # (code, price_date) -> (quote, fetched_at)
+        self._memory: "OrderedDict[Tuple[str, str], Tuple[Quote, float]]" = OrderedDict()
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+            "writes": 0,
+        }
+
+        self._conn = None
+        if db_path:
+            try:
+                self._conn = sqlite3.connect(db_path, check_same_thread=False)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+                self._conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS quotes (
+                        code TEXT NOT NULL,
+                        price_date TEXT NOT NULL,
+                        price REAL NOT NULL,
+                        daily_return REAL NOT NULL,
+                        category TEXT NOT NULL,
+                        fetched_at REAL NOT NULL,
+                        PRIMARY KEY (code, price_date)
+                    )
+                    """
+                )
+                self._conn.execute("CREATE INDEX IF NOT EXISTS idx_quotes_fetched_at ON quotes (fetched_at)")
+                self._conn.commit()
+            except sqlite3.Error as e:
+                # Disk tier is an optimisation; fall back to memory only
+                print(f"Warn: quote cache disk tier disabled: {e}")
+                self._conn = None
+
+    # --- internals ---
+
+    def _is_fresh(self, price_date: str, fetched_at: float, now: float) -> bool:
+        moment = datetime.fromtimestamp(now, TEFAS_TZ)
+        if price_date < self.planner.price_date(moment):
+            return now - fetched_at <= self.historical_ttl_seconds
+        return not self.planner.decide(fetched_at, moment).fetch
+
+    def _remember(self, key: Tuple[str, str], quote: Quote, fetched_at: float):
+        """Inserts into the memory tier, evicting least recently used entries. Caller holds the lock."""
+        self._memory[key] = (quote, fetched_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self._stats["memory_evictions"] += 1
+
+    def _evict_disk(self, now: float):
+        """Drops expired rows and trims the table to max_disk_entries. Caller holds the lock."""
+        cur = self._conn.execute(
+            "DELETE FROM quotes WHERE fetched_at < ?",
+            (now - max(self.ttl_seconds, self.historical_ttl_seconds),),
+        )
+        evicted = cur.rowcount
+        cur = self._conn.execute(
+            """
+            DELETE FROM quotes WHERE rowid IN (
+                SELECT rowid FROM quotes ORDER BY fetched_at DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_disk_entries,),
+        )
+        evicted += cur.rowcount
+        self._stats["disk_evictions"] += max(evicted, 0)
+
+    # --- public API ---
+
+    def get(self, code: str, price_date: str) -> Optional[Quote]:
+        """Returns the cached quote for (code, price_date) or None if missing/expired."""
+        key = (code, price_date)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                quote, fetched_at = entry
+                if self._is_fresh(price_date, fetched_at, now):
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return quote
+                del self._memory[key]
+                self._stats["expired"] += 1
+
+            if self._conn is not None:
+                try:
+                    row = self._conn.execute(
+                        "SELECT price, daily_return, category, fetched_at FROM quotes "
+                        "WHERE code = ? AND price_date = ?",
+                        key,
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    print(f"Warn: quote cache read failed for {code}: {e}")
+                    row = None
+                if row is not None:
+                    price, rate, category, fetched_at = row
+                    if self._is_fresh(price_date, fetched_at, now):
+                        quote = (price, rate, category)
+                        self._remember(key, quote, fetched_at)
+                        self._stats["disk_hits"] += 1
+                        return quote
+                    self._stats["expired"] += 1
+
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, code: str, price_date: str, quote: Quote):
+        """Stores a single quote in both tiers."""
+        self.put_many(price_date, {code: quote})
+
+    def put_many(self, price_date: str, quotes: Dict[str, Quote]):
+        """Stores several quotes for the same price date in one disk transaction."""
+        if not quotes:
+            return
+        now = time.time()
+        with self._lock:
+            for code, quote in quotes.items():
+                self._remember((code, price_date), quote, now)
+            self._stats["writes"] += len(quotes)
+
+            if self._conn is not None:
+                try:
+                    with self._conn:
+                        self._conn.executemany(
+                            "INSERT OR REPLACE INTO quotes "
+                            "(code, price_date, price, daily_return, category, fetched_at) "
+                            "VALUES (?, ?, ?, ?, ?, ?)",
+                            [
+                                (code, price_date, q[0], q[1], q[2], now)
+                                for code, q in quotes.items()
+                            ],
+                        )
+                        self._evict_disk(now)
+                except sqlite3.Error as e:
+                    print(f"Warn: quote cache write failed: {e}")
+
+    def clear(self):
+        """Empties both tiers (stats are kept)."""
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute("DELETE FROM quotes")
+
+    def stats(self) -> Dict:
+        """Returns hit/miss counters and tier sizes."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+            if self._conn is not None:
+                stats["disk_entries"] = self._conn.execute("SELECT COUNT(*) FROM quotes").fetchone()[0]
+            else:
+                stats["disk_entries"] = 0
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        lookups = hits + stats["misses"]
+        stats["hit_ratio"] = hits / lookups if lookups else 0.0
+        return stats
+
+
+# Global cache instance, shared by all Streamlit sessions in this process
+_quote_cache = None
+_quote_cache_lock = threading.Lock()
+
+def get_quote_cache() -> QuoteCache:
+    """Get or create the process-wide quote cache."""
+    global _quote_cache
+    if _quote_cache is None:
+        with _quote_cache_lock:
+            if _quote_cache is None:
+                _quote_cache = QuoteCache()
+    return _quote_cache
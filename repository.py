@@ -0,0 +1,339 @@
+# repository.py
+"""
+Read-through cache over db_manager for the data every rerun needs: the fund list,
+the portfolio history and the latest valued portfolio. Per-fund price snapshots
+and transactions are versioned too, so derived data (analytics, the ledger) knows
+when to re-read them.
+
+Writes go through the repository and bump a per-collection change counter
+(db_manager.bump_collection_version). Readers serve from memory and check the
+counters at most once per REPOSITORY_SYNC_INTERVAL_SECONDS: in the common case a
+rerun costs a single small read, and nothing is re-read unless it actually
+changed, in this process or in another one (e.g. worker.py). With
+REPOSITORY_CHANGE_STREAMS enabled a watcher thread invalidates the cache from a
+change stream instead (MongoDB only), and even that read goes away.
+
+Daily totals are written behind (write_behind.py): an unchanged total is not
+written at all, a changed one is written in the background, and the history is
+served from memory with the values written here overlaid, instead of being read
+back after every write.
+"""
+
+import atexit
+import copy
+import threading
+import time
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from config import (
+    REPOSITORY_SYNC_INTERVAL_SECONDS,
+    REPOSITORY_CHANGE_STREAMS,
+    HISTORY_WRITE_DELAY_SECONDS,
+    HISTORY_WRITE_TOLERANCE,
+)
+from storage import get_storage_backend
+from db_manager import (
+    get_collection_versions,
+    bump_collection_version,
+    invalidate_history_cache,
+    load_funds_from_db,
+    save_fund_to_db,
+    save_all_funds_to_db,
+    delete_fund_from_db,
+    save_daily_totals_to_db,
+    get_history_range,
+    save_price_snapshots_to_db,
+    save_transactions_to_db,
+    load_transactions_from_db,
+    save_portfolio_snapshot_to_db,
+    load_portfolio_snapshot_from_db
+)
+from metrics import inc
+from portfolio_table import PortfolioTable
+from quote_cache import current_price_date
+from write_behind import WriteBehind
+
+FUNDS = "funds"
+HISTORY = "portfolio_history"
+SNAPSHOT = "portfolio_snapshot"
+FUND_PRICES = "fund_prices"
+TRANSACTIONS = "transactions"
+VERSIONED_COLLECTIONS = (FUNDS, HISTORY, SNAPSHOT, FUND_PRICES, TRANSACTIONS)
+
+_MISSING = object()
+_NO_SNAPSHOT = object()  # Cached when nothing was published yet
+
+
+class PortfolioRepository:
+    """Process-wide, thread-safe; shared by every Streamlit session."""
+
+    def __init__(
+        self,
+        sync_interval: float = REPOSITORY_SYNC_INTERVAL_SECONDS,
+        use_change_streams: bool = REPOSITORY_CHANGE_STREAMS,
+    ):
+        self.sync_interval = sync_interval
+        self.use_change_streams = use_change_streams
+        self._lock = threading.Lock()
+        self._cache: Dict[str, object] = {}
+        self._generations: Dict[str, int] = {}  # Bumped on invalidation; guards in-progress loads
+        self._versions: Dict[str, int] = {}
+        self._last_sync = float("-inf")
+        self._watcher: Optional[threading.Thread] = None
+        self._watching = False
+        self._daily_totals = WriteBehind(
+            self._write_daily_totals,
+            HISTORY_WRITE_DELAY_SECONDS,
+            "history.write_behind",
+            is_same=lambda a, b: abs(a - b) < HISTORY_WRITE_TOLERANCE,
+        )
+
+    # --- invalidation ---
+
+    def _invalidate(self, name: str):
+        with self._lock:
+            self._cache.pop(name, None)
+            self._generations[name] = self._generations.get(name, 0) + 1
+        if name == HISTORY:
+            invalidate_history_cache()
+            # Re-read from storage from now on; only unwritten totals are still overlaid
+            self._daily_totals.forget_written()
+
+    def sync(self, force: bool = False):
+        """Drops cached collections whose change counter moved since they were read."""
+        if self.use_change_streams:
+            self._ensure_watcher()
+            if self._watching and not force:
+                return
+        now = time.monotonic()
+        if not force and now - self._last_sync < self.sync_interval:
+            return
+        try:
+            versions = get_collection_versions()
+        except Exception as e:
+            # Serve what we have; the next sync tries again
+            print(f"Error reading change counters: {e}")
+            return
+        self._last_sync = now
+        inc("repository.syncs")
+        for name in VERSIONED_COLLECTIONS:
+            version = versions.get(name, 0)
+            if self._versions.get(name) != version:
+                self._versions[name] = version
+                self._invalidate(name)
+
+    def _changed(self, name: str, invalidate: bool = True):
+        """
+        Called after a successful write through the repository. With invalidate=False the
+        cache is kept (the caller keeps it current); other processes still re-read.
+        """
+        if invalidate:
+            self._invalidate(name)
+        try:
+            version = bump_collection_version(name)
+        except Exception as e:
+            print(f"Error bumping change counter of {name}: {e}")
+            return
+        if self._versions.get(name) == version - 1:
+            # Only our own write since the last sync: nothing else to re-read
+            self._versions[name] = version
+        elif not invalidate:
+            # Another process wrote too: drop what was kept, sync() re-reads at the new version
+            self._invalidate(name)
+
+    def _cached(self, name: str, loader):
+        with self._lock:
+            value = self._cache.get(name, _MISSING)
+            generation = self._generations.get(name, 0)
+        if value is not _MISSING:
+            inc("repository.hits")
+            return value
+        inc("repository.misses")
+        value = loader()
+        # None means the read failed: not cached, the next call tries again
+        with self._lock:
+            if value is not None and self._generations.get(name, 0) == generation:
+                self._cache[name] = value
+        return value
+
+    def _prime(self, name: str, value):
+        """Caches what was just written, so this process does not read it back."""
+        with self._lock:
+            self._cache[name] = value
+
+    # --- change streams ---
+
+    def _ensure_watcher(self):
+        if self._watcher is None:
+            with self._lock:
+                if self._watcher is None:
+                    self._watcher = threading.Thread(target=self._watch, name="repository-watcher", daemon=True)
+                    self._watcher.start()
+
+    def _watch(self):
+        try:
+            with get_storage_backend().watch(VERSIONED_COLLECTIONS) as changes:
+                # Anything cached before the stream opened may have missed a change
+                for name in VERSIONED_COLLECTIONS:
+                    self._invalidate(name)
+                self._watching = True
+                for name in changes:
+                    inc("repository.change_events")
+                    self._invalidate(name)
+        except Exception as e:
+            # e.g. SQLite, or a standalone mongod: change streams need a replica set
+            print(f"⚠️  Change stream unavailable, polling change counters instead: {e}")
+        finally:
+            self._watching = False
+            self.use_change_streams = False
+
+    def version(self, name: str) -> int:
+        """
+        Local change generation of a collection: moves whenever it changed (here, in another
+        process or via the change stream). Lets callers cache data derived from it.
+        """
+        self.sync()
+        with self._lock:
+            return self._generations.get(name, 0)
+
+    # --- funds ---
+
+    def load_funds(self) -> List[Dict]:
+        self.sync()
+        return copy.deepcopy(self._cached(FUNDS, load_funds_from_db) or [])
+
+    def save_fund(self, code: str, quantity: float) -> bool:
+        saved = save_fund_to_db(code, quantity)
+        if saved:
+            self._changed(FUNDS)
+        return saved
+
+    def save_all_funds(self, funds_list: List[Dict]) -> bool:
+        saved = save_all_funds_to_db(funds_list)
+        if saved:
+            self._changed(FUNDS)
+        return saved
+
+    def delete_fund(self, code: str) -> bool:
+        deleted = delete_fund_from_db(code)
+        if deleted:
+            self._changed(FUNDS)
+        return deleted
+
+    # --- history ---
+
+    def get_history(self, start_date=None, end_date=None, max_points=None) -> pd.DataFrame:
+        # Ranges are memoised by db_manager; sync() clears them when the history changed
+        self.sync()
+        history = get_history_range(start_date, end_date, max_points)
+        totals = self._daily_totals.values()
+        return _with_totals(history, totals, start_date, end_date) if totals else history
+
+    def save_daily_total(self, total_value: float) -> bool:
+        """
+        Queues the total of the current price date (Istanbul time, see market_calendar); it is
+        written in the background, and only if it differs from the stored one. Returns whether
+        it changed.
+        """
+        today = current_price_date()
+        if self._daily_totals.known(today) is None:
+            self.sync()
+            stored = get_history_range(today, today)
+            if not stored.empty:
+                self._daily_totals.seed(today, float(stored["TotalValue"].iloc[-1]))
+        changed = self._daily_totals.put(today, float(total_value))
+        if changed:
+            # The served history changed (overlay); callers deriving data from it see a new version
+            with self._lock:
+                self._generations[HISTORY] = self._generations.get(HISTORY, 0) + 1
+        return changed
+
+    def _write_daily_totals(self, totals: Dict[str, float]) -> bool:
+        saved = save_daily_totals_to_db(totals)
+        if saved:
+            # Memoised ranges stay valid: get_history overlays what was written
+            self._changed(HISTORY, invalidate=False)
+        return saved
+
+    def flush_writes(self) -> bool:
+        """Writes queued daily totals now (e.g. before the process exits)."""
+        return self._daily_totals.flush()
+
+    # --- per-fund price snapshots ---
+
+    def save_price_snapshots(self, snapshots: List[Dict]) -> bool:
+        saved = save_price_snapshots_to_db(snapshots)
+        if saved and snapshots:
+            self._changed(FUND_PRICES)
+        return saved
+
+    # --- transactions (append-only; the ledger keeps them in memory) ---
+
+    def load_transactions(self, after_seq: int = 0) -> Optional[List[Dict]]:
+        return load_transactions_from_db(after_seq)
+
+    def save_transactions(self, transactions: List[Dict]) -> List[int]:
+        seqs = save_transactions_to_db(transactions)
+        if seqs:
+            self._changed(TRANSACTIONS)
+        return seqs
+
+    # --- latest valued portfolio ---
+
+    def load_portfolio_snapshot(self) -> Optional[PortfolioTable]:
+        """The latest valued portfolio, shared read-only by every caller (no per-call copy)."""
+        self.sync()
+        table = self._cached(SNAPSHOT, self._load_portfolio_table)
+        return None if table is _NO_SNAPSHOT else table
+
+    @staticmethod
+    def _load_portfolio_table():
+        snapshot = load_portfolio_snapshot_from_db()
+        if snapshot is None:
+            return None  # Read failed: retried on the next call
+        if not snapshot:
+            return _NO_SNAPSHOT
+        return PortfolioTable(snapshot["df"], snapshot["positions"], snapshot["updated_at"])
+
+    def save_portfolio_snapshot(self, table: PortfolioTable) -> bool:
+        saved = save_portfolio_snapshot_to_db(table.frame(), table.positions, table.updated_at)
+        if saved:
+            self._changed(SNAPSHOT)
+            self._prime(SNAPSHOT, table)
+        return saved
+
+
+def _with_totals(history: pd.DataFrame, totals: Dict[str, float], start_date=None, end_date=None) -> pd.DataFrame:
+    """history (Date, TotalValue) with the given {date: total} replacing or adding rows within the range."""
+    start = str(start_date) if start_date is not None else None
+    end = str(end_date) if end_date is not None else None
+    totals = {day: value for day, value in totals.items() if (start is None or day >= start) and (end is None or day <= end)}
+    if not totals:
+        return history
+    stored = history["Date"].isin(totals.keys())
+    if stored.any():
+        history.loc[stored, "TotalValue"] = history.loc[stored, "Date"].map(totals)
+    added = totals.keys() - set(history.loc[stored, "Date"])
+    if not added:
+        return history
+    rows = pd.DataFrame({"Date": sorted(added), "TotalValue": [totals[day] for day in sorted(added)]})
+    if history.empty:
+        return rows
+    return pd.concat([history, rows], ignore_index=True).sort_values("Date", ignore_index=True)
+
+
+# Global repository, shared by all Streamlit sessions in this process
+_repository = None
+_repository_lock = threading.Lock()
+
+def get_repository() -> PortfolioRepository:
+    """Get or create the process-wide repository."""
+    global _repository
+    if _repository is None:
+        with _repository_lock:
+            if _repository is None:
+                _repository = PortfolioRepository()
+                atexit.register(_repository.flush_writes)
+    return _repository
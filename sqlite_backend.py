@@ -0,0 +1,316 @@
+# sqlite_backend.py
+"""Embedded SQLite storage backend (single file, WAL mode) for single-node deployments."""
+
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from storage import StorageBackend
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS funds (
+    kod TEXT PRIMARY KEY,
+    adet REAL NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS portfolio_history (
+    date TEXT PRIMARY KEY,
+    total_value REAL NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fund_prices (
+    kod TEXT NOT NULL,
+    date TEXT NOT NULL,
+    price REAL NOT NULL,
+    daily_return REAL NOT NULL,
+    category TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (kod, date)
+);
+CREATE INDEX IF NOT EXISTS idx_fund_prices_date ON fund_prices (date);
+CREATE TABLE IF NOT EXISTS transactions (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    kod TEXT NOT NULL,
+    date TEXT NOT NULL,
+    side TEXT NOT NULL,
+    adet REAL NOT NULL,
+    fiyat REAL NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS portfolio_snapshot (
+    id TEXT PRIMARY KEY,
+    rows TEXT NOT NULL,
+    positions TEXT NOT NULL,
+    total_value REAL NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta_versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+"""
+
+
+def _json_default(value):
+    # numpy scalars in DataFrame.to_dict() rows
+    return value.item() if hasattr(value, "item") else str(value)
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    One connection shared by all threads behind a lock, like the quote cache.
+    WAL mode lets the worker process write while app processes keep reading.
+    Timestamps are stored as ISO-8601 strings.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def connect(self) -> sqlite3.Connection:
+        with self._lock:
+            if self._conn is None:
+                conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=10)
+                conn.row_factory = sqlite3.Row
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.executescript(SCHEMA)
+                conn.commit()
+                print(f"✅ SQLite storage opened: {self.db_path}")
+                self._conn = conn
+            return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def describe(self) -> str:
+        return f"SQLite ({self.db_path})"
+
+    def _query(self, sql: str, params=()) -> List[Dict]:
+        with self._lock:
+            return [dict(row) for row in self.connect().execute(sql, params)]
+
+    def _write(self, sql: str, rows):
+        """Runs one statement for every parameter tuple in a single transaction."""
+        with self._lock:
+            conn = self.connect()
+            with conn:
+                return conn.executemany(sql, rows)
+
+    # --- funds ---
+
+    def load_funds(self) -> List[Dict]:
+        return self._query("SELECT kod, adet FROM funds ORDER BY rowid")
+
+    def upsert_fund(self, code: str, quantity: float, now: datetime):
+        stamp = now.isoformat()
+        self._write(
+            """
+            INSERT INTO funds (kod, adet, created_at, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT (kod) DO UPDATE SET adet = excluded.adet, updated_at = excluded.updated_at
+            """,
+            [(code, quantity, stamp, stamp)],
+        )
+
+    def upsert_funds(self, funds: Dict[str, float], now: datetime):
+        stamp = now.isoformat()
+        self._write(
+            """
+            INSERT INTO funds (kod, adet, created_at, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT (kod) DO UPDATE SET adet = excluded.adet, updated_at = excluded.updated_at
+            """,
+            [(kod, adet, stamp, stamp) for kod, adet in funds.items()],
+        )
+
+    def sync_funds(self, desired: Dict[str, float], now: datetime, use_transaction: bool = False):
+        # Always one transaction here; use_transaction only matters for MongoDB
+        stamp = now.isoformat()
+        with self._lock:
+            conn = self.connect()
+            with conn:
+                existing = {row["kod"]: row["adet"] for row in conn.execute("SELECT kod, adet FROM funds")}
+                conn.executemany(
+                    """
+                    INSERT INTO funds (kod, adet, created_at, updated_at) VALUES (?, ?, ?, ?)
+                    ON CONFLICT (kod) DO UPDATE SET adet = excluded.adet, updated_at = excluded.updated_at
+                    """,
+                    [(kod, adet, stamp, stamp) for kod, adet in desired.items() if existing.get(kod) != adet],
+                )
+                conn.executemany(
+                    "DELETE FROM funds WHERE kod = ?",
+                    [(kod,) for kod in existing if kod not in desired],
+                )
+
+    def delete_fund(self, code: str) -> bool:
+        return self._write("DELETE FROM funds WHERE kod = ?", [(code,)]).rowcount > 0
+
+    # --- portfolio history ---
+
+    def upsert_daily_totals(self, records: List[Dict], now: datetime):
+        stamp = now.isoformat()
+        self._write(
+            """
+            INSERT INTO portfolio_history (date, total_value, created_at, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT (date) DO UPDATE SET total_value = excluded.total_value, updated_at = excluded.updated_at
+            """,
+            [(r["date"], r["total_value"], stamp, stamp) for r in records],
+        )
+
+    def query_history(self, start_date: Optional[str], end_date: Optional[str]) -> List[Dict]:
+        return self._query(
+            """
+            SELECT date, total_value FROM portfolio_history
+            WHERE (? IS NULL OR date >= ?) AND (? IS NULL OR date <= ?)
+            ORDER BY date
+            """,
+            (start_date, start_date, end_date, end_date),
+        )
+
+    def iter_history(self, start_date: Optional[str], end_date: Optional[str], batch_size: int):
+        # Keyset pages: the shared connection is only locked while one page is read
+        last = None
+        while True:
+            rows = self._query(
+                """
+                SELECT date, total_value FROM portfolio_history
+                WHERE (? IS NULL OR date > ?) AND (? IS NULL OR date >= ?) AND (? IS NULL OR date <= ?)
+                ORDER BY date LIMIT ?
+                """,
+                (last, last, start_date, start_date, end_date, end_date, batch_size),
+            )
+            if not rows:
+                return
+            yield rows
+            last = rows[-1]["date"]
+
+    # --- change counters ---
+
+    def get_versions(self) -> Dict[str, int]:
+        return {row["name"]: row["version"] for row in self._query("SELECT name, version FROM meta_versions")}
+
+    def bump_version(self, name: str) -> int:
+        with self._lock:
+            conn = self.connect()
+            with conn:
+                conn.execute(
+                    """
+                    INSERT INTO meta_versions (name, version) VALUES (?, 1)
+                    ON CONFLICT (name) DO UPDATE SET version = version + 1
+                    """,
+                    (name,),
+                )
+                return conn.execute("SELECT version FROM meta_versions WHERE name = ?", (name,)).fetchone()[0]
+
+    # --- per-fund price snapshots ---
+
+    def upsert_price_snapshots(self, snapshots: List[Dict], now: datetime):
+        stamp = now.isoformat()
+        self._write(
+            """
+            INSERT INTO fund_prices (kod, date, price, daily_return, category, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (kod, date) DO UPDATE SET
+                price = excluded.price, daily_return = excluded.daily_return,
+                category = excluded.category, updated_at = excluded.updated_at
+            """,
+            [(s["kod"], s["date"], s["price"], s["daily_return"], s["category"], stamp) for s in snapshots],
+        )
+
+    def query_price_snapshots(
+        self, codes: Optional[List[str]], start_date: Optional[str], end_date: Optional[str]
+    ) -> List[Dict]:
+        sql = "SELECT kod, date, price, daily_return, category FROM fund_prices WHERE 1 = 1"
+        params: list = []
+        if codes:
+            sql += f" AND kod IN ({', '.join('?' * len(codes))})"
+            params += codes
+        if start_date:
+            sql += " AND date >= ?"
+            params.append(start_date)
+        if end_date:
+            sql += " AND date <= ?"
+            params.append(end_date)
+        return self._query(sql + " ORDER BY date", params)
+
+    def iter_price_snapshots(
+        self, codes: Optional[List[str]], start_date: Optional[str], end_date: Optional[str], batch_size: int
+    ):
+        sql = "SELECT kod, date, price, daily_return, category FROM fund_prices WHERE (kod, date) > (?, ?)"
+        params: list = []
+        if codes:
+            sql += f" AND kod IN ({', '.join('?' * len(codes))})"
+            params += codes
+        if start_date:
+            sql += " AND date >= ?"
+            params.append(start_date)
+        if end_date:
+            sql += " AND date <= ?"
+            params.append(end_date)
+        sql += " ORDER BY kod, date LIMIT ?"
+        # Keyset pages over the (kod, date) primary key
+        last = ("", "")
+        while True:
+            rows = self._query(sql, [*last, *params, batch_size])
+            if not rows:
+                return
+            yield rows
+            last = (rows[-1]["kod"], rows[-1]["date"])
+
+    # --- transactions ---
+
+    def insert_transactions(self, records: List[Dict], now: datetime) -> List[int]:
+        stamp = now.isoformat()
+        with self._lock:
+            conn = self.connect()
+            with conn:
+                return [
+                    conn.execute(
+                        "INSERT INTO transactions (kod, date, side, adet, fiyat, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                        (r["kod"], r["date"], r["side"], r["adet"], r["fiyat"], stamp),
+                    ).lastrowid
+                    for r in records
+                ]
+
+    def query_transactions(self, after_seq: int) -> List[Dict]:
+        return self._query(
+            "SELECT seq, kod, date, side, adet, fiyat FROM transactions WHERE seq > ? ORDER BY seq",
+            (after_seq,),
+        )
+
+    # --- latest valued portfolio ---
+
+    def save_portfolio_snapshot(self, snapshot: Dict):
+        self._write(
+            """
+            INSERT OR REPLACE INTO portfolio_snapshot (id, rows, positions, total_value, updated_at)
+            VALUES ('latest', ?, ?, ?, ?)
+            """,
+            [(
+                json.dumps(snapshot["rows"], ensure_ascii=False, default=_json_default),
+                json.dumps(snapshot["positions"]),
+                snapshot["total_value"],
+                snapshot["updated_at"].isoformat(),
+            )],
+        )
+
+    def load_portfolio_snapshot(self) -> Optional[Dict]:
+        rows = self._query("SELECT rows, positions, total_value, updated_at FROM portfolio_snapshot WHERE id = 'latest'")
+        if not rows:
+            return None
+        row = rows[0]
+        return {
+            "rows": json.loads(row["rows"]),
+            "positions": json.loads(row["positions"]),
+            "total_value": row["total_value"],
+            "updated_at": datetime.fromisoformat(row["updated_at"]),
+        }
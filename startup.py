@@ -0,0 +1,113 @@
+# startup.py
+"""
+Lazy startup: warms the heavy parts of the app in the background so the first
+paint and the password prompt do not wait for them.
+
+On the first script run of a process, warm_up() starts a daemon thread that
+imports the heavy modules (pandas, plotly, lxml, pymongo, aiohttp, ...) and then
+opens the storage backend (for MongoDB: the connection and its ping). The app only imports those
+modules once the user is past the password prompt; by then they are usually
+already loaded. Import times and cold-start milestones are kept for report().
+
+Usage (import-time breakdown of a cold interpreter):
+    python startup.py
+"""
+
+import importlib
+import sys
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+from config import HEAVY_MODULES, STORAGE_WARMUP_ON_START
+
+# Reference point for the cold-start milestones: the first script run in this process
+STARTED_AT = time.perf_counter()
+
+_lock = threading.Lock()
+_import_seconds: Dict[str, float] = {}
+_milestones: Dict[str, float] = {}
+_warmup_thread: Optional[threading.Thread] = None
+_storage = {"state": "idle", "seconds": None, "error": None}
+
+
+def preload(modules: Iterable[str] = HEAVY_MODULES) -> Dict[str, float]:
+    """Imports the given modules, timing each one that was not loaded yet."""
+    for name in modules:
+        if name in sys.modules:
+            continue
+        started = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            print(f"⚠️  Could not preload {name}: {e}")
+            continue
+        with _lock:
+            _import_seconds[name] = time.perf_counter() - started
+    return dict(_import_seconds)
+
+
+def _connect_storage():
+    _storage["state"] = "connecting"
+    started = time.perf_counter()
+    try:
+        from storage import get_storage_backend
+        get_storage_backend().connect()
+    except Exception as e:
+        # Not fatal here: the first real query retries and surfaces the error
+        _storage.update(state="failed", error=str(e))
+    else:
+        _storage["state"] = "ready"
+    finally:
+        _storage["seconds"] = time.perf_counter() - started
+
+
+def _warm_up():
+    preload()
+    mark("modules_loaded")
+    if STORAGE_WARMUP_ON_START:
+        _connect_storage()
+        mark(f"storage_{_storage['state']}")
+
+
+def warm_up() -> threading.Thread:
+    """Starts the background warmup once per process; later calls are no-ops."""
+    global _warmup_thread
+    with _lock:
+        if _warmup_thread is None:
+            _warmup_thread = threading.Thread(target=_warm_up, name="startup-warmup", daemon=True)
+            _warmup_thread.start()
+    return _warmup_thread
+
+
+def mark(milestone: str):
+    """Records the first time a cold-start milestone is reached in this process."""
+    with _lock:
+        _milestones.setdefault(milestone, time.perf_counter() - STARTED_AT)
+
+
+def report() -> Dict:
+    """Import-time and cold-start breakdown, in seconds."""
+    with _lock:
+        imports = dict(sorted(_import_seconds.items(), key=lambda item: -item[1]))
+        milestones = dict(sorted(_milestones.items(), key=lambda item: item[1]))
+    return {
+        "imports_s": imports,
+        "imports_total_s": sum(imports.values()),
+        "milestones_s": milestones,
+        "storage": dict(_storage),
+    }
+
+
+def main():
+    preload(["streamlit"])
+    preload()
+    result = report()
+    width = max(map(len, result["imports_s"]), default=10)
+    for name, seconds in result["imports_s"].items():
+        print(f"{name:<{width}}  {seconds * 1000:>9.1f} ms")
+    print(f"{'total':<{width}}  {result['imports_total_s'] * 1000:>9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+# storage.py
+"""
+Storage backend interface.
+
+db_manager's public functions (funds CRUD, daily totals, history queries, price and
+portfolio snapshots, transactions, change counters) delegate to the backend selected by
+config.STORAGE_BACKEND:
+
+    "mongo"   MongoDB / Atlas (db_manager.MongoBackend), the default
+    "sqlite"  embedded SQLite file in WAL mode (sqlite_backend.SQLiteBackend)
+
+Backends only move plain dicts and raise on failure; normalisation, memoisation,
+metrics, error handling and DataFrame shaping stay in db_manager, so the rest of
+the app behaves the same on either backend.
+"""
+
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import ContextManager, Dict, Iterable, Iterator, List, Optional
+
+from config import STORAGE_BACKEND, STORAGE_SQLITE_FILE
+
+
+class StorageBackend(ABC):
+    """
+    Dates are YYYY-MM-DD strings, timestamps naive UTC datetimes.
+    Funds are {kod, adet}; history rows {date, total_value}; price snapshots
+    {kod, date, price, daily_return, category}; transactions {seq, kod, date,
+    side, adet, fiyat}; the portfolio snapshot is {rows, positions, total_value,
+    updated_at}.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def connect(self):
+        """Opens the connection (or file) and bootstraps the schema. Idempotent."""
+
+    @abstractmethod
+    def close(self):
+        """Releases the connection; the next call reconnects."""
+
+    @abstractmethod
+    def describe(self) -> str:
+        """Human readable location, for logs."""
+
+    # --- funds ---
+
+    @abstractmethod
+    def load_funds(self) -> List[Dict]:
+        """All funds as {kod, adet}."""
+
+    @abstractmethod
+    def upsert_fund(self, code: str, quantity: float, now: datetime):
+        """Inserts or updates one fund."""
+
+    @abstractmethod
+    def upsert_funds(self, funds: Dict[str, float], now: datetime):
+        """Inserts or updates {kod: adet} in one batch; other funds are left alone."""
+
+    @abstractmethod
+    def sync_funds(self, desired: Dict[str, float], now: datetime, use_transaction: bool = False):
+        """Makes the funds equal to {kod: adet}, writing only what changed."""
+
+    @abstractmethod
+    def delete_fund(self, code: str) -> bool:
+        """Deletes one fund; returns whether it existed."""
+
+    # --- portfolio history ---
+
+    @abstractmethod
+    def upsert_daily_totals(self, records: List[Dict], now: datetime):
+        """Inserts or replaces history rows, keyed on date."""
+
+    @abstractmethod
+    def query_history(self, start_date: Optional[str], end_date: Optional[str]) -> List[Dict]:
+        """History rows between two dates (inclusive, None = open), sorted by date."""
+
+    def iter_history(
+        self, start_date: Optional[str], end_date: Optional[str], batch_size: int
+    ) -> Iterator[List[Dict]]:
+        """Like query_history, in batches of at most batch_size rows (for exports)."""
+        rows = self.query_history(start_date, end_date)
+        for start in range(0, len(rows), batch_size):
+            yield rows[start:start + batch_size]
+
+    # --- change counters ---
+
+    @abstractmethod
+    def get_versions(self) -> Dict[str, int]:
+        """Change counter per collection name (missing ones may be omitted)."""
+
+    @abstractmethod
+    def bump_version(self, name: str) -> int:
+        """Atomically increments and returns one change counter."""
+
+    def watch(self, collections: Iterable[str]) -> ContextManager[Iterator[str]]:
+        """Context manager yielding an iterator of changed collection names, if supported."""
+        raise NotImplementedError(f"{self.name} backend has no change streams")
+
+    # --- per-fund price snapshots ---
+
+    @abstractmethod
+    def upsert_price_snapshots(self, snapshots: List[Dict], now: datetime):
+        """Inserts or replaces price snapshots, keyed on (kod, date)."""
+
+    @abstractmethod
+    def query_price_snapshots(
+        self, codes: Optional[List[str]], start_date: Optional[str], end_date: Optional[str]
+    ) -> List[Dict]:
+        """Price snapshots matching the filters, sorted by date."""
+
+    def iter_price_snapshots(
+        self, codes: Optional[List[str]], start_date: Optional[str], end_date: Optional[str], batch_size: int
+    ) -> Iterator[List[Dict]]:
+        """Price snapshots matching the filters sorted by (kod, date), in batches (for exports)."""
+        rows = sorted(self.query_price_snapshots(codes, start_date, end_date), key=lambda r: (r["kod"], r["date"]))
+        for start in range(0, len(rows), batch_size):
+            yield rows[start:start + batch_size]
+
+    # --- transactions ---
+
+    @abstractmethod
+    def insert_transactions(self, records: List[Dict], now: datetime) -> List[int]:
+        """Appends transactions, assigning increasing sequence numbers; returns them in order."""
+
+    @abstractmethod
+    def query_transactions(self, after_seq: int) -> List[Dict]:
+        """Transactions with seq > after_seq, sorted by seq."""
+
+    # --- latest valued portfolio ---
+
+    @abstractmethod
+    def save_portfolio_snapshot(self, snapshot: Dict):
+        """Replaces the latest portfolio snapshot."""
+
+    @abstractmethod
+    def load_portfolio_snapshot(self) -> Optional[Dict]:
+        """The latest portfolio snapshot, or None."""
+
+
+def create_storage_backend(kind: str = STORAGE_BACKEND) -> StorageBackend:
+    """Builds a backend by name ("mongo" or "sqlite")."""
+    if kind == "mongo":
+        from db_manager import MongoBackend
+        return MongoBackend()
+    if kind == "sqlite":
+        from sqlite_backend import SQLiteBackend
+        return SQLiteBackend(STORAGE_SQLITE_FILE)
+    raise ValueError(f"Unknown storage backend: {kind!r} (expected 'mongo' or 'sqlite')")
+
+
+# Global backend instance, shared by all Streamlit sessions in this process
+_storage_backend = None
+_storage_backend_lock = threading.Lock()
+
+def get_storage_backend() -> StorageBackend:
+    """Get or create the process-wide storage backend selected in config."""
+    global _storage_backend
+    if _storage_backend is None:
+        with _storage_backend_lock:
+            if _storage_backend is None:
+                _storage_backend = create_storage_backend()
+    return _storage_backend
+
+def set_storage_backend(backend: Optional[StorageBackend]):
+    """Replaces the process-wide backend (None: rebuild from config on next use)."""
+    global _storage_backend
+    with _storage_backend_lock:
+        _storage_backend = backend
@@ -0,0 +1,184 @@
+# tefas_parser.py
+"""Fast extraction of price, daily return and category from FonAnaliz pages."""
+
+import hashlib
+import re
+import threading
+from typing import Dict, Optional, Tuple
+
+from lxml import etree
+
+from config import XPATH_PRICE, XPATH_DAILY_RETURN, XPATH_CATEGORY
+from metrics import timed, timer, inc
+
+PANEL_ID = "MainContent_PanelInfo"
+_PANEL_PREFIX = f'//*[@id="{PANEL_ID}"]/'
+_PANEL_MARKER = f'id="{PANEL_ID}"'.encode()
+_OPEN_TAG = re.compile(rb"<([A-Za-z][A-Za-z0-9]*)")
+
+DEFAULT_CATEGORY = "Diğer"
+
+
+def _relative_to_panel(xpath: str) -> str:
+    """Turns one of the absolute XPaths from config.py into a path relative to the info panel."""
+    if not xpath.startswith(_PANEL_PREFIX):
+        raise ValueError(f"XPath is not scoped to {PANEL_ID}: {xpath}")
+    return xpath[len(_PANEL_PREFIX):]
+
+
+# Compiled once at import. string() makes lxml return the text directly instead of
+# building element proxies we would only call text_content() on.
+_PANEL = etree.XPath(f'//*[@id="{PANEL_ID}"]')
+_PRICE = etree.XPath(f"string({_relative_to_panel(XPATH_PRICE)})")
+_DAILY_RETURN = etree.XPath(f"string({_relative_to_panel(XPATH_DAILY_RETURN)})")
+_CATEGORY = etree.XPath(f"string({_relative_to_panel(XPATH_CATEGORY)})")
+
+# lxml parsers must not be shared between threads
+_local = threading.local()
+
+def _parser() -> etree.HTMLParser:
+    parser = getattr(_local, "parser", None)
+    if parser is None:
+        parser = etree.HTMLParser(encoding="utf-8", remove_comments=True, no_network=True)
+        _local.parser = parser
+    return parser
+
+
+def parse_tr_number(text: str) -> float:
+    """
+    Parses a number written in Turkish locale, with an optional percent sign.
+
+    >>> parse_tr_number("1.234,56")
+    1234.56
+    >>> parse_tr_number(" 2,345678 ")
+    2.345678
+    >>> parse_tr_number("%0,3999")
+    0.3999
+    >>> parse_tr_number("%-1,23")
+    -1.23
+    >>> parse_tr_number("1.234.567")
+    1234567.0
+    >>> parse_tr_number("12")
+    12.0
+    >>> parse_tr_number("")
+    Traceback (most recent call last):
+    ...
+    ValueError: could not convert string to float: ''
+    """
+    clean = text.strip().replace("%", "").replace("\xa0", "").replace(" ", "")
+    return float(clean.replace(".", "").replace(",", "."))
+
+
+def extract_panel(content: bytes) -> Optional[bytes]:
+    """
+    Returns the raw bytes of the info panel element, or None if it is not on the page.
+
+    Only the panel is handed to libxml2, so the rest of the page (view state, chart
+    scripts, allocation tables) is never turned into a tree.
+    """
+    marker = content.find(_PANEL_MARKER)
+    if marker < 0:
+        return None
+    start = content.rfind(b"<", 0, marker)
+    if start < 0:
+        return None
+    match = _OPEN_TAG.match(content, start)
+    if match is None:
+        return None
+
+    # Walk opening/closing tags of the same name until the panel is balanced
+    tag = match.group(1)
+    tags = re.compile(rb"<(/?)" + re.escape(tag) + rb"\b", re.IGNORECASE)
+    depth = 0
+    for m in tags.finditer(content, start):
+        depth += -1 if m.group(1) else 1
+        if depth == 0:
+            end = content.find(b">", m.end())
+            return content[start:end + 1] if end >= 0 else content[start:]
+    # Unbalanced markup: let the HTML parser recover from the truncated panel
+    return content[start:]
+
+
+ParsedPage = Tuple[Optional[float], Optional[float], Optional[str]]
+
+
+@timed("parse")
+def parse_fund_page(content: bytes) -> ParsedPage:
+    """
+    Extracts (price, daily return, category) from a FonAnaliz page given as bytes.
+    Returns (None, None, None) when the page has no price.
+    """
+    region = extract_panel(content)
+    return _parse_region(region if region is not None else content)
+
+
+def _parse_region(region: bytes) -> ParsedPage:
+    tree = etree.fromstring(region, _parser())
+    if tree is None:
+        return None, None, None
+
+    panels = _PANEL(tree)
+    if not panels:
+        return None, None, None
+    panel = panels[0]
+
+    price_text = _PRICE(panel).strip()
+    if not price_text:
+        return None, None, None
+    price_val = parse_tr_number(price_text)
+
+    return_text = _DAILY_RETURN(panel).strip()
+    return_val = parse_tr_number(return_text) if return_text else 0.0
+
+    category_val = _CATEGORY(panel).strip() or DEFAULT_CATEGORY
+
+    return price_val, return_val, category_val
+
+
+class PageMemo:
+    """
+    The last parse of each fund's page, keyed by a hash of its info panel. The rest of
+    the page (view state, scripts) changes on every request, so only the panel is hashed.
+    A page whose panel did not change since the previous fetch is not parsed again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[bytes, ParsedPage]] = {}
+
+    def parse(self, code: str, content: bytes) -> Tuple[ParsedPage, bool]:
+        """(price, daily return, category) of the page, and whether the previous parse was reused."""
+        region = extract_panel(content)
+        if region is None:
+            region = content
+        digest = hashlib.blake2b(region, digest_size=16).digest()
+        with self._lock:
+            entry = self._entries.get(code)
+        if entry is not None and entry[0] == digest:
+            inc("parse.unchanged")
+            return entry[1], True
+        with timer("parse"):
+            parsed = _parse_region(region)
+        with self._lock:
+            self._entries[code] = (digest, parsed)
+        return parsed, False
+
+    def last(self, code: str) -> Optional[ParsedPage]:
+        """The previous parse of code's page, e.g. for an HTTP 304."""
+        with self._lock:
+            entry = self._entries.get(code)
+        return entry[1] if entry is not None else None
+
+
+# Global memo, shared by every fetch in this process
+_page_memo = None
+_page_memo_lock = threading.Lock()
+
+def get_page_memo() -> PageMemo:
+    """Get or create the process-wide page memo."""
+    global _page_memo
+    if _page_memo is None:
+        with _page_memo_lock:
+            if _page_memo is None:
+                _page_memo = PageMemo()
+    return _page_memo
@@ -0,0 +1,67 @@
+# tests/test_db_indexes.py
+"""Schema bootstrap (db_manager.ensure_indexes) on mongomock."""
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+from pymongo.errors import DuplicateKeyError
+
+import db_manager
+from db_manager import REQUIRED_INDEXES, ensure_indexes, verify_indexes
+from metrics import registry
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient()["portfolio_test"]
+
+
+def _created():
+    return registry.snapshot()["counters"].get("db.indexes_created", 0)
+
+
+def test_creates_missing_indexes(db):
+    before = _created()
+    assert ensure_indexes(db) == []
+    assert verify_indexes(db) == []
+    for collection_name, indexes in REQUIRED_INDEXES.items():
+        names = db[collection_name].index_information()
+        assert {options["name"] for _, options in indexes} <= names.keys()
+    assert _created() - before == sum(len(indexes) for indexes in REQUIRED_INDEXES.values())
+
+
+def test_second_run_creates_nothing(db):
+    ensure_indexes(db)
+    before = _created()
+    assert ensure_indexes(db) == []
+    assert _created() == before
+
+
+def test_creation_is_printed_once_per_process(db, capsys, monkeypatch):
+    monkeypatch.setattr(db_manager, "_indexes_reported", False)
+    ensure_indexes(db)
+    ensure_indexes(mongomock.MongoClient()["portfolio_test_2"])
+    assert capsys.readouterr().out.count("Created indexes") == 1
+
+
+def test_duplicate_date_is_rejected(db):
+    ensure_indexes(db)
+    db.portfolio_history.insert_one({"date": "2026-01-02", "total_value": 1.0})
+    with pytest.raises(DuplicateKeyError):
+        db.portfolio_history.insert_one({"date": "2026-01-02", "total_value": 2.0})
+
+
+def test_mismatching_index_is_reported_not_dropped(db):
+    db.portfolio_history.create_index([("date", 1)], name="date_1")  # Not unique
+    problems = ensure_indexes(db)
+    assert len(problems) == 1
+    assert "portfolio_history" in problems[0] and "unique=False" in problems[0]
+    assert "date_1" in db.portfolio_history.index_information()
+
+
+def test_existing_duplicates_are_reported(db):
+    db.funds.insert_many([{"kod": "TTE", "adet": 1.0}, {"kod": "TTE", "adet": 2.0}])
+    problems = ensure_indexes(db)
+    assert problems == ["funds: missing index kod_unique on [('kod', 1)]"]
+    # The other collections are still bootstrapped
+    assert "date_unique" in db.portfolio_history.index_information()
@@ -0,0 +1,129 @@
+# tests/test_market_calendar.py
+"""RefreshPlanner decisions against a frozen clock (Istanbul times unless noted)."""
+
+from datetime import date, datetime, timezone
+
+import pytest
+
+from market_calendar import TEFAS_TZ, MarketCalendar, RefreshPlanner
+
+RETRY_SECONDS = 300
+
+
+def ist(*args) -> datetime:
+    return datetime(*args, tzinfo=TEFAS_TZ)
+
+
+def epoch(when: datetime) -> float:
+    return when.timestamp()
+
+
+@pytest.fixture
+def planner():
+    frozen = ist(2026, 10, 13, 10, 30)  # Tuesday, inside the publication window
+    return RefreshPlanner(
+        MarketCalendar(extra_holidays=()),
+        publication_start="09:00",
+        publication_end="12:00",
+        retry_seconds=RETRY_SECONDS,
+        clock=lambda: frozen,
+    )
+
+
+def test_clock_is_used_without_now(planner):
+    assert planner.price_date() == "2026-10-13"
+    assert planner.decide(epoch(ist(2026, 10, 13, 10, 29))).fetch is False
+
+
+def test_not_cached(planner):
+    assert planner.decide(None).fetch is True
+
+
+# --- business days ---
+
+def test_weekend(planner):
+    saturday = ist(2026, 10, 17, 14, 0)
+    assert planner.price_day(saturday) == date(2026, 10, 16)
+    decision = planner.decide(epoch(ist(2026, 10, 16, 13, 0)), saturday)
+    assert decision.fetch is False
+    assert decision.recheck_at == ist(2026, 10, 19, 9, 0)
+
+
+def test_fixed_holiday(planner):
+    republic_day = ist(2026, 10, 29, 10, 0)  # Thursday
+    assert not planner.calendar.is_business_day(republic_day.date())
+    assert planner.price_day(republic_day) == date(2026, 10, 28)
+    decision = planner.decide(epoch(ist(2026, 10, 28, 13, 0)), republic_day)
+    assert decision.fetch is False
+    assert decision.recheck_at == ist(2026, 10, 30, 9, 0)
+
+
+def test_religious_holiday(planner):
+    kurban_bayrami = ist(2026, 5, 27, 10, 0)  # Wednesday; the eve (26th) is priced
+    assert planner.price_day(kurban_bayrami) == date(2026, 5, 26)
+    # 28-29 are holidays too, then the weekend
+    assert planner.next_publication(kurban_bayrami) == ist(2026, 6, 1, 9, 0)
+    assert planner.decide(epoch(ist(2026, 5, 26, 12, 30)), kurban_bayrami).fetch is False
+
+
+def test_missing_year_is_reported():
+    calendar = MarketCalendar(extra_holidays=())
+    assert calendar.covers(2026)
+    assert not calendar.covers(2099)
+    # Unknown years only lose their religious holidays: weekends and fixed dates still count
+    assert calendar.is_business_day(date(2099, 1, 2))
+    assert not calendar.is_business_day(date(2099, 1, 1))
+
+
+# --- publication window ---
+
+def test_before_window(planner):
+    before = ist(2026, 10, 13, 8, 30)
+    assert planner.price_day(before) == date(2026, 10, 12)
+    assert planner.next_publication(before) == ist(2026, 10, 13, 9, 0)
+    decision = planner.decide(epoch(ist(2026, 10, 12, 12, 30)), before)
+    assert decision.fetch is False
+    assert decision.recheck_at == ist(2026, 10, 13, 9, 0)
+
+
+def test_inside_window_fetched_recently(planner):
+    now = ist(2026, 10, 13, 10, 30)
+    fetched = ist(2026, 10, 13, 10, 28)
+    decision = planner.decide(epoch(fetched), now)
+    assert decision.fetch is False
+    assert decision.recheck_at == ist(2026, 10, 13, 10, 33)
+
+
+def test_inside_window_retry_elapsed(planner):
+    now = ist(2026, 10, 13, 10, 30)
+    assert planner.decide(epoch(ist(2026, 10, 13, 10, 20)), now).fetch is True
+
+
+def test_inside_window_fetched_the_day_before(planner):
+    now = ist(2026, 10, 13, 10, 30)
+    assert planner.decide(epoch(ist(2026, 10, 12, 12, 30)), now).fetch is True
+
+
+def test_after_window(planner):
+    now = ist(2026, 10, 13, 13, 0)
+    decision = planner.decide(epoch(ist(2026, 10, 13, 12, 5)), now)
+    assert decision.fetch is False
+    assert decision.recheck_at == ist(2026, 10, 14, 9, 0)
+
+
+def test_fetched_before_publication_window_now_closed(planner):
+    now = ist(2026, 10, 13, 13, 0)
+    decision = planner.decide(epoch(ist(2026, 10, 13, 11, 0)), now)
+    assert decision.fetch is True
+    assert decision.reason == "fetched before publication"
+
+
+# --- time zones ---
+
+def test_price_date_around_istanbul_midnight_on_utc_host(planner):
+    # 21:30 UTC Tuesday is 00:30 Wednesday in Istanbul: Wednesday has not been published yet
+    assert planner.price_date(datetime(2026, 10, 13, 21, 30, tzinfo=timezone.utc)) == "2026-10-13"
+    # 06:30 UTC Wednesday is 09:30 in Istanbul: the window is open
+    assert planner.price_date(datetime(2026, 10, 14, 6, 30, tzinfo=timezone.utc)) == "2026-10-14"
+    # 05:30 UTC is 08:30 in Istanbul, same calendar day in both zones, still Tuesday's prices
+    assert planner.price_date(datetime(2026, 10, 14, 5, 30, tzinfo=timezone.utc)) == "2026-10-13"
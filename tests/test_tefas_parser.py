@@ -0,0 +1,59 @@
+# tests/test_tefas_parser.py
+"""Turkish number parsing and FonAnaliz page parsing (on the recorded benchmark fixtures)."""
+
+import doctest
+import os
+
+import pytest
+
+import fund_universe
+import tefas_parser
+from tefas_parser import parse_fund_page, parse_tr_number
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "fixtures")
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("12", 12.0),
+    ("2,345678", 2.345678),          # Decimal comma
+    ("1.234,56", 1234.56),           # Thousands dot
+    ("1.234.567", 1234567.0),
+    ("1.234.567,891", 1234567.891),
+    (" 2,5 ", 2.5),
+    ("1\xa0234,5", 1234.5),          # Non-breaking space as thousands separator
+    ("-1,23", -1.23),
+    ("%0,3999", 0.3999),             # Percent sign before or after
+    ("0,3999%", 0.3999),
+    ("%-1,23", -1.23),
+    ("-%1,23", -1.23),
+])
+def test_parse_tr_number(text, expected):
+    assert parse_tr_number(text) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("text", ["", "   ", "%", "-", "abc", "1,2,3", "N/A"])
+def test_parse_tr_number_rejects_garbage(text):
+    with pytest.raises(ValueError):
+        parse_tr_number(text)
+
+
+@pytest.mark.parametrize("code, expected", [
+    ("AFT", (184.123456, -1.2345, "Hisse Senedi Şemsiye Fonu")),
+    ("TP2", (1.987654, 0.1342, "Para Piyasası Şemsiye Fonu")),
+    ("TTE", (2.345678, 0.3999, "Hisse Senedi Şemsiye Fonu")),
+])
+def test_parse_fund_page(code, expected):
+    with open(os.path.join(FIXTURES_DIR, f"{code}.html"), "rb") as f:
+        price, daily_return, category = parse_fund_page(f.read())
+    assert (price, daily_return, category) == (pytest.approx(expected[0]), pytest.approx(expected[1]), expected[2])
+
+
+@pytest.mark.parametrize("content", [b"", b"<html><body>Fon bulunamad\xc4\xb1</body></html>"])
+def test_parse_fund_page_without_price(content):
+    assert parse_fund_page(content) == (None, None, None)
+
+
+@pytest.mark.parametrize("module", [tefas_parser, fund_universe])
+def test_doctests(module):
+    results = doctest.testmod(module)
+    assert results.attempted and not results.failed
@@ -0,0 +1,122 @@
+# valuation.py
+"""Columnar portfolio valuation: positions and quotes joined in one vectorized pass."""
+
+from typing import Dict, Iterable, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+# Output columns, in the order get_portfolio_data has always returned them
+PORTFOLIO_COLUMNS = [
+    "Fon Kodu",
+    "Adet",
+    "Birim Fiyat",
+    "Toplam Değer",
+    "Günlük Getiri (%)",
+    "Günlük Kazanç (TL)",
+    "Kategori",
+]
+
+QUOTE_COLUMNS = ["price", "daily_return", "category"]
+
+
+def _first_if_list(values: pd.Series, empty) -> pd.Series:
+    """data_editor sometimes returns single-element lists; unwrap them column-wise."""
+    if values.dtype != object:
+        return values
+    is_list = values.map(type).eq(list)
+    if not is_list.any():
+        return values
+    values = values.copy()
+    values[is_list] = values[is_list].map(lambda v: v[0] if v else empty)
+    return values
+
+
+def positions_frame(funds_config: Union[Iterable[Dict], pd.DataFrame]) -> pd.DataFrame:
+    """
+    Normalises raw fund rows ({"kod", "adet"}) into a positions frame.
+    Codes are stripped/upper-cased, rows without a code are dropped and
+    duplicate codes (e.g. several sub-accounts) are aggregated in first-seen order.
+    """
+    if isinstance(funds_config, pd.DataFrame):
+        raw = funds_config.reindex(columns=["kod", "adet"])
+    else:
+        raw = pd.DataFrame.from_records(list(funds_config), columns=["kod", "adet"])
+
+    kod = _first_if_list(raw["kod"], None)
+    adet = _first_if_list(raw["adet"], 0)
+
+    has_code = kod.notna() & kod.astype(bool)
+    positions = pd.DataFrame({
+        "kod": kod[has_code].astype(str).str.strip().str.upper(),
+        "adet": pd.to_numeric(adet[has_code], errors="coerce").fillna(0),
+    })
+    positions = positions[positions["kod"] != ""]
+    if positions["kod"].duplicated().any():
+        positions = positions.groupby("kod", sort=False, as_index=False)["adet"].sum()
+    return positions.reset_index(drop=True)
+
+
+def quotes_frame(quotes: Dict[str, Tuple[float, float, str]]) -> pd.DataFrame:
+    """Turns {code: (price, daily_return_percent, category)} into a frame indexed by code."""
+    if not quotes:
+        return pd.DataFrame(columns=QUOTE_COLUMNS, index=pd.Index([], name="kod"))
+    frame = pd.DataFrame.from_dict(quotes, orient="index", columns=QUOTE_COLUMNS)
+    frame.index.name = "kod"
+    return frame
+
+
+def value_portfolio(positions: pd.DataFrame, quotes: Union[pd.DataFrame, Dict]) -> pd.DataFrame:
+    """
+    Joins positions with quotes and computes value and daily gain per fund.
+    Positions without a quote are left out, as get_portfolio_data always did.
+    """
+    if isinstance(quotes, dict):
+        quotes = quotes_frame(quotes)
+
+    joined = positions.join(quotes, on="kod", how="inner")
+    if joined.empty:
+        return pd.DataFrame(columns=PORTFOLIO_COLUMNS)
+
+    price = joined["price"].to_numpy(dtype=float)
+    rate = joined["daily_return"].to_numpy(dtype=float)
+    adet = joined["adet"].to_numpy()
+
+    yesterday_price = price / (1 + rate / 100)
+
+    return pd.DataFrame({
+        "Fon Kodu": joined["kod"].to_numpy(),
+        "Adet": adet,
+        "Birim Fiyat": price,
+        "Toplam Değer": price * adet,
+        "Günlük Getiri (%)": rate,
+        "Günlük Kazanç (TL)": (price - yesterday_price) * adet,
+        "Kategori": joined["category"].to_numpy(),
+    })
+
+
+def with_cost_basis(portfolio_df: pd.DataFrame, cost_basis: pd.DataFrame) -> pd.DataFrame:
+    """
+    Adds cost and P&L columns from the ledger's per-fund aggregates (ledger.FifoLedger.cost_basis).
+    Funds without trades get NaN: their manually entered quantity has no cost.
+    """
+    df = portfolio_df.copy()
+    joined = cost_basis.reindex(df["Fon Kodu"])
+    cost = joined["cost"].to_numpy(dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        df["Ort. Maliyet"] = cost / joined["quantity"].to_numpy(dtype=float)
+    df["Maliyet (TL)"] = cost
+    df["Gerçekleşmemiş K/Z (TL)"] = df["Toplam Değer"].to_numpy(dtype=float) - cost
+    df["Gerçekleşen K/Z (TL)"] = joined["realized_pnl"].to_numpy(dtype=float)
+    return df
+
+
+def category_totals(portfolio_df: pd.DataFrame) -> pd.DataFrame:
+    """Total value and daily gain per category."""
+    if portfolio_df.empty:
+        return pd.DataFrame(columns=["Kategori", "Toplam Değer", "Günlük Kazanç (TL)"])
+    return (
+        portfolio_df.groupby("Kategori", sort=False)[["Toplam Değer", "Günlük Kazanç (TL)"]]
+        .sum()
+        .reset_index()
+    )
@@ -0,0 +1,81 @@
+# worker.py
+"""
+Background refresh worker.
+
+Refreshes fund quotes on a schedule and publishes the valued portfolio and
+today's total to MongoDB, so the Streamlit app only has to read the latest
+snapshot. Uses the same `.streamlit/secrets.toml` as the app.
+
+Usage:
+    python worker.py               # refresh every WORKER_REFRESH_INTERVAL_SECONDS
+    python worker.py --once        # single refresh, e.g. from cron
+    python worker.py --interval 600
+    python worker.py --metrics-file /var/lib/node_exporter/portfolio.prom
+"""
+
+import argparse
+import os
+import time
+from datetime import datetime
+
+from config import WORKER_REFRESH_INTERVAL_SECONDS
+from data_manager import load_funds, refresh_portfolio, get_metrics_prometheus
+
+
+def refresh_once() -> bool:
+    """Runs one refresh cycle. Returns True if a snapshot was published."""
+    started = time.time()
+    funds = load_funds()
+    if not funds:
+        print("ℹ️  No funds configured, nothing to refresh")
+        return False
+
+    table = refresh_portfolio(funds)
+    if table.empty:
+        print(f"⚠️  {datetime.now():%Y-%m-%d %H:%M:%S} no fund could be valued, previous snapshot kept")
+        return False
+    print(
+        f"✅ {datetime.now():%Y-%m-%d %H:%M:%S} refreshed {len(table)}/{len(funds)} funds, "
+        f"total {table.total_value:,.2f} TL in {time.time() - started:.1f}s"
+    )
+    return True
+
+
+def write_metrics(path: str):
+    """Atomically replaces `path` with the current metrics (textfile-collector friendly)."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(get_metrics_prometheus())
+    os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--once", action="store_true", help="refresh once and exit")
+    parser.add_argument("--interval", type=float, default=WORKER_REFRESH_INTERVAL_SECONDS,
+                        help="seconds between refreshes")
+    parser.add_argument("--metrics-file", default=None,
+                        help="write Prometheus text metrics here after every cycle")
+    args = parser.parse_args()
+
+    print("🚀 Starting refresh worker...")
+    try:
+        while True:
+            try:
+                refresh_once()
+            except Exception as e:
+                # Keep the schedule alive; the next cycle may succeed
+                print(f"❌ Refresh failed: {e}")
+
+            if args.metrics_file:
+                write_metrics(args.metrics_file)
+
+            if args.once:
+                break
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        print("\n👋 Worker stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# write_behind.py
+"""
+Write-behind buffer: the latest value per key, written to storage in the background.
+
+put() records a value and returns immediately. A value equal to the last one
+recorded for its key is dropped, so repeated refreshes of an unchanged total cost
+nothing. Changed values wait delay_seconds, and everything put meanwhile is
+written by one call to write({key: value}): a burst of updates becomes a single
+write of the latest values. Failed writes stay pending and are retried.
+"""
+
+import threading
+from typing import Callable, Dict, Hashable, Optional
+
+from metrics import inc
+
+
+class WriteBehind:
+    """Thread-safe; one instance per kind of record (e.g. daily totals)."""
+
+    def __init__(
+        self,
+        write: Callable[[Dict], bool],
+        delay_seconds: float,
+        name: str,
+        is_same: Callable[[object, object], bool] = lambda a, b: a == b,
+    ):
+        self._write = write
+        self.delay_seconds = delay_seconds
+        self.name = name
+        self._is_same = is_same
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # One write at a time, in put order
+        self._known: Dict[Hashable, object] = {}  # Last value per key: pending, written or seeded
+        self._pending: Dict[Hashable, object] = {}
+        self._written: Dict[Hashable, object] = {}  # Written here since the last forget_written()
+        self._timer: Optional[threading.Timer] = None
+
+    def _schedule(self):
+        """Starts the flush timer unless one is running. Caller holds the lock."""
+        if self._timer is None:
+            self._timer = threading.Timer(self.delay_seconds, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def known(self, key) -> Optional[object]:
+        with self._lock:
+            return self._known.get(key)
+
+    def seed(self, key, value):
+        """Records the stored value of a key (read from storage) without writing it."""
+        with self._lock:
+            self._known.setdefault(key, value)
+
+    def put(self, key, value) -> bool:
+        """Queues value for key; returns False if it equals the last value (nothing to write)."""
+        with self._lock:
+            if key in self._known and self._is_same(self._known[key], value):
+                inc(f"{self.name}.unchanged")
+                return False
+            if key in self._pending:
+                inc(f"{self.name}.coalesced")
+            self._known[key] = value
+            self._pending[key] = value
+            self._schedule()
+        return True
+
+    def values(self) -> Dict:
+        """Values written or waiting to be written by this process, newest per key."""
+        with self._lock:
+            return {**self._written, **self._pending}
+
+    def pending(self) -> Dict:
+        with self._lock:
+            return dict(self._pending)
+
+    def forget_written(self):
+        """Storage was re-read (e.g. another process wrote): keep only what is still pending."""
+        with self._lock:
+            self._written.clear()
+            self._known = dict(self._pending)
+
+    def flush(self) -> bool:
+        """Writes everything pending now. Returns False if the write failed (it is retried later)."""
+        with self._flush_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return True
+            try:
+                saved = self._write(batch)
+            except Exception as e:
+                print(f"Error writing {self.name}: {e}")
+                saved = False
+            with self._lock:
+                if saved:
+                    self._written.update(batch)
+                    inc(f"{self.name}.flushes")
+                    inc(f"{self.name}.records", len(batch))
+                else:
+                    # Newer puts win over the failed values
+                    self._pending = {**batch, **self._pending}
+                    self._schedule()
+            return saved